@@ -0,0 +1,394 @@
+# api_server.py - Headless JSON prediction service (for EHR and other integrations)
+#
+# Usage:
+#   python api_server.py --port 8600 --workers 4
+#   python api_server.py --bench heart --requests 2000 --concurrency 200
+#
+#   POST /auth/login      {"username": ..., "password": ...}    -> access + refresh token
+#   POST /auth/refresh    {"refresh_token": ...}                -> rotated token pair
+#   POST /predict/heart   {"age": 63, "sex": 1, ...}            -> one result
+#   POST /predict/heart   [{"age": 63, ...}, {"age": 37, ...}]  -> list of results
+#     Each result lists the input columns that were left out (and imputed) under "missing";
+#     unknown fields, non-numeric values in numeric fields and empty bodies are a 400.
+#   POST /screen          {"age": 63, "Glucose": 148, "cp": 3, ...} -> one result per disease
+#   POST /screen?format=pdf                                     -> the consolidated PDF report
+#   GET  /drift           GET /drift/heart                      -> input drift per feature (see drift.py)
+#   GET  /metrics                                               -> Prometheus text format
+#
+# /predict and /screen require "Authorization: Bearer <access token>" unless
+# MEDISCAN_API_REQUIRE_AUTH=0.
+#
+# Concurrent single-row requests for the same disease are coalesced by a
+# MicroBatcher: it waits at most MEDISCAN_BATCH_WAIT_MS for up to
+# MEDISCAN_MAX_BATCH_SIZE rows, then scores them in one vectorized call on a
+# worker thread, so the event loop stays free to accept requests. A /screen
+# request submits its three per-disease rows to the three batchers at once.
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import tornado.web
+
+import config
+import metrics
+from auth_utils import create_token, issue_tokens, refresh_session, verify_token, verify_user
+from inference import DISEASES
+from model_registry import registry
+from prediction_cache import cache_stats, predict_cached
+from prediction_history import get_history
+from event_log import append_event
+from drift import get_monitor, observe_inputs
+from screening import SHARED_FIELDS, input_columns, missing_fields, record_screening, screenable, skipped, \
+    split_record, submit_screening_report, summary
+
+
+# ---------------- Micro-batching ----------------
+class MicroBatcher:
+    def __init__(self, model_key, executor, max_batch_size=None, max_wait_ms=None):
+        self.model_key = model_key
+        self.executor = executor
+        self.max_batch_size = max_batch_size or config.MAX_BATCH_SIZE
+        self.max_wait = (config.BATCH_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.rows = 0
+        self._task = None
+        # In-flight batches: references are held until done, and at most one per executor worker
+        self._tasks = set()
+        self._slots = asyncio.Semaphore(getattr(executor, "_max_workers", None) or config.API_WORKERS)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, rows):
+        """Queue raw input rows and wait for their (prediction, probability) results."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((rows, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.max_wait
+            # Keep collecting until the batch is full or the oldest request has waited long enough
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+            # With every worker busy, wait here: requests keep queueing and form a larger next batch
+            await self._slots.acquire()
+            task = loop.create_task(self._score(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task):
+        self._tasks.discard(task)
+        self._slots.release()
+
+    async def _score(self, pending):
+        rows = [row for item_rows, _ in pending for row in item_rows]
+        try:
+            predictions, probabilities = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self._predict, rows)
+        except Exception as e:
+            if len(pending) > 1:
+                # Re-score requests one by one so a single bad payload only fails its own caller
+                for item in pending:
+                    await self._score([item])
+                return
+            if not pending[0][1].done():
+                pending[0][1].set_exception(e)
+            return
+
+        self.batches += 1
+        self.rows += len(rows)
+        offset = 0
+        for item_rows, future in pending:
+            n = len(item_rows)
+            results = [format_result(int(p), float(prob))
+                       for p, prob in zip(predictions[offset:offset + n], probabilities[offset:offset + n])]
+            offset += n
+            if not future.done():
+                future.set_result(results)
+
+    def _predict(self, rows):
+        return predict_cached(self.model_key, pd.DataFrame(rows))
+
+
+def format_result(prediction, probability):
+    return {
+        "prediction": prediction,
+        "probability": probability,
+        "confidence": probability if prediction == 1 else 1 - probability,
+    }
+
+
+def validate_rows(model_key, rows):
+    """Reject unknown, non-numeric or empty input with a 400 before it reaches the batcher."""
+    try:
+        return registry.get(model_key).validate(rows)
+    except FileNotFoundError as e:
+        raise tornado.web.HTTPError(503, reason=str(e))
+    except ValueError as e:
+        raise tornado.web.HTTPError(400, reason=f"Invalid input: {e}")
+
+
+# ---------------- HTTP Handlers ----------------
+class BaseHandler(tornado.web.RequestHandler):
+    def write_error(self, status_code, **kwargs):
+        self.finish({"error": self._reason})
+
+    def read_json(self):
+        try:
+            return json.loads(self.request.body or b"null")
+        except json.JSONDecodeError:
+            raise tornado.web.HTTPError(400, reason="Body must be JSON")
+
+    def require_user(self):
+        """Validate the Bearer access token (cached, no password hashing) when auth is enabled."""
+        if not config.API_REQUIRE_AUTH:
+            return None
+        header = self.request.headers.get("Authorization", "")
+        if not header.startswith("Bearer "):
+            raise tornado.web.HTTPError(401, reason="Missing bearer token")
+        ok, result = verify_token(header[len("Bearer "):])
+        if not ok:
+            raise tornado.web.HTTPError(401, reason=result)
+        return result
+
+
+class LoginHandler(BaseHandler):
+    async def post(self):
+        body = self.read_json()
+        if not isinstance(body, dict) or not body.get("username") or not body.get("password"):
+            raise tornado.web.HTTPError(400, reason="username and password are required")
+        # verify_user blocks on the hashing pool, so keep it off the event loop
+        ok, message = await asyncio.get_running_loop().run_in_executor(
+            None, verify_user, body["username"], body["password"], self.request.remote_ip)
+        if not ok:
+            raise tornado.web.HTTPError(401, reason=message)
+        username = body["username"].strip().lower()
+        access_token, refresh_token = issue_tokens(username)
+        self.write({"access_token": access_token, "refresh_token": refresh_token, "token_type": "Bearer"})
+
+
+class RefreshHandler(BaseHandler):
+    def post(self):
+        body = self.read_json()
+        if not isinstance(body, dict) or not body.get("refresh_token"):
+            raise tornado.web.HTTPError(400, reason="refresh_token is required")
+        ok, result = refresh_session(body["refresh_token"])
+        if not ok:
+            raise tornado.web.HTTPError(401, reason=result)
+        _, access_token, refresh_token = result
+        self.write({"access_token": access_token, "refresh_token": refresh_token, "token_type": "Bearer"})
+
+
+class PredictHandler(BaseHandler):
+    async def post(self, model_key):
+        username = self.require_user()
+        batchers = self.settings["batchers"]
+        if model_key not in batchers:
+            raise tornado.web.HTTPError(404, reason=f"Unknown disease '{model_key}'")
+        payload = self.read_json()
+        single = isinstance(payload, dict)
+        rows = [payload] if single else payload
+        if not isinstance(rows, list) or not rows or not all(isinstance(r, dict) for r in rows):
+            raise tornado.web.HTTPError(400, reason="Body must be an object or a non-empty list of objects")
+        missing = validate_rows(model_key, rows)
+
+        try:
+            with metrics.timer("api_request", model_key):
+                results = await batchers[model_key].submit(rows)
+        except FileNotFoundError as e:
+            raise tornado.web.HTTPError(503, reason=str(e))
+        except (ValueError, TypeError) as e:
+            raise tornado.web.HTTPError(400, reason=f"Invalid input: {e}")
+        results = [dict(r, missing=m) for r, m in zip(results, missing)]
+        observe_inputs(model_key, rows, role="api")
+        if username:
+            # Authenticated calls land in the caller's prediction history (queued, not written here)
+            version = registry.version(model_key)
+            get_history().record_many([(username, model_key, row, r["prediction"], r["probability"], version)
+                                       for row, r in zip(rows, results)])
+            for r in results:
+                append_event("prediction", username=username, disease=model_key, prediction=r["prediction"],
+                             probability=r["probability"], model_version=version, source="api")
+        self.write({"disease": model_key, "result": results[0]} if single
+                   else {"disease": model_key, "results": results})
+
+
+class ScreenHandler(BaseHandler):
+    async def post(self):
+        username = self.require_user()
+        record = self.read_json()
+        if not isinstance(record, dict) or not record:
+            raise tornado.web.HTTPError(400, reason="Body must be one patient record (a JSON object)")
+        diseases = [key for key in self.get_argument("diseases", "").split(",") if key] or DISEASES
+        unknown = [key for key in diseases if key not in DISEASES]
+        if unknown:
+            raise tornado.web.HTTPError(404, reason=f"Unknown disease(s): {', '.join(unknown)}")
+
+        try:
+            rows = split_record(record, diseases)
+            used = set(SHARED_FIELDS).union(*(input_columns(key) for key in DISEASES))
+        except FileNotFoundError as e:
+            raise tornado.web.HTTPError(503, reason=str(e))
+        unknown = sorted(key for key in record if key not in used)
+        if unknown:
+            raise tornado.web.HTTPError(400, reason=f"Invalid input: unknown field(s) {', '.join(unknown)}")
+        keys = screenable(rows)
+        for key in keys:
+            validate_rows(key, [rows[key]])
+        if not keys:
+            raise tornado.web.HTTPError(400, reason="The record holds no fields of any screened disease")
+        batchers = self.settings["batchers"]
+        # All diseases are queued together: the request takes as long as the slowest model
+        with metrics.timer("api_request", "screening"):
+            outcomes = await asyncio.gather(*(batchers[key].submit([rows[key]]) for key in keys),
+                                            return_exceptions=True)
+        outcomes = dict(zip(keys, outcomes))
+        results = {}
+        for key in diseases:
+            if key not in outcomes:
+                results[key] = skipped(key)
+            elif isinstance(outcomes[key], Exception):
+                results[key] = {"error": str(outcomes[key])}
+            else:
+                results[key] = dict(outcomes[key][0], model_version=registry.version(key),
+                                    missing=missing_fields(key, rows[key]))
+        for key, result in results.items():
+            if "prediction" in result:
+                observe_inputs(key, [rows[key]], role="api")
+        screening = {"results": results, "rows": rows}
+        if username:
+            record_screening(username, screening, source="api")
+
+        if self.get_argument("format", "json") == "pdf":
+            report = await asyncio.wrap_future(submit_screening_report(username or "patient", username or "",
+                                                                       screening))
+            self.set_header("Content-Type", "application/pdf")
+            self.write(report.getvalue())
+            return
+        self.write({"summary": summary(screening), "results": results})
+
+
+class DriftHandler(BaseHandler):
+    def get(self, model_key=None):
+        self.require_user()
+        if model_key and model_key not in DISEASES:
+            raise tornado.web.HTTPError(404, reason=f"Unknown disease '{model_key}'")
+        # This process's running statistics; `python drift.py report` merges every process's snapshot
+        monitor = get_monitor(role="api")
+        self.write({key: monitor.report(key) for key in ([model_key] if model_key else DISEASES)})
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.write({
+            "status": "ok",
+            "batches": {key: {"calls": b.batches, "rows": b.rows} for key, b in self.settings["batchers"].items()},
+            "prediction_cache": cache_stats(),
+        })
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", metrics.CONTENT_TYPE)
+        self.write(metrics.render_prometheus())
+
+
+def make_app(workers=None, max_batch_size=None, max_wait_ms=None):
+    """Build the tornado application; must be called from inside a running event loop."""
+    executor = ThreadPoolExecutor(max_workers=workers or config.API_WORKERS, thread_name_prefix="predict")
+    batchers = {key: MicroBatcher(key, executor, max_batch_size, max_wait_ms) for key in DISEASES}
+    for batcher in batchers.values():
+        batcher.start()
+    return tornado.web.Application([
+        (r"/auth/login", LoginHandler),
+        (r"/auth/refresh", RefreshHandler),
+        (r"/predict/([a-z]+)", PredictHandler),
+        (r"/screen", ScreenHandler),
+        (r"/drift", DriftHandler),
+        (r"/drift/([a-z]+)", DriftHandler),
+        (r"/health", HealthHandler),
+        (r"/metrics", MetricsHandler),
+    ], batchers=batchers)
+
+
+# ---------------- Local Benchmark Client ----------------
+async def run_benchmark(model_key, total_requests, concurrency, port, workers=None):
+    """Fire single-row requests at an in-process server and report latency and batching."""
+    from tornado.httpclient import AsyncHTTPClient
+    from feature_schema import get_schema
+
+    app = make_app(workers)
+    server = app.listen(port, address="127.0.0.1")
+    row = {c["name"]: (c["options"][c["default_index"]] if c["kind"] == "categorical" else c["value"])
+           for c in get_schema(model_key)["columns"]}
+    body = json.dumps(row)
+    url = f"http://127.0.0.1:{port}/predict/{model_key}"
+    headers = {"Authorization": f"Bearer {create_token('benchmark')}"}
+    client = AsyncHTTPClient(max_clients=concurrency)
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            t0 = time.perf_counter()
+            await client.fetch(url, method="POST", body=body, headers=headers)
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total_requests)))
+    elapsed = time.perf_counter() - start
+    server.stop()
+
+    latencies.sort()
+    batcher = app.settings["batchers"][model_key]
+    p50 = latencies[int(0.50 * (len(latencies) - 1))] * 1000
+    p99 = latencies[int(0.99 * (len(latencies) - 1))] * 1000
+    print(f"✅ {total_requests} requests in {elapsed:.2f}s ({total_requests / elapsed:,.0f} req/s)")
+    print(f"   p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+    print(f"   {batcher.batches} scoring batches, {batcher.rows / max(batcher.batches, 1):.1f} rows per batch")
+    stats = cache_stats()
+    print(f"   prediction cache: {stats['hits']} hits, {stats['misses']} misses")
+    for stage, per_disease in metrics.snapshot().items():
+        for disease, s in per_disease.items():
+            print(f"   {stage:<14} {disease:<10} n={s['count']:<6} p50 {s['p50_ms']:.3f} ms  "
+                  f"p95 {s['p95_ms']:.3f} ms  p99 {s['p99_ms']:.3f} ms")
+
+
+async def serve(port, workers):
+    make_app(workers).listen(port)
+    print(f"[API] MediScan AI prediction service listening on :{port}")
+    await asyncio.Event().wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MediScan AI headless prediction service.")
+    parser.add_argument("--port", type=int, default=config.API_PORT)
+    parser.add_argument("--workers", type=int, default=config.API_WORKERS, help="Model scoring threads")
+    parser.add_argument("--bench", choices=DISEASES, help="Run the local benchmark client instead of serving")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        asyncio.run(run_benchmark(args.bench, args.requests, args.concurrency, args.port, args.workers))
+    else:
+        asyncio.run(serve(args.port, args.workers))
+
+
+if __name__ == "__main__":
+    main()
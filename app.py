@@ -1,106 +1,48 @@
 # app.py (Enhanced Register + Login + Full Dashboard Input/Prediction)
+import functools
+import sys
 import streamlit as st
-import pandas as pd
-import pickle
-import os
-import requests
-from streamlit_lottie import st_lottie
-from passlib.hash import pbkdf2_sha256
-import json
-import numpy as np
+from asset_cache import load_lottie_local, load_lottie_url, prefetch
+from auth_utils import register_user, verify_user, issue_tokens, verify_token, refresh_session, revoke_session
+from inference import DISEASES, DISEASE_NAMES, RESULT_LABELS
+from prediction_history import get_history
+from event_log import append_event
+import metrics
+import startup
+# The ML stack (pandas, model artifacts, form schemas, fpdf) is imported inside the
+# dashboard functions below: the register/login pages draw without it, and
+# startup.warm_up() loads it in the background once the first page is out.
 
 # ---------------- Load Lottie Animations ----------------
-def load_lottie_local(path_relative):
-    """Load a local Lottie JSON file from assets folder."""
-    path = os.path.join(os.path.dirname(__file__), path_relative)
-    if not os.path.exists(path):
-        print(f"[Lottie] File not found: {path}")
-        return None
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"[Lottie] Error loading {path}: {e}")
-        return None
-
-
-def load_lottie_url(url):
-    """Load a Lottie animation from a given URL."""
-    try:
-        r = requests.get(url, timeout=10)
-        if r.status_code == 200:
-            return r.json()
-    except:
-        return None
-
+# Cached per process (and on disk for URLs) by asset_cache; URL fetches never block a rerun.
+# streamlit_lottie imports requests when it loads, and rendering any component imports pandas
+# and pyarrow, so the register/login pages draw their animation only once the warm-up is done.
 
 # Animation URLs
 lottie_register_url = "https://assets10.lottiefiles.com/packages/lf20_ydo1amjm.json"
 lottie_dashboard_url = "https://assets10.lottiefiles.com/packages/lf20_x62chJ.json"
+prefetch(lottie_register_url, lottie_dashboard_url)
 
 
 # ---------------- Authentication Utils ----------------
-USERS_FILE = "users.json"
-
-def load_users():
-    if os.path.exists(USERS_FILE):
-        try:
-            with open(USERS_FILE, "r") as f:
-                content = f.read()
-                if not content:
-                    return {}
-                return json.loads(content)
-        except json.JSONDecodeError:
-            return {}
-    with open(USERS_FILE, "w") as f:
-        json.dump({}, f)
-    return {}
-
-def save_users(users):
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=4)
-
-def register_user(username, password, email=None):
-    username = username.strip().lower()
-    if not username or not password:
-        return False, "Username and password cannot be empty."
-    if email and "@" not in email:
-        return False, "Invalid email format."
-
-    users = load_users()
-    if username in users:
-        return False, "User already exists. Click 'Login Now' below!"
-
-    hashed = pbkdf2_sha256.hash(password)
-    users[username] = {"password": hashed, "email": email}
-    save_users(users)
-    return True, "Registration successful! Please login."
-
-def verify_user(username, password):
-    username = username.strip().lower()
-    users = load_users()
-    if username not in users:
-        return False, "User does not exist or incorrect password"
-    if "password" not in users[username]:
-        return False, "User data incomplete."
-    if pbkdf2_sha256.verify(password, users[username]["password"]):
-        return True, "Login successful"
-    return False, "User does not exist or incorrect password"
+# Users live in the indexed store behind auth_utils (SQLite by default, see user_store.py);
+# password hashing runs on the auth_executor process pool, not on this script thread.
+def client_ip():
+    """Best-effort client address used for login throttling."""
+    try:
+        return st.context.ip_address
+    except Exception:
+        return None
 
 
 # ---------------- Load ML Models ----------------
-models_path = "models"
+# Models are loaded lazily by model_registry (once per process, shared by all
+# sessions) and hot-reloaded when train_models.py writes a new artifact.
 
-try:
-    diabetes_model = pickle.load(open(os.path.join(models_path, "diabetes_model.pkl"), "rb"))
-    heart_model = pickle.load(open(os.path.join(models_path, "heart_model.pkl"), "rb"))
-    parkinsons_model = pickle.load(open(os.path.join(models_path, "parkinson_model.pkl"), "rb"))
-except FileNotFoundError as e:
-    st.error(f"Model file not found: {e}. Please ensure models exist.")
-    st.stop()
-except Exception as e:
-    st.error(f"Error loading models: {e}")
-    st.stop()
+
+# ---------------- Metrics ----------------
+# Stage timings (see metrics.py); /metrics is served when MEDISCAN_METRICS_PORT is set
+metrics.start_http_server()
 
 
 # ---------------- Streamlit Settings ----------------
@@ -114,229 +56,265 @@ if "username" not in st.session_state:
     st.session_state.username = ""
 
 
-# ---------------- REGISTER PAGE ----------------
-if st.session_state.view == "register":
-    st.markdown("""
-        <style>
-        .stApp { background-color: #2a7cf7; }
-        h1 { text-align: center; color: white; margin-bottom: 1rem; }
-        .register-card {
-            background-color: white; padding: 2rem; border-radius: 20px;
-            box-shadow: 0px 4px 20px rgba(0,0,0,0.2);
-            width: 420px; margin: 1rem auto; text-align: center; color: #333;
-        }
-        .stButton>button {
-            background-color: #00c851; color: white; border: none;
-            padding: 10px 40px; border-radius: 10px;
-            font-size: 1rem; cursor: pointer; transition: 0.3s;
-            width: 100%; margin-top: 1rem;
-        }
-        .stButton>button:hover { background-color: #009e3c; }
-        .switch-link {
-            margin-top: 1.5rem; font-size: 0.9rem; color: #555;
-        }
-        .switch-link span {
-            color: #007bff; cursor: pointer; text-decoration: underline;
-        }
-        </style>
-    """, unsafe_allow_html=True)
-
-    st.markdown("<h1>Mediscan AI App</h1>", unsafe_allow_html=True)
-
-    col1, col2 = st.columns([0.6, 0.4])
-    with col1:
-        lottie = load_lottie_local("assets/doctor.json") or load_lottie_url(lottie_register_url)
-        if lottie:
-            st_lottie(lottie, height=450, key="register_anim", loop=True)
-        else:
-            st.warning("Doctor animation not found.")
-
-    with col2:
-        st.markdown("<div class='register-card'>", unsafe_allow_html=True)
-        st.markdown("<h3>Register Now</h3>", unsafe_allow_html=True)
-        reg_email = st.text_input("Email")
-        reg_password = st.text_input("Password", type="password")
-        if st.button("Register Account"):
-            if reg_email and reg_password:
-                ok, msg = register_user(reg_email, reg_password, reg_email)
-                st.info(msg)
-                if ok:
-                    st.session_state.view = "login"
-                    st.rerun()
-            else:
-                st.error("Please fill all fields!")
-
-        st.markdown("<div class='switch-link'>Already have an account? <span id='login-link'>Login here</span></div>", unsafe_allow_html=True)
-        if st.button("Go to Login", key="hidden_login"):
-            st.session_state.view = "login"
-            st.rerun()
-
+# ---------------- Session Tokens ----------------
+# The access token is checked on each rerun (cheap, cached signature check - no
+# password hashing). Both tokens live only in the server-side session state, never
+# in the URL (where history, logs, Referer headers and shared links would leak the
+# long-lived refresh token). Streamlit keeps the session across websocket
+# reconnects (server.disconnectedSessionTTL); a full page reload asks for a login.
+def start_session(username, access_token, refresh_token):
+    st.session_state.logged_in = True
+    st.session_state.username = username
+    st.session_state.access_token = access_token
+    st.session_state.refresh_token = refresh_token
+
+
+def end_session():
+    # Only this session's token family is revoked: other devices stay logged in
+    if st.session_state.get("refresh_token"):
+        revoke_session(st.session_state.refresh_token)
+    for key in ("access_token", "refresh_token"):
+        st.session_state.pop(key, None)
+    st.session_state.logged_in = False
+    st.session_state.username = ""
 
-# ---------------- LOGIN PAGE ----------------
-elif st.session_state.view == "login":
-    st.markdown("""
-        <style>
-        .stApp { background-color: #2a7cf7; }
-        h1 { text-align: center; color: white; margin-bottom: 1rem; }
-        .login-card {
-            background-color: white; padding: 2rem; border-radius: 20px;
-            box-shadow: 0px 4px 20px rgba(0,0,0,0.2);
-            width: 420px; margin: 1rem auto; text-align: center; color: #333;
-        }
-        .stButton>button {
-            background-color: #00c851; color: white; border: none;
-            padding: 10px 40px; border-radius: 10px;
-            font-size: 1rem; cursor: pointer; transition: 0.3s;
-            width: 100%; margin-top: 1rem;
-        }
-        .stButton>button:hover { background-color: #009e3c; }
-        .switch-link {
-            margin-top: 1.5rem; font-size: 0.9rem; color: #555;
-        }
-        .switch-link span {
-            color: #007bff; cursor: pointer; text-decoration: underline;
-        }
-        </style>
-    """, unsafe_allow_html=True)
 
+def restore_session():
+    """Return the logged-in username from the session tokens, rotating them if needed."""
+    # Links from older versions carried the refresh token in ?session=; drop it unused
+    st.query_params.pop("session", None)
+    access_token = st.session_state.get("access_token")
+    if access_token:
+        ok, username = verify_token(access_token)
+        if ok:
+            return username
+    refresh_token = st.session_state.get("refresh_token")
+    if refresh_token:
+        ok, result = refresh_session(refresh_token)
+        if ok:
+            start_session(*result)
+            return result[0]
+        st.session_state.pop("refresh_token", None)
+    return None
+
+
+session_user = restore_session()
+if session_user:
+    st.session_state.logged_in = True
+    st.session_state.username = session_user
+    if st.session_state.view in ("register", "login"):
+        st.session_state.view = "dashboard"
+elif st.session_state.logged_in:
+    # Tokens expired or were revoked (e.g. logout on another tab)
+    st.session_state.logged_in = False
+    st.session_state.username = ""
+    st.session_state.view = "login"
+
+
+# ---------------- Fragments ----------------
+# Each page is a function, and the dashboard's interactive panels are
+# st.fragment's: a widget inside a fragment reruns only that fragment, not this
+# whole script (sidebar, CSS, animation). Full runs are timed as script_run,
+# fragment runs as fragment_run (both with their thread CPU time, see metrics.py).
+def timed_fragment(func):
+    """st.fragment that records every run of `func` as fragment_run{fragment=<name>}."""
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        with metrics.timer("fragment_run", func.__name__, cpu=True):
+            return func(*args, **kwargs)
+    return st.fragment(run)
+
+
+AUTH_PAGE_CSS = """
+    <style>
+    .stApp { background-color: #2a7cf7; }
+    h1 { text-align: center; color: white; margin-bottom: 1rem; }
+    .register-card, .login-card {
+        background-color: white; padding: 2rem; border-radius: 20px;
+        box-shadow: 0px 4px 20px rgba(0,0,0,0.2);
+        width: 420px; margin: 1rem auto; text-align: center; color: #333;
+    }
+    .stButton>button {
+        background-color: #00c851; color: white; border: none;
+        padding: 10px 40px; border-radius: 10px;
+        font-size: 1rem; cursor: pointer; transition: 0.3s;
+        width: 100%; margin-top: 1rem;
+    }
+    .stButton>button:hover { background-color: #009e3c; }
+    .switch-link {
+        margin-top: 1.5rem; font-size: 0.9rem; color: #555;
+    }
+    .switch-link span {
+        color: #007bff; cursor: pointer; text-decoration: underline;
+    }
+    </style>
+"""
+
+
+def show_lottie(animation, **kwargs):
+    from streamlit_lottie import st_lottie
+    st_lottie(animation, **kwargs)
+
+
+def auth_page_layout(animation_key, card):
+    """
+    Shared register/login chrome: the card is drawn first, the animation column after it,
+    and only once startup.warm_up() has loaded the stack a component needs (a later rerun).
+    """
+    st.markdown(AUTH_PAGE_CSS, unsafe_allow_html=True)
     st.markdown("<h1>Mediscan AI App</h1>", unsafe_allow_html=True)
 
     col1, col2 = st.columns([0.6, 0.4])
+    with col2:
+        card()
     with col1:
+        if not startup.warmed_up():
+            return
         lottie = load_lottie_local("assets/doctor.json") or load_lottie_url(lottie_register_url)
         if lottie:
-            st_lottie(lottie, height=450, key="login_anim", loop=True)
+            show_lottie(lottie, height=450, key=animation_key, loop=True)
         else:
             st.warning("Doctor animation not found.")
 
-    with col2:
-        st.markdown("<div class='login-card'>", unsafe_allow_html=True)
-        st.markdown("<h3>Login to MediScan AI</h3>", unsafe_allow_html=True)
-        login_email = st.text_input("Email")
-        login_password = st.text_input("Password", type="password")
-        if st.button("Login"):
-            ok, msg = verify_user(login_email, login_password)
+
+# ---------------- REGISTER PAGE ----------------
+def register_card():
+    st.markdown("<div class='register-card'>", unsafe_allow_html=True)
+    st.markdown("<h3>Register Now</h3>", unsafe_allow_html=True)
+    reg_email = st.text_input("Email")
+    reg_password = st.text_input("Password", type="password")
+    if st.button("Register Account"):
+        if reg_email and reg_password:
+            ok, msg = register_user(reg_email, reg_password, reg_email, ip=client_ip())
             st.info(msg)
             if ok:
-                st.session_state.logged_in = True
-                st.session_state.username = login_email
-                st.session_state.view = "dashboard"
+                st.session_state.view = "login"
                 st.rerun()
+        else:
+            st.error("Please fill all fields!")
 
-        st.markdown("<div class='switch-link'>Don't have an account? <span id='register-link'>Register here</span></div>", unsafe_allow_html=True)
-        if st.button("Go to Register", key="hidden_register"):
-            st.session_state.view = "register"
-            st.rerun()
-
-
-# ---------------- DASHBOARD PAGE ----------------
-# --- VIEW 3: DASHBOARD PAGE (Only if logged_in is True) ---
-elif st.session_state.view == "dashboard" and st.session_state.logged_in:
-    st.set_page_config(layout="wide") # Switch to wide layout for dashboard
-
-    st.sidebar.title(f"Welcome, {st.session_state.username}!")
-    if st.sidebar.button("Logout"):
-        st.session_state.logged_in = False
-        st.session_state.username = ""
-        st.session_state.view = "login" # Go back to login on logout
-        st.rerun() # Rerun to show login page
-
-    st.sidebar.header("Select Disease Prediction")
-    # Use keys without emojis for easier dictionary lookup
-    disease_options_display = ["Diabetes 🩸", "Heart Disease ❤️", "Parkinson's 🧠"]
-    disease_options_keys = ["Diabetes", "Heart Disease", "Parkinson's"]
-    disease_choice_display = st.sidebar.radio("Choose a disease:", disease_options_display, key="disease_choice_dash_v2")
-    # Find the corresponding key
-    selected_model_key = disease_choice_display.split(" ")[0].lower() # Gets 'diabetes', 'heart', 'parkinson'
-
-
-    # --- Dashboard Title and Animation ---
-    st.title("🩺 MediScan AI Dashboard") # Keep this title for the dashboard
-    lottie_dash_json = load_lottie_url(lottie_dashboard_url)
-    if lottie_dash_json:
-        st_lottie(lottie_dash_json, height=150, key="dash_anim_v2")
-    st.markdown("---") # Separator
+    st.markdown("<div class='switch-link'>Already have an account? <span id='login-link'>Login here</span></div>", unsafe_allow_html=True)
+    if st.button("Go to Login", key="hidden_login"):
+        st.session_state.view = "login"
+        st.rerun()
 
 
-    # --- Helper function to display results in styled card ---
-    def display_result_card(prediction, positive_msg, negative_msg, confidence_score=""):
-        if prediction == 1: # High Risk / Positive
-            result_text = positive_msg
-            color = "#FF4B4B"; background_color = "#FFE0E0"; border_color = "#FF4B4B"; icon = "⚠️"
-        else: # Low Risk / Negative
-            result_text = negative_msg
-            color = "#28A745"; background_color = "#E0FFE0"; border_color = "#28A745"; icon = "✅"
-
-        st.markdown(f"""
-            <div style="border: 2px solid {border_color}; background-color: {background_color};
-                        border-radius: 10px; padding: 1.5rem; text-align: center; margin-top: 1rem;">
-                <h4 style="color: #333; margin-bottom: 0.5rem; font-weight: bold;">Prediction Result</h4>
-                <p style="color: {color}; font-size: 2rem; font-weight: bold; margin-bottom: 0.25rem;">
-                    {icon} {result_text}
-                </p>
-                <p style="color: #555; font-size: 0.9rem; margin: 0;">
-                    Confidence: {confidence_score}
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
-
-    # --- Helper function to make predictions using models, scalers, imputers ---
-    def make_prediction(model_key, input_data_dict):
-        try:
-            assets = model[model_key] # Use passed dictionary # Use the global 'models' dictionary
-            model = assets['model']
-            scaler = assets['scaler']
-            imputer = assets['imputer']
+def register_page():
+    auth_page_layout("register_anim", register_card)
 
-            input_df = pd.DataFrame([input_data_dict])
-            required_features = imputer.feature_names_in_
 
-            # Handle categorical columns (get_dummies) - Important for Heart Disease
-            categorical_cols_def = {"heart": ['sex', 'cp', 'fbs', 'restecg', 'exang', 'slope', 'ca', 'thal']}
-            categorical_cols_present = [col for col in categorical_cols_def.get(model_key, []) if col in input_df.columns]
-            for col in categorical_cols_present: input_df[col] = input_df[col].astype(str) # Ensure type consistency
+# ---------------- LOGIN PAGE ----------------
+def login_card():
+    st.markdown("<div class='login-card'>", unsafe_allow_html=True)
+    st.markdown("<h3>Login to MediScan AI</h3>", unsafe_allow_html=True)
+    login_email = st.text_input("Email")
+    login_password = st.text_input("Password", type="password")
+    if st.button("Login"):
+        ok, msg = verify_user(login_email, login_password, ip=client_ip())
+        st.info(msg)
+        if ok:
+            username = login_email.strip().lower()
+            start_session(username, *issue_tokens(username))
+            st.session_state.view = "dashboard"
+            st.rerun()
 
-            input_df = pd.get_dummies(input_df, columns=categorical_cols_present, drop_first=True)
-            input_df = input_df.reindex(columns=required_features, fill_value=0) # Ensure all training columns are present
+    st.markdown("<div class='switch-link'>Don't have an account? <span id='register-link'>Register here</span></div>", unsafe_allow_html=True)
+    if st.button("Go to Register", key="hidden_register"):
+        st.session_state.view = "register"
+        st.rerun()
 
-            # Force numeric for safety after potential get_dummies
-            for col in input_df.columns:
-                input_df[col] = pd.to_numeric(input_df[col], errors='coerce')
 
-            input_imputed = imputer.transform(input_df)
-            input_scaled = scaler.transform(input_imputed)
+def login_page():
+    auth_page_layout("login_anim", login_card)
 
-            prediction = model.predict(input_scaled)[0]
-            probability = model.predict_proba(input_scaled)[0][prediction] * 100
 
-            return prediction, f"{probability:.2f}%"
+# ---------------- DASHBOARD PAGE ----------------
+# Use keys without emojis for easier dictionary lookup
+disease_options_display = ["Diabetes 🩸", "Heart Disease ❤️", "Parkinson's 🧠"]
+disease_options_keys = [DISEASE_NAMES[key] for key in DISEASES]
+screening_option_display = "Combined Screening 🩺"
+
+result_labels = RESULT_LABELS
+
+
+# --- Helper function to display results in styled card ---
+def display_result_card(prediction, positive_msg, negative_msg, confidence_score=""):
+    if prediction == 1: # High Risk / Positive
+        result_text = positive_msg
+        color = "#FF4B4B"; background_color = "#FFE0E0"; border_color = "#FF4B4B"; icon = "⚠️"
+    else: # Low Risk / Negative
+        result_text = negative_msg
+        color = "#28A745"; background_color = "#E0FFE0"; border_color = "#28A745"; icon = "✅"
+
+    st.markdown(f"""
+        <div style="border: 2px solid {border_color}; background-color: {background_color};
+                    border-radius: 10px; padding: 1.5rem; text-align: center; margin-top: 1rem;">
+            <h4 style="color: #333; margin-bottom: 0.5rem; font-weight: bold;">Prediction Result</h4>
+            <p style="color: {color}; font-size: 2rem; font-weight: bold; margin-bottom: 0.25rem;">
+                {icon} {result_text}
+            </p>
+            <p style="color: #555; font-size: 0.9rem; margin: 0;">
+                Confidence: {confidence_score}
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+
+
+# --- Helper function to make predictions using the compiled pipelines ---
+def make_prediction(model_key, input_data_dict):
+    import pandas as pd
+    from drift import observe_inputs
+    from model_registry import registry
+    from prediction_cache import predict_cached
 
-        except Exception as e:
-            st.error(f"Prediction Error: {e}")
-            # import traceback # Uncomment for detailed debugging
-            # st.error(traceback.format_exc()) # Uncomment for detailed debugging
-            return None, None
+    try:
+        # Shared process-wide registry + result cache: a re-submitted form skips the model call
+        predictions, probabilities = predict_cached(model_key, pd.DataFrame([input_data_dict]))
+        prediction = int(predictions[0])
+        probability = (probabilities[0] if prediction == 1 else 1 - probabilities[0]) * 100
+        # Queued for the background writers; neither store blocks this rerun
+        version = registry.version(model_key)
+        get_history().record(st.session_state.username, model_key, input_data_dict, prediction,
+                             probabilities[0], version)
+        append_event("prediction", username=st.session_state.username, disease=model_key,
+                     prediction=prediction, probability=float(probabilities[0]), model_version=version,
+                     source="app")
+        # Constant-memory running statistics against the training data (see drift.py)
+        observe_inputs(model_key, [input_data_dict])
+
+        return prediction, f"{probability:.2f}%"
 
+    except Exception as e:
+        metrics.increment("prediction_errors", model_key)
+        metrics.log_event("prediction_error", disease=model_key, error=repr(e))
+        st.error(f"Prediction Error: {e}")
+        # import traceback # Uncomment for detailed debugging
+        # st.error(traceback.format_exc()) # Uncomment for detailed debugging
+        return None, None
+
+
+def schema_input(spec, key, label=None):
+    """One form widget for a feature_schema column spec."""
+    if spec["kind"] == "categorical":
+        return st.selectbox(label=label or spec["name"], options=spec["options"], index=spec["default_index"],
+                            key=key)
+    # Numerical input
+    return st.number_input(label=label or spec["name"], min_value=spec["min"], max_value=spec["max"],
+                           value=spec["value"], format=spec["format"], key=key)
+
+
+@timed_fragment
+def prediction_panel(selected_model_key, disease_choice_display):
+    """Input form, result card and history: submitting the form reruns only this fragment."""
+    from feature_schema import get_schema
+    from report_service import submit_report
 
-    # --- Display selected disease form ---
     st.header(f"{disease_choice_display} Prediction Input") # Use display name
 
-    # Load reference data (only needed for default values/ranges now)
+    # Load the precomputed form schema (cached per dataset hash, no CSV parsing on reruns)
     try:
-        data_file_map = {"diabetes": "diabetes.csv", "heart": "heart.csv", "parkinson": "parkinson.csv"}
-        df_ref = pd.read_csv(os.path.join("data", data_file_map[selected_model_key]))
-
-        target_col_map = {"diabetes": "Outcome", "heart": "target", "parkinson": "status"}
-        target_col = target_col_map[selected_model_key]
-
-        drop_cols = [target_col]
-        if selected_model_key == 'parkinson' and 'name' in df_ref.columns: drop_cols.append('name')
-
-        categorical_features_map = {"diabetes": [], "heart": ['sex', 'cp', 'fbs', 'restecg', 'exang', 'slope', 'ca', 'thal'], "parkinson": []}
-        categorical_features = categorical_features_map[selected_model_key]
-
+        form_schema = get_schema(selected_model_key)
         col_count = 3 if selected_model_key != 'parkinson' else 4
-        feature_names = df_ref.drop(columns=drop_cols).columns
 
     except Exception as e:
         st.error(f"Error loading data configuration: {e}")
@@ -348,35 +326,9 @@ elif st.session_state.view == "dashboard" and st.session_state.logged_in:
         input_data = {}
         cols = st.columns(col_count)
 
-        for i, col_name in enumerate(feature_names):
+        for i, spec in enumerate(form_schema["columns"]):
             with cols[i % col_count]:
-                 if col_name in categorical_features:
-                      options = sorted(df_ref[col_name].unique())
-                      # Ensure default_val is compatible type for index lookup
-                      default_val_raw = df_ref[col_name].mode()[0] if not df_ref[col_name].mode().empty else options[0]
-                      default_val = type(options[0])(default_val_raw) # Convert mode to option type
-                      default_index = 0
-                      try: default_index = options.index(default_val)
-                      except ValueError: pass # Keep index 0 if conversion/find fails
-                      input_data[col_name] = st.selectbox(
-                          label=col_name, options=options, index=default_index,
-                          key=f"{selected_model_key}_{col_name}_v2"
-                          )
-                 else: # Numerical input
-                      # Define min/max/mean, handling potential NaNs
-                      min_val=float(df_ref[col_name].min()) if pd.notna(df_ref[col_name].min()) else 0.0
-                      max_val=float(df_ref[col_name].max()) if pd.notna(df_ref[col_name].max()) else 1000.0
-                      mean_val=float(df_ref[col_name].mean()) if pd.notna(df_ref[col_name].mean()) else 0.0
-                      # Ensure default value is within bounds
-                      value = mean_val if pd.notna(mean_val) else 0.0
-                      value = max(min_val, min(max_val, value))
-
-                      input_data[col_name] = st.number_input(
-                          label=col_name, min_value=min_val, max_value=max_val, value=value,
-                          # Apply specific formatting only for non-integer float columns
-                          format="%.5f" if df_ref[col_name].dtype == 'float64' and col_name not in ['Age', 'Pregnancies'] else None,
-                          key=f"{selected_model_key}_{col_name}_v2"
-                          )
+                 input_data[spec["name"]] = schema_input(spec, key=f"{selected_model_key}_{spec['name']}_v2")
 
         submit = st.form_submit_button(f"Predict {disease_choice_display.split(' ')[0]} Risk")
         if submit:
@@ -384,19 +336,213 @@ elif st.session_state.view == "dashboard" and st.session_state.logged_in:
             prediction, confidence = make_prediction(selected_model_key, input_data)
 
             if prediction is not None:
-                 st.markdown("### Prediction Result")
-                 # Use the new display_result_card function
-                 if selected_model_key == 'diabetes':
-                     display_result_card(prediction, "High Risk", "Low Risk", confidence_score=confidence)
-                 elif selected_model_key == 'heart':
-                      display_result_card(prediction, "Risk Detected", "Appears Healthy", confidence_score=confidence)
-                 elif selected_model_key == 'parkinson':
-                      display_result_card(prediction, "Indicators Found", "No Indicators Found", confidence_score=confidence)
-
-# Fallback view logic (if session state gets corrupted)
-elif not st.session_state.logged_in:
-    st.session_state.view = "login" # Go back to login if logged out but somehow stuck in dashboard view
-    st.rerun()
+                 positive_msg, negative_msg = result_labels[selected_model_key]
+                 # Queue the PDF now; it renders in the background while the result is drawn
+                 st.session_state.last_result = {
+                     "disease": selected_model_key,
+                     "prediction": prediction,
+                     "confidence": confidence,
+                     "report": submit_report(
+                         st.session_state.username, st.session_state.username,
+                         f"{positive_msg if prediction == 1 else negative_msg} (confidence {confidence})",
+                         disease_options_keys[DISEASES.index(selected_model_key)]),
+                 }
+
+    # Results are drawn outside the form (download buttons are not allowed inside one)
+    last_result = st.session_state.get("last_result")
+    if last_result and last_result["disease"] == selected_model_key:
+        st.markdown("### Prediction Result")
+        # Use the new display_result_card function
+        with metrics.timer("render", selected_model_key):
+            display_result_card(last_result["prediction"], *result_labels[selected_model_key],
+                                confidence_score=last_result["confidence"])
+        try:
+            report = last_result["report"].result(timeout=30)
+            st.download_button("📄 Download PDF Report", data=report.getvalue(),
+                               file_name=f"{selected_model_key}_report.pdf", mime="application/pdf",
+                               key=f"{selected_model_key}_report_download")
+        except Exception as e:
+            st.warning(f"PDF report unavailable: {e}")
+
+    # Nested, so a new prediction refreshes it, while its own controls rerun it alone
+    history_panel(selected_model_key)
+
+
+@timed_fragment
+def history_panel(selected_model_key):
+    """Prediction history (indexed per user/disease, see prediction_history.py)."""
+    import pandas as pd
+
+    st.markdown("---")
+    st.subheader("🕘 Your Recent Results")
+    try:
+        history = get_history()
+        show_all = st.toggle("All diseases", value=True, key="history_all_diseases")
+        recent = history.recent(st.session_state.username, disease=None if show_all else selected_model_key)
+        if recent:
+            history_labels = dict(zip(DISEASES, disease_options_keys))
+            st.dataframe(pd.DataFrame([{
+                "Time": pd.Timestamp.fromtimestamp(r["created_at"]).strftime("%Y-%m-%d %H:%M"),
+                "Disease": history_labels.get(r["disease"], r["disease"]),
+                "Result": result_labels[r["disease"]][0 if r["prediction"] == 1 else 1]
+                          if r["disease"] in result_labels else r["prediction"],
+                "Risk Probability": f"{r['probability'] * 100:.2f}%",
+            } for r in recent]), hide_index=True, width="stretch")
+
+            trend = history.trend(st.session_state.username, selected_model_key)
+            if len(trend) > 1:
+                st.caption(f"Daily mean {disease_options_keys[DISEASES.index(selected_model_key)]} risk probability")
+                st.line_chart(pd.DataFrame(trend).set_index("day")["mean_probability"])
+        else:
+            st.info("No predictions yet. Your results will appear here.")
+    except Exception as e:
+        st.warning(f"History unavailable: {e}")
+
+
+@timed_fragment
+def screening_panel():
+    """One patient record, scored by all three models at once (see screening.py)."""
+    from drift import observe_inputs
+    from feature_schema import get_schema
+    from screening import (SHARED_FIELDS, record_screening, result_text, screen, shared_field_spec,
+                           submit_screening_report, summary)
+
+    st.header("Combined Screening Input")
+    st.caption("Fill in one patient record; shared fields are entered once and every model scores it at the same time.")
+    try:
+        schemas = {key: get_schema(key) for key in DISEASES}
+    except Exception as e:
+        st.error(f"Error loading data configuration: {e}")
+        st.stop()
+    shared_columns = {(key, column) for columns in SHARED_FIELDS.values() for key, column in columns.items()}
+
+    with st.form("screening_form"):
+        record = {}
+        st.subheader("Patient")
+        cols = st.columns(3)
+        for i, shared in enumerate(SHARED_FIELDS):
+            with cols[i % 3]:
+                record[shared] = schema_input(shared_field_spec(shared, schemas), key=f"screening_{shared}",
+                                              label=shared.title())
+        for model_key, display in zip(DISEASES, disease_options_display):
+            st.subheader(display)
+            col_count = 3 if model_key != 'parkinson' else 4
+            cols = st.columns(col_count)
+            specs = [spec for spec in schemas[model_key]["columns"] if (model_key, spec["name"]) not in shared_columns]
+            for i, spec in enumerate(specs):
+                with cols[i % col_count]:
+                    record[spec["name"]] = schema_input(spec, key=f"screening_{model_key}_{spec['name']}")
+
+        if st.form_submit_button("Run Combined Screening"):
+            try:
+                result = screen(record)
+                # Queued for the background writers and the report pool; nothing here waits on disk
+                record_screening(st.session_state.username, result, source="app")
+                for model_key, outcome in result["results"].items():
+                    if "prediction" in outcome:
+                        observe_inputs(model_key, [result["rows"][model_key]])
+                st.session_state.last_screening = {
+                    "screening": result,
+                    "report": submit_screening_report(st.session_state.username, st.session_state.username,
+                                                      result),
+                }
+            except Exception as e:
+                metrics.increment("prediction_errors", "screening")
+                st.error(f"Screening Error: {e}")
+
+    last_screening = st.session_state.get("last_screening")
+    if last_screening:
+        result = last_screening["screening"]
+        st.markdown("### Screening Results")
+        st.caption(f"{summary(result)} · scored in {result['seconds'] * 1000:.0f} ms")
+        for col, model_key, display in zip(st.columns(len(DISEASES)), DISEASES, disease_options_display):
+            outcome = result["results"][model_key]
+            with col:
+                st.markdown(f"**{display}**")
+                if "prediction" in outcome:
+                    display_result_card(outcome["prediction"], *result_labels[model_key],
+                                        confidence_score=f"{outcome['confidence'] * 100:.2f}%")
+                else:
+                    st.warning(result_text(model_key, outcome))
+        try:
+            report = last_screening["report"].result(timeout=30)
+            st.download_button("📄 Download Screening Report", data=report.getvalue(),
+                               file_name="screening_report.pdf", mime="application/pdf",
+                               key="screening_report_download")
+        except Exception as e:
+            st.warning(f"PDF report unavailable: {e}")
+
+
+@timed_fragment
+def feedback_panel(selected_model_key):
+    """Feedback form (appended to the event log, see event_log.py)."""
+    with st.expander("💬 Send Feedback"):
+        with st.form("feedback_form", clear_on_submit=True):
+            feedback_rating = st.slider("How useful was this prediction?", 1, 5, 4)
+            feedback_text = st.text_area("Your feedback")
+            if st.form_submit_button("Submit Feedback"):
+                if not feedback_text.strip():
+                    st.error("Please write some feedback first.")
+                # Wait for the group commit: the thank-you only shows once the feedback is on disk
+                elif append_event("feedback", sync=True, username=st.session_state.username,
+                                  disease=selected_model_key, rating=feedback_rating,
+                                  message=feedback_text.strip()):
+                    st.success("Thank you for your feedback!")
+                else:
+                    st.error("Could not save your feedback right now. Please try again.")
+
+
+def dashboard_page():
+    st.set_page_config(layout="wide") # Switch to wide layout for dashboard
+
+    st.sidebar.title(f"Welcome, {st.session_state.username}!")
+    if st.sidebar.button("Logout"):
+        end_session()
+        st.session_state.view = "login" # Go back to login on logout
+        st.rerun() # Rerun to show login page
+
+    # Changing disease is the one dashboard interaction that reruns the whole script
+    st.sidebar.header("Select Disease Prediction")
+    disease_choice_display = st.sidebar.radio("Choose a disease:", disease_options_display + [screening_option_display],
+                                              key="disease_choice_dash_v2")
+
+
+    # --- Dashboard Title and Animation ---
+    st.title("🩺 MediScan AI Dashboard") # Keep this title for the dashboard
+    lottie_dash_json = load_lottie_url(lottie_dashboard_url, fallback="assets/dashboard.json")
+    if lottie_dash_json:
+        show_lottie(lottie_dash_json, height=150, key="dash_anim_v2")
+    st.markdown("---") # Separator
+
+    if disease_choice_display == screening_option_display:
+        screening_panel()
+        feedback_panel("screening")
+        return
+    # Find the corresponding key
+    selected_model_key = DISEASES[disease_options_display.index(disease_choice_display)] # 'diabetes', 'heart', 'parkinson'
+    prediction_panel(selected_model_key, disease_choice_display)
+    feedback_panel(selected_model_key)
+
+
+# ---------------- Page Dispatch ----------------
+with metrics.timer("script_run", st.session_state.view, cpu=True):
+    if st.session_state.view == "register":
+        register_page()
+    elif st.session_state.view == "login":
+        login_page()
+    # --- VIEW 3: DASHBOARD PAGE (Only if logged_in is True) ---
+    elif st.session_state.view == "dashboard" and st.session_state.logged_in:
+        dashboard_page()
+    # Fallback view logic (if session state gets corrupted)
+    elif not st.session_state.logged_in:
+        st.session_state.view = "login" # Go back to login if logged out but somehow stuck in dashboard view
+        st.rerun()
 
 # Close wrapper div
-st.markdown("</div>", unsafe_allow_html=True)
\ No newline at end of file
+st.markdown("</div>", unsafe_allow_html=True)
+
+# ---------------- Warm-up ----------------
+# After the first page has been sent: import the ML stack, load the models and
+# form schemas, and spawn the hashing workers on a background thread (once per
+# process). `streamlit run app.py -- --profile-startup` prints where the time went.
+startup.warm_up(report="--profile-startup" in sys.argv)
@@ -0,0 +1,136 @@
+# asset_cache.py - Lottie animations loaded once per process, never blocking a page
+#
+# Local files are parsed once and kept in memory. Remote animations are served
+# from memory, then from an on-disk cache (with a TTL); a miss or a stale entry
+# starts a background download and the page renders with the stale copy, or
+# the bundled fallback file, instead of waiting on the network. A stale copy and
+# a miss are only re-checked after MEDISCAN_LOTTIE_RETRY_SECONDS, so reruns in
+# between neither re-read the disk nor start another download. With
+# MEDISCAN_OFFLINE=1 nothing is fetched and only bundled/cached files are used.
+import hashlib
+import json
+import os
+import threading
+import time
+
+import config
+
+_memory = {}          # local path -> (mtime, animation json); url -> (expires at, animation json or None)
+_in_flight = set()
+_failed = {}          # url -> time of the last failed fetch (retried after LOTTIE_RETRY_SECONDS)
+_lock = threading.Lock()
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_lottie_local(path_relative):
+    """Load a local Lottie JSON file from assets folder (parsed once per process)."""
+    path = os.path.join(APP_DIR, path_relative)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        print(f"[Lottie] File not found: {path}")
+        return None
+    cached = _memory.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            animation = json.load(f)
+    except Exception as e:
+        print(f"[Lottie] Error loading {path}: {e}")
+        return None
+    with _lock:
+        _memory[path] = (mtime, animation)
+    return animation
+
+
+def _disk_path(url):
+    return os.path.join(config.CACHE_DIR, "lottie", hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+
+def _read_disk(url):
+    path = _disk_path(url)
+    try:
+        age = time.time() - os.stat(path).st_mtime
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f), age
+    except (OSError, json.JSONDecodeError):
+        return None, None
+
+
+def _fetch(url):
+    """Background download into the memory and disk caches."""
+    ok = False
+    try:
+        import requests
+        r = requests.get(url, timeout=config.LOTTIE_FETCH_TIMEOUT)
+        if r.status_code == 200:
+            animation = r.json()
+            path = _disk_path(url)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(animation, f)
+            os.replace(tmp_path, path)
+            with _lock:
+                _memory[url] = (time.time() + config.LOTTIE_CACHE_TTL, animation)
+            ok = True
+        else:
+            print(f"[Lottie] {url} returned HTTP {r.status_code}")
+    except Exception as e:
+        print(f"[Lottie] Could not fetch {url}: {e}")
+    finally:
+        with _lock:
+            _in_flight.discard(url)
+            if ok:
+                _failed.pop(url, None)
+            else:
+                _failed[url] = time.time()
+
+
+def _refresh_in_background(url):
+    if config.OFFLINE:
+        return
+    with _lock:
+        if url in _in_flight or time.time() - _failed.get(url, float("-inf")) < config.LOTTIE_RETRY_SECONDS:
+            return
+        _in_flight.add(url)
+    threading.Thread(target=_fetch, args=(url,), name="lottie-fetch", daemon=True).start()
+
+
+def load_lottie_url(url, fallback=None):
+    """
+    Load a Lottie animation from a given URL without waiting on the network.
+    On a cold miss returns the local `fallback` file (or None); the remote animation
+    appears on a later rerun once fetched.
+    """
+    now = time.time()
+    cached = _memory.get(url)
+    if cached and now < cached[0]:
+        # Fresh, or a stale copy / miss (None) still inside its retry window
+        return cached[1] if cached[1] is not None else _fallback(fallback)
+
+    animation, age = _read_disk(url)
+    if animation is not None and age < config.LOTTIE_CACHE_TTL:
+        expires = now + config.LOTTIE_CACHE_TTL - age
+    else:
+        # Stale copy or nothing at all: serve what we have, look again after the retry window
+        animation = animation if animation is not None else (cached[1] if cached else None)
+        expires = now + config.LOTTIE_RETRY_SECONDS
+        _refresh_in_background(url)
+    with _lock:
+        current = _memory.get(url)
+        if not current or current[0] <= now:  # A fetch that just finished wins
+            _memory[url] = (expires, animation)
+    return animation if animation is not None else _fallback(fallback)
+
+
+def _fallback(path_relative):
+    return load_lottie_local(path_relative) if path_relative else None
+
+
+def prefetch(*urls):
+    """Warm the caches at startup so the first page view already has its animations."""
+    for url in urls:
+        load_lottie_url(url)
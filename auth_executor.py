@@ -0,0 +1,146 @@
+# auth_executor.py - Password hashing off the Streamlit script thread
+#
+# PBKDF2 is deliberately CPU-heavy. Running it inline means a burst of logins
+# stalls every other session handled by the same server thread pool. Here the
+# hash/verify work runs on a small, bounded process pool, the PBKDF2 round
+# count comes from configuration (old hashes are upgraded on the next
+# successful login), and a sliding-window throttle rejects credential-stuffing
+# bursts before any hashing is done.
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from passlib.hash import pbkdf2_sha256
+
+import config
+from metrics import timer
+
+
+# ---------------- Worker Functions (run in the pool) ----------------
+def _hasher(rounds):
+    return pbkdf2_sha256.using(rounds=rounds)
+
+
+def _hash(password, rounds):
+    return _hasher(rounds).hash(password)
+
+
+def _ping():
+    return True
+
+
+def _verify(password, hashed, rounds):
+    """Returns (password matches, hash should be upgraded to the configured rounds)."""
+    ok = pbkdf2_sha256.verify(password, hashed)
+    return ok, ok and _hasher(rounds).needs_update(hashed)
+
+
+# ---------------- Bounded Pool ----------------
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(config.AUTH_MAX_PENDING, 1))
+
+
+class AuthBusyError(RuntimeError):
+    """Raised when the hashing queue is full; callers should ask the user to retry."""
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn, not fork: the Streamlit server is multi-threaded
+                _pool = ProcessPoolExecutor(max_workers=config.AUTH_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _run(func, *args):
+    global _pool
+    if config.AUTH_WORKERS <= 0:
+        return func(*args)  # Inline mode (single-user installs, debugging)
+    if not _slots.acquire(timeout=config.AUTH_QUEUE_TIMEOUT):
+        raise AuthBusyError("Too many logins in progress. Please try again in a moment.")
+    try:
+        return _get_pool().submit(func, *args).result()
+    except BrokenProcessPool:
+        # A worker died (or could not start): rebuild the pool next time, answer this one inline
+        with _pool_lock:
+            _pool = None
+        print("[Auth] Hashing pool broke; falling back to inline hashing for this request")
+        return func(*args)
+    finally:
+        _slots.release()
+
+
+def hash_password(password):
+    with timer("password_hash"):
+        return _run(_hash, password, config.PBKDF2_ROUNDS)
+
+
+def verify_password(password, hashed):
+    """Returns (ok, needs_rehash) - needs_rehash is True when the stored rounds are outdated."""
+    with timer("password_verify"):
+        return _run(_verify, password, hashed, config.PBKDF2_ROUNDS)
+
+
+def warm_up():
+    """Start the worker processes ahead of the first login (they take a moment to spawn)."""
+    if config.AUTH_WORKERS > 0:
+        pool = _get_pool()
+        for future in [pool.submit(_ping) for _ in range(config.AUTH_WORKERS)]:
+            future.result()
+
+
+# ---------------- Throttling ----------------
+class AttemptThrottle:
+    """Sliding-window attempt counter per key (username or client IP)."""
+
+    def __init__(self, max_attempts, window_seconds, max_keys=100_000):
+        self.max_attempts = max_attempts
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, key, now):
+        attempts = self._attempts.get(key)
+        while attempts and now - attempts[0] > self.window:
+            attempts.popleft()
+        if attempts is not None and not attempts:
+            del self._attempts[key]
+        return attempts
+
+    def retry_after(self, key):
+        """Seconds until `key` may try again (0 if it is not throttled)."""
+        if not key or self.max_attempts <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._prune(key, now)
+            if attempts and len(attempts) >= self.max_attempts:
+                return max(0.0, self.window - (now - attempts[0]))
+        return 0
+
+    def record(self, key):
+        if not key or self.max_attempts <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if key not in self._attempts and len(self._attempts) >= self.max_keys:
+                # Bound memory under a flood of distinct keys: drop the stalest entries
+                for stale in list(self._attempts)[: self.max_keys // 10]:
+                    del self._attempts[stale]
+            self._attempts.setdefault(key, deque()).append(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._attempts.pop(key, None)
+
+
+# Failed logins per username, and all auth attempts per client IP
+user_throttle = AttemptThrottle(config.AUTH_MAX_FAILURES_PER_USER, config.AUTH_THROTTLE_WINDOW)
+ip_throttle = AttemptThrottle(config.AUTH_MAX_ATTEMPTS_PER_IP, config.AUTH_THROTTLE_WINDOW)
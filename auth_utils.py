@@ -1,59 +1,178 @@
-import json
-from passlib.hash import pbkdf2_sha256
-import jwt
 import datetime
+import threading
+import time
+import uuid
+from collections import OrderedDict
 
-# JWT secret key
-SECRET_KEY = "your_secret_key_here"
+import config
+from user_store import get_user_store
+from auth_executor import AuthBusyError, hash_password, verify_password, ip_throttle, user_throttle
+from event_log import append_event
 
-USERS_FILE = "users.json"
+# JWT secret key (shared by all replicas; see config.load_jwt_secret)
+SECRET_KEY = config.load_jwt_secret()
 
-# ---------------- USER STORAGE ----------------
-def load_users():
-    try:
-        with open(USERS_FILE, "r") as f:
-            return json.load(f)
-    except:
-        return {}
+# ---------------- THROTTLING ----------------
+def _throttled(username=None, ip=None):
+    wait = max(ip_throttle.retry_after(ip), user_throttle.retry_after(username))
+    if wait:
+        return f"Too many attempts. Please try again in {int(wait // 60) + 1} minute(s)."
+    return None
 
-def save_users(users):
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=4)
+# ---------------- AUDIT TRAIL ----------------
+def _audited(event, username, ip, result):
+    """Log the outcome of a register/login attempt to the event log and pass it through."""
+    ok, message = result
+    append_event(event, username=username, ok=ok, ip=ip, reason=None if ok else message)
+    return result
 
 # ---------------- REGISTER USER ----------------
-def register_user(username, password, email=None):
-    users = load_users()
-    if username in users:
-        return False, "User already exists"
-    hashed = pbkdf2_sha256.hash(password)
-    users[username] = {"password": hashed, "email": email}
-    save_users(users)
-    return True, "Registration successful"
+def register_user(username, password, email=None, ip=None):
+    username = username.strip().lower()
+    return _audited("register", username, ip, _register_user(username, password, email, ip))
+
+def _register_user(username, password, email=None, ip=None):
+    if not username or not password:
+        return False, "Username and password cannot be empty."
+    if email and "@" not in email:
+        return False, "Invalid email format."
+    message = _throttled(ip=ip)
+    if message:
+        return False, message
+    ip_throttle.record(ip)
+
+    try:
+        hashed = hash_password(password)
+    except AuthBusyError as e:
+        return False, str(e)
+    # Single atomic insert: concurrent sign-ups for the same name cannot both succeed
+    if not get_user_store().add(username, {"password": hashed, "email": email}):
+        return False, "User already exists. Click 'Login Now' below!"
+    return True, "Registration successful! Please login."
 
 # ---------------- VERIFY USER ----------------
-def verify_user(username, password):
-    users = load_users()
-    if username not in users:
-        return False, "User does not exist"
-    hashed = users[username]["password"]
-    if pbkdf2_sha256.verify(password, hashed):
-        return True, "Login successful"
-    return False, "Incorrect password"
+def verify_user(username, password, ip=None):
+    username = username.strip().lower()
+    return _audited("login", username, ip, _verify_user(username, password, ip))
+
+def _verify_user(username, password, ip=None):
+    message = _throttled(username, ip)
+    if message:
+        return False, message
+    ip_throttle.record(ip)
+
+    store = get_user_store()
+    user = store.get(username)
+    if user is None:
+        user_throttle.record(username)
+        return False, "User does not exist or incorrect password"
+    if not user.get("password"):
+        return False, "User data incomplete."
+
+    try:
+        ok, needs_rehash = verify_password(password, user["password"])
+    except AuthBusyError as e:
+        return False, str(e)
+    if not ok:
+        user_throttle.record(username)
+        return False, "User does not exist or incorrect password"
+
+    user_throttle.reset(username)
+    if needs_rehash:
+        # Round count changed in config: upgrade the stored hash while we have the plain password
+        try:
+            store.update(username, password=hash_password(password))
+        except AuthBusyError:
+            pass  # Try again on the next login
+    return True, "Login successful"
 
 # ---------------- JWT TOKEN ----------------
+# Access tokens are short-lived and verified statelessly (any replica can check
+# them with the shared secret). Refresh tokens are single-use: each exchange
+# returns a new pair, and presenting an already-used one revokes its whole family.
+# PyJWT is imported inside these functions: the register/login pages never need it.
+_token_cache = OrderedDict()  # access token -> (username, exp timestamp)
+_token_cache_lock = threading.Lock()
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
 def create_token(username):
+    import jwt
     payload = {
         "username": username,
-        "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=2)
+        "type": "access",
+        "exp": _now() + datetime.timedelta(minutes=config.ACCESS_TOKEN_MINUTES)
     }
     token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
     return token
 
+def create_refresh_token(username, family=None):
+    import jwt
+    family = family or uuid.uuid4().hex
+    jti = uuid.uuid4().hex
+    expires = _now() + datetime.timedelta(days=config.REFRESH_TOKEN_DAYS)
+    get_user_store().add_refresh_token(jti, username, family, expires.timestamp())
+    payload = {"username": username, "type": "refresh", "jti": jti, "family": family, "exp": expires}
+    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+
+def issue_tokens(username):
+    """Access + refresh token pair for a freshly authenticated user."""
+    return create_token(username), create_refresh_token(username)
+
 def verify_token(token):
+    now = time.time()
+    with _token_cache_lock:
+        cached = _token_cache.get(token)
+        if cached and cached[1] > now:
+            _token_cache.move_to_end(token)
+            return True, cached[0]
+    import jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        return True, payload["username"]
+        if payload.get("type", "access") != "access":
+            return False, "Invalid token"
     except jwt.ExpiredSignatureError:
         return False, "Token expired"
     except jwt.InvalidTokenError:
-        return False, "Invalid token"
\ No newline at end of file
+        return False, "Invalid token"
+
+    with _token_cache_lock:
+        _token_cache[token] = (payload["username"], payload["exp"])
+        while len(_token_cache) > config.TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return True, payload["username"]
+
+def refresh_session(refresh_token):
+    """Rotate a refresh token. Returns (True, (username, access, refresh)) or (False, message)."""
+    import jwt
+    try:
+        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        return False, "Session expired"
+    except jwt.InvalidTokenError:
+        return False, "Invalid session"
+    if payload.get("type") != "refresh":
+        return False, "Invalid session"
+
+    store = get_user_store()
+    username = store.consume_refresh_token(payload["jti"])
+    if username is None:
+        # Signed by us but already used: someone replayed it, so end every session in that chain
+        store.revoke_refresh_tokens(family=payload["family"])
+        return False, "Session no longer valid. Please login again."
+    return True, (username, create_token(username), create_refresh_token(username, payload["family"]))
+
+def revoke_session(refresh_token):
+    """Logout of one session: its refresh-token family stops working, other devices stay logged in."""
+    import jwt
+    try:
+        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=["HS256"], options={"verify_exp": False})
+    except jwt.InvalidTokenError:
+        return
+    if payload.get("type") == "refresh":
+        get_user_store().revoke_refresh_tokens(family=payload["family"])
+
+def revoke_tokens(username):
+    """Logout everywhere: every refresh token of the user stops working; access tokens expire on their own."""
+    get_user_store().revoke_refresh_tokens(username=username)
@@ -0,0 +1,103 @@
+# batch_predict.py - Score whole CSV cohorts with the trained disease models
+#
+# Usage:
+#   python batch_predict.py heart cohort.csv -o cohort_scored.csv
+#   python batch_predict.py diabetes patients.csv --chunk-size 20000
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+
+import config
+from inference import DISEASES, predict_frame
+from pipeline import load_pipeline
+
+
+def _iter_chunks(data, chunk_size):
+    """Yield DataFrame chunks from a CSV path or an in-memory DataFrame."""
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, len(data), chunk_size):
+            yield data.iloc[start:start + chunk_size]
+    else:
+        yield from pd.read_csv(data, chunksize=chunk_size)
+
+
+def predict_batch(model_key, data, output_path=None, chunk_size=None, pipeline=None):
+    """
+    Score every row of `data` (CSV path or DataFrame) for one disease.
+
+    Rows are processed in fixed-size chunks, each chunk going through the
+    impute -> scale -> model chain in a single vectorized pass. When
+    `output_path` is given the scored rows are streamed to that CSV and only the
+    run statistics are returned; otherwise the scored DataFrame is returned too.
+    """
+    if model_key not in DISEASES:
+        raise ValueError(f"Unknown disease '{model_key}'. Choose one of: {', '.join(DISEASES)}")
+    chunk_size = chunk_size or config.BATCH_CHUNK_SIZE
+    pipeline = pipeline or load_pipeline(model_key)
+
+    if output_path and not isinstance(data, pd.DataFrame) \
+            and os.path.realpath(output_path) == os.path.realpath(data):
+        raise ValueError(f"Output {output_path} is the input CSV; choose another output path")
+
+    scored_chunks = []
+    rows = 0
+    start = time.perf_counter()
+    # A failed run leaves any earlier output untouched; only the .tmp file is discarded
+    tmp_path = f"{output_path}.tmp" if output_path else None
+    out = open(tmp_path, "w", newline="") if output_path else None
+    try:
+        for chunk in _iter_chunks(data, chunk_size):
+            predictions, probabilities = predict_frame(pipeline, model_key, chunk)
+            scored = chunk.copy()
+            scored["prediction"] = predictions
+            scored["probability"] = probabilities
+            scored["confidence"] = np.where(predictions == 1, probabilities, 1 - probabilities)
+
+            if out:
+                scored.to_csv(out, header=(rows == 0), index=False)
+            else:
+                scored_chunks.append(scored)
+            rows += len(chunk)
+    except BaseException:
+        if out:
+            out.close()
+            os.remove(tmp_path)
+        raise
+    if out:
+        out.close()
+        os.replace(tmp_path, output_path)
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "disease": model_key,
+        "rows": rows,
+        "seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed > 0 else float("inf"),
+    }
+    if output_path:
+        return stats
+    result = pd.concat(scored_chunks, ignore_index=True) if scored_chunks else pd.DataFrame()
+    return result, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-score a CSV cohort with a MediScan AI model.")
+    parser.add_argument("disease", choices=DISEASES, help="Which disease model to use")
+    parser.add_argument("input", help="CSV file with one patient per row")
+    parser.add_argument("-o", "--output", help="Output CSV (default: <input>_<disease>_scored.csv)")
+    parser.add_argument("--chunk-size", type=int, default=config.BATCH_CHUNK_SIZE,
+                        help=f"Rows per vectorized pass (default: {config.BATCH_CHUNK_SIZE})")
+    args = parser.parse_args(argv)
+
+    output = args.output or f"{os.path.splitext(args.input)[0]}_{args.disease}_scored.csv"
+    if os.path.realpath(output) == os.path.realpath(args.input):
+        parser.error(f"output {output} is the input CSV; choose another -o path")
+    stats = predict_batch(args.disease, args.input, output_path=output, chunk_size=args.chunk_size)
+    print(f"✅ Scored {stats['rows']} rows in {stats['seconds']:.2f}s "
+          f"({stats['rows_per_second']:,.0f} rows/s) -> {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# bench_auth.py - Registration and login latency (p50/p99) under concurrent load
+#
+# Usage:
+#   python benchmarks/bench_auth.py --users 200 --logins 400 --concurrency 32
+#   MEDISCAN_AUTH_WORKERS=0 python benchmarks/bench_auth.py   # compare with inline hashing
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import latency_summary, write_results
+
+
+def run(users=100, logins=300, concurrency=32):
+    # common.py already pointed the user store at a temp dir, so real accounts are never touched
+    import config
+    from auth_utils import register_user, verify_user
+    from auth_executor import warm_up
+
+    warm_up()
+    print(f"PBKDF2 rounds={config.PBKDF2_ROUNDS}, auth workers={config.AUTH_WORKERS}, "
+          f"client threads={concurrency}")
+
+    names = [f"bench{i}@example.com" for i in range(users)]
+
+    def register(name):
+        t0 = time.perf_counter()
+        ok, _ = register_user(name, "s3cret-pass", name)
+        return ok, time.perf_counter() - t0
+
+    def login(i):
+        t0 = time.perf_counter()
+        ok, _ = verify_user(names[i % len(names)], "s3cret-pass")
+        return ok, time.perf_counter() - t0
+
+    results = {"pbkdf2_rounds": config.PBKDF2_ROUNDS, "auth_workers": config.AUTH_WORKERS,
+               "concurrency": concurrency}
+    for label, func, count in (("register", register, users), ("login", login, logins)):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            outcomes = list(pool.map(func, names if label == "register" else range(count)))
+        elapsed = time.perf_counter() - start
+        results[label] = {
+            **latency_summary([t for _, t in outcomes]),
+            "per_second": round(count / elapsed, 2),
+            "failures": sum(1 for ok, _ in outcomes if not ok),
+        }
+        r = results[label]
+        print(f"{label}: {count} in {elapsed:.2f}s ({r['per_second']}/s), p50 {r['p50_ms']:.1f} ms, "
+              f"p99 {r['p99_ms']:.1f} ms, failures {r['failures']}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark register_user/verify_user under concurrency.")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--logins", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+    write_results("auth", run(args.users, args.logins, args.concurrency), args.output)
+
+
+if __name__ == "__main__":
+    main()
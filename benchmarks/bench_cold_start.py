@@ -0,0 +1,96 @@
+# bench_cold_start.py - Time from a fresh interpreter to the first prediction
+#
+# Each repetition starts a new Python process, so import cost, artifact load
+# and the first (unwarmed) prediction are all included. A second probe times
+# the Streamlit app's first page (login screen) from a fresh process, with the
+# background warm-up off so only what the page itself needs is counted.
+#
+# Usage:
+#   python benchmarks/bench_cold_start.py --repeats 5
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from common import ROOT, latency_summary, write_results
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+from inference import predict_frame
+from pipeline import load_pipeline
+from feature_schema import get_schema
+import pandas as pd
+imported = time.perf_counter()
+pipeline = load_pipeline({key!r})
+loaded = time.perf_counter()
+schema = get_schema({key!r})
+row = {{c["name"]: (c["options"][c["default_index"]] if c["kind"] == "categorical" else c["value"])
+       for c in schema["columns"]}}
+predict_frame(pipeline, {key!r}, pd.DataFrame([row]))
+done = time.perf_counter()
+print(json.dumps({{"import": imported - t0, "load": loaded - imported, "first_prediction": done - loaded,
+                  "total": done - t0}}))
+"""
+
+APP_PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=120).run()
+done = time.perf_counter()
+heavy = [m for m in ("pandas", "pyarrow", "fpdf", "sklearn") if m in sys.modules]
+print(json.dumps({{"streamlit": imported - t0, "first_page": done - imported, "total": done - t0,
+                  "heavy_modules": heavy, "exceptions": len(at.exception)}}))
+"""
+
+
+def run_app_first_page(repeats=5):
+    # common.py isolated the user store and set MEDISCAN_OFFLINE; the child inherits that environment
+    env = dict(os.environ, MEDISCAN_WARM_UP="0")
+    samples = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", APP_PROBE.format(root=ROOT)], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    result = {stage: latency_summary([s[stage] for s in samples]) for stage in ("streamlit", "first_page", "total")}
+    result["heavy_modules"] = samples[-1]["heavy_modules"]
+    result["exceptions"] = max(s["exceptions"] for s in samples)
+    print(f"{'app':<10} first page p50 {result['first_page']['p50_ms']:.0f} ms "
+          f"(+ streamlit import {result['streamlit']['p50_ms']:.0f} ms), loaded: {', '.join(result['heavy_modules'])}")
+    return result
+
+
+def run(repeats=5, diseases=None):
+    from inference import DISEASES
+
+    results = {}
+    for model_key in diseases or DISEASES:
+        samples = []
+        for _ in range(repeats):
+            out = subprocess.run([sys.executable, "-c", PROBE.format(root=ROOT, key=model_key)], cwd=ROOT,
+                                 capture_output=True, text=True, check=True)
+            samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        results[model_key] = {stage: latency_summary([s[stage] for s in samples])
+                              for stage in ("import", "load", "first_prediction", "total")}
+        r = results[model_key]
+        print(f"{model_key:<10} total p50 {r['total']['p50_ms']:.0f} ms (import {r['import']['p50_ms']:.0f}, "
+              f"artifact load {r['load']['p50_ms']:.2f}, first prediction {r['first_prediction']['p50_ms']:.1f})")
+    results["app_first_page"] = run_app_first_page(repeats)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark cold-start time to the first prediction.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+    write_results("cold_start", run(args.repeats), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# bench_drift.py - Cost of the drift monitor on the prediction path
+#
+# Feeds synthetic patients one at a time through observe() (as make_prediction
+# does) and reports the per-call latency, the time to build a drift report and
+# the snapshot size, which must not grow with the number of predictions.
+#
+# Usage:
+#   python benchmarks/bench_drift.py --rows 20000
+import argparse
+import os
+import time
+
+from common import WORKDIR, latency_summary, synthetic_patients, write_results
+
+
+def run(rows=20000, seed=0):
+    from drift import DriftMonitor, save_reference
+    from datasets import load_dataset
+    from inference import DISEASES
+
+    results = {"rows": rows}
+    models_path = os.path.join(WORKDIR, "drift-models")
+    for model_key in DISEASES:
+        # References built from the reference CSVs into the temp dir, as train_models.py would
+        save_reference(model_key, load_dataset(model_key), models_path=models_path)
+        monitor = DriftMonitor(f"bench-{model_key}", snapshot_dir=os.path.join(WORKDIR, "drift"),
+                               models_path=models_path)
+        records = synthetic_patients(model_key, rows, seed).to_dict("records")
+        sizes, times = [], []
+        for i, record in enumerate(records):
+            t0 = time.perf_counter()
+            monitor.observe(model_key, [record])
+            times.append(time.perf_counter() - t0)
+            if i + 1 in (rows // 10, rows):
+                monitor.snapshot()
+                sizes.append(os.path.getsize(monitor.snapshot_path))
+        t0 = time.perf_counter()
+        report = monitor.report(model_key)
+        results[model_key] = {
+            "observe": latency_summary(times),
+            "report_ms": round((time.perf_counter() - t0) * 1000, 3),
+            "snapshot_bytes": sizes,
+            "max_psi": report["max_psi"],
+        }
+        r = results[model_key]
+        print(f"{model_key:<9}: observe p50 {r['observe']['p50_ms'] * 1000:.1f} us, "
+              f"p99 {r['observe']['p99_ms'] * 1000:.1f} us; report {r['report_ms']:.2f} ms; "
+              f"snapshot {sizes[0]:,} -> {sizes[-1]:,} bytes after {rows // 10:,} -> {rows:,} rows")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the streaming drift monitor.")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+    write_results("drift", run(args.rows), args.output)
+
+
+if __name__ == "__main__":
+    main()
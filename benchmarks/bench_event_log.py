@@ -0,0 +1,94 @@
+# bench_event_log.py - Event log append latency and fsync batching under concurrent writers
+#
+# Several processes, each with many threads standing in for Streamlit sessions,
+# append to one shared log. Reports per-append latency for fire-and-forget and
+# durable (sync=True) appends, events per fsync, and checks that every line
+# came out whole.
+#
+# Usage:
+#   python benchmarks/bench_event_log.py --processes 4 --threads 16 --events 500
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from common import WORKDIR, latency_summary, write_results
+
+
+def _writer(args):
+    path, threads, events, sync, max_bytes = args
+    from event_log import EventLog
+
+    log = EventLog(path, max_bytes=max_bytes)
+
+    def session(i):
+        times = []
+        for n in range(events):
+            t0 = time.perf_counter()
+            log.append("prediction", sync=sync, username=f"bench{i}@example.com", disease="heart",
+                       prediction=n % 2, probability=0.5, model_version="v2-bench")
+            times.append(time.perf_counter() - t0)
+        return times
+
+    with ThreadPoolExecutor(threads) as pool:
+        times = [t for chunk in pool.map(session, range(threads)) for t in chunk]
+    log.close()
+    return times, log.commits
+
+
+def run(processes=4, threads=16, events=500, max_bytes=4 * 2 ** 20):
+    from event_log import read_events, segments
+
+    results = {"processes": processes, "threads_per_process": threads, "events_per_thread": events}
+    context = multiprocessing.get_context("spawn")
+    for mode, sync in (("async", False), ("sync", True)):
+        path = os.path.join(WORKDIR, f"events-{mode}.jsonl")
+        start = time.perf_counter()
+        with ProcessPoolExecutor(processes, mp_context=context) as pool:
+            outcomes = list(pool.map(_writer, [(path, threads, events, sync, max_bytes)] * processes))
+        elapsed = time.perf_counter() - start
+        time.sleep(0.5)  # Let background gzip of rotated segments finish
+
+        total = processes * threads * events
+        commits = sum(c for _, c in outcomes)
+        lines = sum(1 for _ in read_events(path))
+        torn = 0
+        for segment in segments(path):
+            if not segment.endswith(".gz"):
+                with open(segment, "rb") as f:
+                    for line in f:
+                        try:
+                            json.loads(line)
+                        except json.JSONDecodeError:
+                            torn += 1
+        results[mode] = {
+            **latency_summary([t for times, _ in outcomes for t in times]),
+            "events": total,
+            "events_per_second": round(total / elapsed, 1),
+            "fsyncs": commits,
+            "events_per_fsync": round(total / max(commits, 1), 1),
+            "segments": len(segments(path)),
+            "lines_read_back": lines,
+            "torn_lines": torn,
+        }
+        r = results[mode]
+        print(f"{mode:<5}: {total:,} events in {elapsed:.2f}s ({r['events_per_second']:,.0f}/s), "
+              f"p50 {r['p50_ms']:.3f} ms, p99 {r['p99_ms']:.3f} ms, {r['events_per_fsync']} events/fsync, "
+              f"{r['segments']} segments, {lines:,} lines read back")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the append-only event log.")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+    write_results("event_log", run(args.processes, args.threads, args.events), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# bench_forest.py - Compiled random forest vs sklearn predict (heart / parkinson pages)
+#
+# Fits each page's forest, compiles it into a temp dir, and times one-patient
+# predictions (what the pages do) and a batch of synthetic patients with both
+# evaluators. Also times what a fresh process pays before its first
+# prediction: fitting from the CSV (the old start-up) vs loading the arrays.
+#
+# Usage:
+#   python benchmarks/bench_forest.py --requests 500 --batch 10000
+import argparse
+import time
+
+from common import WORKDIR, latency_summary, synthetic_patients, write_results
+
+
+def _timed(func, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def run(requests=500, batch=10000, diseases=None):
+    import numpy as np
+    from forest import FOREST_DISEASES, compile_disease, fit_forest, load_forest
+
+    results = {"requests": requests, "batch_rows": batch}
+    for model_key in diseases or FOREST_DISEASES:
+        stats = compile_disease(model_key, models_path=WORKDIR)
+        model, X, _ = fit_forest(model_key)
+        forest = load_forest(model_key, models_path=WORKDIR)
+        patients = synthetic_patients(model_key, max(batch, requests), seed=1)[X.columns]
+        rows = [patients.iloc[[i]] for i in range(requests)]
+
+        model.predict(rows[0]), forest.predict(rows[0])  # Warm both paths
+        single_sklearn = [t for row in rows for t in _timed(lambda: model.predict(row), 1)]
+        single_compiled = [t for row in rows for t in _timed(lambda: forest.predict(row), 1)]
+        block = patients.iloc[:batch]
+        batch_sklearn = min(_timed(lambda: model.predict_proba(block), 3))
+        batch_compiled = min(_timed(lambda: forest.predict_proba(block), 3))
+        agree = bool(np.allclose(model.predict_proba(block), forest.predict_proba(block)))
+
+        results[model_key] = {
+            "trees": stats["trees"],
+            "nodes": stats["nodes"],
+            "depth": stats["depth"],
+            "artifact_bytes": stats["bytes"],
+            "startup_fit_ms": round(min(_timed(lambda: fit_forest(model_key), 3)) * 1000, 2),
+            "startup_load_ms": round(min(_timed(lambda: load_forest(model_key, models_path=WORKDIR), 10)) * 1000, 2),
+            "single_sklearn": latency_summary(single_sklearn),
+            "single_compiled": latency_summary(single_compiled),
+            "batch_sklearn_rows_per_second": round(batch / batch_sklearn, 1),
+            "batch_compiled_rows_per_second": round(batch / batch_compiled, 1),
+            "probabilities_match": agree,
+        }
+        r = results[model_key]
+        print(f"{model_key:<9}: start-up fit {r['startup_fit_ms']:.1f} ms -> load {r['startup_load_ms']:.2f} ms; "
+              f"1 row p50 {r['single_sklearn']['p50_ms']:.3f} -> {r['single_compiled']['p50_ms']:.3f} ms; "
+              f"{batch:,} rows {r['batch_sklearn_rows_per_second']:,.0f} -> "
+              f"{r['batch_compiled_rows_per_second']:,.0f} rows/s; match={agree}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark compiled random forests against sklearn.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--diseases", nargs="+", default=None)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+    write_results("forest", run(args.requests, args.batch, args.diseases), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# bench_history.py - Prediction history: request-path record cost and dashboard query latency
+#
+# Fills a fresh history store with `rows` predictions spread over many users,
+# then times record() as the app calls it and the dashboard's recent()/trend()
+# queries for single users.
+#
+# Usage:
+#   python benchmarks/bench_history.py --rows 200000 --queries 1000
+import argparse
+import random
+import time
+
+from common import latency_summary, write_results
+
+
+def run(rows=200000, queries=1000, users=2000, seed=0):
+    # common.py already pointed MEDISCAN_HISTORY_DB at a temp dir
+    from inference import DISEASES
+    from prediction_history import PredictionHistory
+
+    history = PredictionHistory()
+    rng = random.Random(seed)
+    names = [f"bench{i}@example.com" for i in range(users)]
+    now = time.time()
+    inputs = {"age": 63, "sex": 1, "cp": 3, "trestbps": 145, "chol": 233}
+
+    # Bulk load through the writer, as many sessions would over time
+    start = time.perf_counter()
+    for i in range(0, rows, 1000):
+        history.record_many([(rng.choice(names), rng.choice(DISEASES), inputs, rng.random() < 0.3, rng.random(),
+                              "v2-bench", now - rng.random() * 180 * 86400) for _ in range(min(1000, rows - i))])
+    history.flush(timeout=300)
+    load_seconds = time.perf_counter() - start
+
+    record_times = []
+    for _ in range(queries):
+        t0 = time.perf_counter()
+        history.record(rng.choice(names), "heart", inputs, 1, 0.87, "v2-bench")
+        record_times.append(time.perf_counter() - t0)
+    history.flush()
+
+    recent_times, trend_times = [], []
+    for _ in range(queries):
+        name = rng.choice(names)
+        t0 = time.perf_counter()
+        history.recent(name, limit=10)
+        recent_times.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        history.trend(name, rng.choice(DISEASES), days=90)
+        trend_times.append(time.perf_counter() - t0)
+
+    results = {
+        "rows": history.count(),
+        "users": users,
+        "bulk_rows_per_second": round(rows / load_seconds, 1),
+        "record": latency_summary(record_times),
+        "recent_10": latency_summary(recent_times),
+        "trend_90d": latency_summary(trend_times),
+    }
+    print(f"{results['rows']:,} rows loaded at {results['bulk_rows_per_second']:,.0f} rows/s")
+    for label in ("record", "recent_10", "trend_90d"):
+        r = results[label]
+        print(f"{label:<10} p50 {r['p50_ms']:.3f} ms  p99 {r['p99_ms']:.3f} ms")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the prediction history store.")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+    write_results("history", run(args.rows, args.queries, args.users), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# bench_inference.py - Single-row and batched prediction latency per disease
+#
+# Usage:
+#   python benchmarks/bench_inference.py --single 500 --batch-rows 1000 100000
+import argparse
+import time
+
+from common import latency_summary, synthetic_patients, write_results
+
+
+def run(single=500, batch_rows=(1000, 100000), diseases=None, seed=0):
+    from inference import DISEASES, predict_frame
+    from pipeline import load_pipeline
+    from prediction_cache import PredictionCache
+    import prediction_cache
+
+    results = {}
+    for model_key in diseases or DISEASES:
+        pipeline = load_pipeline(model_key)
+        patients = synthetic_patients(model_key, max(single, *batch_rows), seed)
+        rows = [patients.iloc[[i]] for i in range(single)]
+        predict_frame(pipeline, model_key, rows[0])  # Warm-up
+
+        timings = []
+        for row in rows:
+            t0 = time.perf_counter()
+            predict_frame(pipeline, model_key, row)
+            timings.append(time.perf_counter() - t0)
+        entry = {"model_kind": pipeline.kind, "single_row": latency_summary(timings)}
+
+        # Same rows through the process-wide result cache, second pass = all hits
+        prediction_cache.cache = PredictionCache()
+        for row in rows:
+            prediction_cache.predict_cached(model_key, row)
+        timings = []
+        for row in rows:
+            t0 = time.perf_counter()
+            prediction_cache.predict_cached(model_key, row)
+            timings.append(time.perf_counter() - t0)
+        entry["single_row_cached"] = latency_summary(timings)
+
+        entry["batched"] = {}
+        for n in batch_rows:
+            batch = patients.iloc[:n]
+            t0 = time.perf_counter()
+            predict_frame(pipeline, model_key, batch)
+            elapsed = time.perf_counter() - t0
+            entry["batched"][str(n)] = {"seconds": round(elapsed, 4), "rows_per_second": round(n / elapsed, 1)}
+
+        results[model_key] = entry
+        print(f"{model_key:<10} single p50 {entry['single_row']['p50_ms']:.3f} ms "
+              f"(cached {entry['single_row_cached']['p50_ms']:.3f} ms), "
+              + ", ".join(f"{n} rows {v['rows_per_second']:,.0f}/s" for n, v in entry["batched"].items()))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark prediction latency on synthetic patients.")
+    parser.add_argument("--single", type=int, default=500, help="Single-row predictions per disease")
+    parser.add_argument("--batch-rows", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+    write_results("inference", run(args.single, args.batch_rows, seed=args.seed), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# bench_reports.py - PDF report rendering: in-process latency and cohort throughput
+#
+# Usage:
+#   python benchmarks/bench_reports.py --single 100 --cohort 400
+import argparse
+import os
+import shutil
+import time
+
+from common import WORKDIR, latency_summary, write_results
+
+
+def run(single=100, cohort=400):
+    workdir = WORKDIR
+    from pdf_generator import generate_health_report_bytes
+    from report_service import render_cohort
+    import config
+
+    timings = []
+    for i in range(single):
+        t0 = time.perf_counter()
+        generate_health_report_bytes(f"patient{i}", f"patient{i}@example.com",
+                                     "High Risk (confidence 87.10%)", "Heart Disease")
+        timings.append(time.perf_counter() - t0)
+    results = {"single_inline": latency_summary(timings)}
+
+    records = [{"name": f"patient{i}", "email": f"patient{i}@example.com",
+                "prediction_result": "Low Risk (confidence 91.20%)", "disease_name": "Diabetes"}
+               for i in range(cohort)]
+    output_dir = os.path.join(workdir, "reports")
+    render_cohort(records[:config.REPORT_WORKERS or 1], output_dir)  # Start the worker processes
+    t0 = time.perf_counter()
+    paths = render_cohort(records, output_dir)
+    elapsed = time.perf_counter() - t0
+    results["cohort"] = {"reports": len(paths), "workers": config.REPORT_WORKERS,
+                         "seconds": round(elapsed, 4), "reports_per_second": round(len(paths) / elapsed, 1)}
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    print(f"single report p50 {results['single_inline']['p50_ms']:.2f} ms, "
+          f"cohort {cohort} reports at {results['cohort']['reports_per_second']}/s "
+          f"({config.REPORT_WORKERS} workers)")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PDF report rendering.")
+    parser.add_argument("--single", type=int, default=100)
+    parser.add_argument("--cohort", type=int, default=400)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+    write_results("reports", run(args.single, args.cohort), args.output)
+
+
+if __name__ == "__main__":
+    main()
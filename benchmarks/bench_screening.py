@@ -0,0 +1,68 @@
+# bench_screening.py - Combined screening: screen() vs one-after-another scoring of three models
+#
+# Builds synthetic patient records holding the fields of every disease and
+# times screening.screen() (inline for fused pipelines, on the thread pool for
+# sklearn estimators) against scoring the same rows sequentially, next to the
+# slowest single model, which is the floor a concurrent screen can reach. The
+# prediction cache is off so every call reaches the models.
+#
+# Usage:
+#   python benchmarks/bench_screening.py --patients 500
+import argparse
+import time
+
+from common import latency_summary, synthetic_patients, write_results
+
+
+def run(patients=500, seed=0):
+    from inference import DISEASES
+    from prediction_cache import cache
+    from screening import _score, screen, split_record
+
+    cache.max_entries = 0
+    frames = {key: synthetic_patients(key, patients, seed) for key in DISEASES}
+    records = []
+    for i in range(patients):
+        record = {}
+        for key in DISEASES:
+            record.update(frames[key].iloc[i].to_dict())
+        records.append(record)
+    screen(records[0])  # Load the artifacts (and start the pool, if used) outside the timings
+
+    sequential, screened, slowest = [], [], []
+    for record in records:
+        rows = split_record(record)
+        per_model = []
+        t0 = time.perf_counter()
+        for key, row in rows.items():
+            t1 = time.perf_counter()
+            _score(key, row)
+            per_model.append(time.perf_counter() - t1)
+        sequential.append(time.perf_counter() - t0)
+        slowest.append(max(per_model))
+        t0 = time.perf_counter()
+        screen(record)
+        screened.append(time.perf_counter() - t0)
+
+    results = {
+        "patients": patients,
+        "sequential": latency_summary(sequential),
+        "screen": latency_summary(screened),
+        "slowest_model": latency_summary(slowest),
+    }
+    for label in ("sequential", "screen", "slowest_model"):
+        r = results[label]
+        print(f"{label:<14} p50 {r['p50_ms']:.3f} ms  p95 {r['p95_ms']:.3f} ms  p99 {r['p99_ms']:.3f} ms")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark combined multi-disease screening.")
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+    write_results("screening", run(args.patients), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# common.py - Shared helpers for the benchmark scripts
+#
+# Synthetic patients are drawn from the bundled data/*.csv distributions
+# (numeric columns: normal with the column's mean/std, clipped to its range;
+# categorical columns: the observed level frequencies), with a fixed seed so
+# runs are comparable across commits. Results are written as JSON with enough
+# metadata (commit, Python, CPU count) to line them up later.
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # models/, data/ and config defaults are relative to the repository root
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def percentile(sorted_values, q):
+    return sorted_values[int(q * (len(sorted_values) - 1))]
+
+
+def latency_summary(seconds):
+    """count / mean / p50 / p95 / p99 in milliseconds for a list of durations."""
+    values = sorted(seconds)
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 4),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 4),
+    }
+
+
+def _isolate():
+    """Point the user store, history, event log and drift snapshots at a temp dir so benchmarks never touch real data."""
+    workdir = tempfile.mkdtemp(prefix="mediscan-bench-")
+    os.environ["MEDISCAN_USER_DB"] = os.path.join(workdir, "users.db")
+    os.environ["MEDISCAN_USERS_FILE"] = os.path.join(workdir, "users.json")
+    os.environ["MEDISCAN_HISTORY_DB"] = os.path.join(workdir, "history.db")
+    os.environ["MEDISCAN_EVENT_LOG_PATH"] = os.path.join(workdir, "events.jsonl")
+    os.environ["MEDISCAN_DRIFT_DIR"] = os.path.join(workdir, "drift")
+    os.environ.setdefault("MEDISCAN_OFFLINE", "1")
+    return workdir
+
+
+# Must happen before config is imported anywhere: its paths are read once at import time
+WORKDIR = _isolate()
+
+
+def synthetic_patients(model_key, n, seed=0):
+    """n raw input rows (without the target) shaped like the disease's reference dataset."""
+    import numpy as np
+    import pandas as pd
+    from datasets import load_dataset
+    from inference import TARGET_COLUMNS, CATEGORICAL_COLUMNS, DROP_COLUMNS
+
+    rng = np.random.default_rng(seed)
+    ref = load_dataset(model_key).drop(columns=[TARGET_COLUMNS[model_key]] + DROP_COLUMNS[model_key],
+                                       errors="ignore")
+    columns = {}
+    for col in ref.columns:
+        series = ref[col].dropna()
+        if col in CATEGORICAL_COLUMNS[model_key]:
+            freq = series.value_counts(normalize=True)
+            columns[col] = rng.choice(freq.index.to_numpy(), size=n, p=freq.to_numpy())
+        else:
+            values = rng.normal(series.mean(), series.std() if len(series) > 1 else 0.0, n)
+            values = np.clip(values, series.min(), series.max())
+            columns[col] = np.round(values) if pd.api.types.is_integer_dtype(series) else values
+    return pd.DataFrame(columns)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_results(name, results, output=None):
+    """Write {"environment": ..., "results": ...} to output or benchmarks/results/<name>-<commit>-<time>.json."""
+    env = environment()
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = env["timestamp"].replace(":", "").replace("-", "")
+        output = os.path.join(RESULTS_DIR, f"{name}-{env['commit'] or 'nogit'}-{stamp}.json")
+    with open(output, "w") as f:
+        json.dump({"benchmark": name, "environment": env, "results": results}, f, indent=2)
+    print(f"📝 Results written to {output}")
+    return output
@@ -0,0 +1,52 @@
+# run_all.py - Run every benchmark and write one combined JSON result file
+#
+# Usage:
+#   python benchmarks/run_all.py                 # full run (a few minutes on a laptop CPU)
+#   python benchmarks/run_all.py --quick         # smoke-sized run
+#   python benchmarks/run_all.py --only inference reports --output results.json
+import argparse
+import time
+
+from common import write_results
+
+import bench_auth
+import bench_cold_start
+import bench_drift
+import bench_event_log
+import bench_forest
+import bench_history
+import bench_inference
+import bench_reports
+import bench_screening
+
+SUITES = {
+    "inference": (lambda quick: bench_inference.run(100 if quick else 500, (1000,) if quick else (1000, 100000))),
+    "auth": (lambda quick: bench_auth.run(20 if quick else 100, 50 if quick else 300)),
+    "reports": (lambda quick: bench_reports.run(20 if quick else 100, 50 if quick else 400)),
+    "cold_start": (lambda quick: bench_cold_start.run(2 if quick else 5)),
+    "history": (lambda quick: bench_history.run(20000 if quick else 200000, 200 if quick else 1000)),
+    "event_log": (lambda quick: bench_event_log.run(2 if quick else 4, 8 if quick else 16, 100 if quick else 500)),
+    "drift": (lambda quick: bench_drift.run(2000 if quick else 20000)),
+    "screening": (lambda quick: bench_screening.run(100 if quick else 500)),
+    "forest": (lambda quick: bench_forest.run(100 if quick else 500, 1000 if quick else 10000)),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the MediScan AI benchmark suite.")
+    parser.add_argument("--only", nargs="+", choices=sorted(SUITES), default=None)
+    parser.add_argument("--quick", action="store_true", help="Smaller workloads for a fast smoke run")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.only or SUITES:
+        print(f"\n--- {name} ---")
+        started = time.perf_counter()
+        results[name] = SUITES[name](args.quick)
+        results[name]["suite_seconds"] = round(time.perf_counter() - started, 2)
+    write_results("suite", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
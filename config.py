@@ -0,0 +1,137 @@
+# config.py - Shared settings for MediScan AI
+# Every value can be overridden with an environment variable so the same code
+# runs locally, in batch jobs and on the hosted instance.
+import os
+import time
+
+# ---------------- Paths ----------------
+MODELS_PATH = os.environ.get("MEDISCAN_MODELS_PATH", "models")
+DATA_PATH = os.environ.get("MEDISCAN_DATA_PATH", "data")
+
+CACHE_DIR = os.environ.get("MEDISCAN_CACHE_DIR", ".cache")
+
+# Columnar (Feather) copies of the reference CSVs; MEDISCAN_DATASET_CACHE=0 reads the CSVs directly
+DATASET_CACHE = os.environ.get("MEDISCAN_DATASET_CACHE", "1") != "0"
+DATASET_CACHE_DIR = os.environ.get("MEDISCAN_DATASET_CACHE_DIR", os.path.join(DATA_PATH, ".cache"))
+
+# ---------------- Assets ----------------
+OFFLINE = os.environ.get("MEDISCAN_OFFLINE", "0") == "1"  # Never fetch remote assets
+LOTTIE_CACHE_TTL = float(os.environ.get("MEDISCAN_LOTTIE_CACHE_TTL", str(7 * 24 * 3600)))
+LOTTIE_FETCH_TIMEOUT = float(os.environ.get("MEDISCAN_LOTTIE_FETCH_TIMEOUT", "10"))
+LOTTIE_RETRY_SECONDS = float(os.environ.get("MEDISCAN_LOTTIE_RETRY_SECONDS", "300"))  # After a failed fetch
+
+# ---------------- Users ----------------
+USER_STORE_BACKEND = os.environ.get("MEDISCAN_USER_STORE", "sqlite")  # "sqlite" or "json"
+USER_DB_PATH = os.environ.get("MEDISCAN_USER_DB", "users.db")
+USERS_FILE = os.environ.get("MEDISCAN_USERS_FILE", "users.json")  # Legacy store, migrated into USER_DB_PATH
+
+# ---------------- Password Hashing ----------------
+PBKDF2_ROUNDS = int(os.environ.get("MEDISCAN_PBKDF2_ROUNDS", "29000"))  # Changing this rehashes users on next login
+AUTH_WORKERS = int(os.environ.get("MEDISCAN_AUTH_WORKERS", "2"))  # Hashing processes (0 = hash inline)
+AUTH_MAX_PENDING = int(os.environ.get("MEDISCAN_AUTH_MAX_PENDING", "32"))  # Queued + running hash jobs
+AUTH_QUEUE_TIMEOUT = float(os.environ.get("MEDISCAN_AUTH_QUEUE_TIMEOUT", "10"))
+AUTH_THROTTLE_WINDOW = float(os.environ.get("MEDISCAN_AUTH_THROTTLE_WINDOW", "300"))
+AUTH_MAX_FAILURES_PER_USER = int(os.environ.get("MEDISCAN_AUTH_MAX_FAILURES_PER_USER", "5"))
+AUTH_MAX_ATTEMPTS_PER_IP = int(os.environ.get("MEDISCAN_AUTH_MAX_ATTEMPTS_PER_IP", "30"))
+
+# ---------------- Sessions (JWT) ----------------
+ACCESS_TOKEN_MINUTES = int(os.environ.get("MEDISCAN_ACCESS_TOKEN_MINUTES", "120"))
+REFRESH_TOKEN_DAYS = int(os.environ.get("MEDISCAN_REFRESH_TOKEN_DAYS", "7"))
+TOKEN_CACHE_SIZE = int(os.environ.get("MEDISCAN_TOKEN_CACHE_SIZE", "10000"))
+JWT_SECRET_FILE = os.environ.get("MEDISCAN_JWT_SECRET_FILE", "jwt_secret.key")
+
+
+def load_jwt_secret():
+    """
+    Signing secret for session tokens. Set MEDISCAN_JWT_SECRET (the same value on every
+    replica); otherwise a random secret is generated once and kept in JWT_SECRET_FILE.
+    """
+    secret = os.environ.get("MEDISCAN_JWT_SECRET")
+    if secret:
+        return secret
+    if not os.path.exists(JWT_SECRET_FILE):
+        import secrets
+        try:
+            # O_EXCL: if several processes start at once, exactly one writes the secret
+            fd = os.open(JWT_SECRET_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_urlsafe(48))
+        except FileExistsError:
+            pass
+    for _ in range(100):  # Another process may still be writing it
+        with open(JWT_SECRET_FILE, "r") as f:
+            secret = f.read().strip()
+        if secret:
+            return secret
+        time.sleep(0.01)
+    raise RuntimeError(f"JWT secret file {JWT_SECRET_FILE} is empty")
+
+# ---------------- Start-up ----------------
+# Preload the ML stack, models and hashing workers in the background after the first page
+WARM_UP = os.environ.get("MEDISCAN_WARM_UP", "1") != "0"
+
+# ---------------- Model Registry ----------------
+# Seconds between checks of models/ for a retrained artifact (0 = check on every request)
+MODEL_CHECK_INTERVAL = float(os.environ.get("MEDISCAN_MODEL_CHECK_INTERVAL", "2"))
+
+# ---------------- Model Selection ----------------
+CV_FOLDS = int(os.environ.get("MEDISCAN_CV_FOLDS", "5"))
+SELECTION_WORKERS = int(os.environ.get("MEDISCAN_SELECTION_WORKERS", "0"))  # 0 = one per CPU core
+# Slowest acceptable single-patient scoring time for a selected model, in milliseconds
+LATENCY_BUDGET_MS = float(os.environ.get("MEDISCAN_LATENCY_BUDGET_MS", "2.0"))
+
+# ---------------- Streaming Training ----------------
+STREAM_CHUNK_SIZE = int(os.environ.get("MEDISCAN_STREAM_CHUNK_SIZE", "50000"))  # Rows read per chunk
+STREAM_EPOCHS = int(os.environ.get("MEDISCAN_STREAM_EPOCHS", "5"))  # Passes of partial_fit over the file
+
+# ---------------- Prediction Cache ----------------
+PREDICTION_CACHE_SIZE = int(os.environ.get("MEDISCAN_PREDICTION_CACHE_SIZE", "10000"))  # 0 disables it
+PREDICTION_CACHE_TTL = float(os.environ.get("MEDISCAN_PREDICTION_CACHE_TTL", "3600"))  # Seconds
+
+# ---------------- Metrics ----------------
+METRICS_WINDOW = int(os.environ.get("MEDISCAN_METRICS_WINDOW", "2048"))  # Recent samples kept per stage for p50/p95/p99
+METRICS_LOG = os.environ.get("MEDISCAN_METRICS_LOG", "")  # JSON-lines timing log path ("" = off)
+METRICS_PORT = int(os.environ.get("MEDISCAN_METRICS_PORT", "0"))  # /metrics for the Streamlit process (0 = off)
+METRICS_STAGES = os.environ.get("MEDISCAN_METRICS_STAGES", "0") == "1"  # Also time encode/impute/predict_proba per call
+
+# ---------------- Prediction History ----------------
+HISTORY_DB_PATH = os.environ.get("MEDISCAN_HISTORY_DB", "history.db")
+HISTORY_BATCH_SIZE = int(os.environ.get("MEDISCAN_HISTORY_BATCH_SIZE", "256"))  # Records per write transaction
+HISTORY_FLUSH_MS = float(os.environ.get("MEDISCAN_HISTORY_FLUSH_MS", "500"))  # Longest a record waits in memory
+HISTORY_MAX_PENDING = int(os.environ.get("MEDISCAN_HISTORY_MAX_PENDING", "100000"))  # Beyond this, records are dropped
+HISTORY_DASHBOARD_ROWS = int(os.environ.get("MEDISCAN_HISTORY_DASHBOARD_ROWS", "10"))
+HISTORY_TREND_DAYS = int(os.environ.get("MEDISCAN_HISTORY_TREND_DAYS", "90"))
+
+# ---------------- Event Log ----------------
+EVENT_LOG = os.environ.get("MEDISCAN_EVENT_LOG", "1") != "0"  # Feedback / login / registration / prediction audit trail
+EVENT_LOG_PATH = os.environ.get("MEDISCAN_EVENT_LOG_PATH", os.path.join("logs", "events.jsonl"))
+EVENT_LOG_MAX_BYTES = int(os.environ.get("MEDISCAN_EVENT_LOG_MAX_BYTES", str(64 * 2 ** 20)))  # Rotate past this (0 = never)
+EVENT_LOG_COMMIT_MS = float(os.environ.get("MEDISCAN_EVENT_LOG_COMMIT_MS", "2"))  # Group-commit window
+EVENT_LOG_FSYNC = os.environ.get("MEDISCAN_EVENT_LOG_FSYNC", "1") != "0"
+EVENT_LOG_MAX_PENDING = int(os.environ.get("MEDISCAN_EVENT_LOG_MAX_PENDING", "100000"))
+
+# ---------------- Drift Monitor ----------------
+DRIFT_MONITOR = os.environ.get("MEDISCAN_DRIFT_MONITOR", "1") != "0"  # Track prediction inputs against training data
+DRIFT_DIR = os.environ.get("MEDISCAN_DRIFT_DIR", "drift")  # Snapshots of the running statistics, one file per process
+DRIFT_SNAPSHOT_SECONDS = float(os.environ.get("MEDISCAN_DRIFT_SNAPSHOT_SECONDS", "60"))
+DRIFT_BINS = int(os.environ.get("MEDISCAN_DRIFT_BINS", "10"))  # Histogram bins per numeric feature (training quantiles)
+DRIFT_MIN_SAMPLES = int(os.environ.get("MEDISCAN_DRIFT_MIN_SAMPLES", "30"))  # No PSI below this many values
+DRIFT_PSI_WARN = float(os.environ.get("MEDISCAN_DRIFT_PSI_WARN", "0.1"))
+DRIFT_PSI_ALERT = float(os.environ.get("MEDISCAN_DRIFT_PSI_ALERT", "0.25"))
+
+# ---------------- Batch Scoring ----------------
+BATCH_CHUNK_SIZE = int(os.environ.get("MEDISCAN_BATCH_CHUNK_SIZE", "10000"))
+
+# ---------------- Prediction API ----------------
+API_PORT = int(os.environ.get("MEDISCAN_API_PORT", "8600"))
+API_WORKERS = int(os.environ.get("MEDISCAN_API_WORKERS", "4"))
+MAX_BATCH_SIZE = int(os.environ.get("MEDISCAN_MAX_BATCH_SIZE", "64"))
+BATCH_WAIT_MS = float(os.environ.get("MEDISCAN_BATCH_WAIT_MS", "5"))
+API_REQUIRE_AUTH = os.environ.get("MEDISCAN_API_REQUIRE_AUTH", "1") != "0"
+
+# ---------------- Combined Screening ----------------
+SCREENING_WORKERS = int(os.environ.get("MEDISCAN_SCREENING_WORKERS", "0"))  # Scoring threads (0 = one per disease)
+
+# ---------------- PDF Reports ----------------
+REPORT_WORKERS = int(os.environ.get("MEDISCAN_REPORT_WORKERS", "2"))  # Render processes (0 = one thread)
+REPORT_CHUNK_SIZE = int(os.environ.get("MEDISCAN_REPORT_CHUNK_SIZE", "50"))  # Reports per worker task
@@ -0,0 +1,108 @@
+# datasets.py - Reference datasets served from a columnar cache instead of CSV
+#
+# Each data/<disease>.csv is parsed once and written next to it as an
+# uncompressed Feather file, data/.cache/<name>-<sha256[:16]>.feather, with the
+# dtypes pandas inferred. Later loads memory-map that file and only materialise
+# the requested columns, so CSV parsing disappears from app start-up, reruns and
+# training. A changed CSV gets a new content hash and is converted again. The
+# cache is optional: without pyarrow every read falls back to pandas.read_csv.
+#
+# Usage:
+#   df = load_dataset("heart", columns=["age", "chol", "target"])
+#   python datasets.py build          # pre-convert every reference dataset
+import argparse
+import glob
+import os
+import threading
+
+import pandas as pd
+
+import config
+from inference import DATA_FILES
+from utils import file_sha256, file_signature
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow is optional
+    feather = None
+
+_hashes = {}             # csv path -> (file signature, sha256)
+_lock = threading.Lock()
+
+
+def csv_path(name):
+    """A disease key ("heart") or a file name ("heart.csv") -> path of the source CSV."""
+    return os.path.join(config.DATA_PATH, DATA_FILES.get(name, name))
+
+
+def dataset_hash(name):
+    """Content hash of a source CSV; re-hashed only when its size/mtime changes."""
+    path = csv_path(name)
+    signature = file_signature(path)
+    with _lock:
+        known = _hashes.get(path)
+        if known and known[0] == signature:
+            return known[1]
+    digest = file_sha256(path)
+    with _lock:
+        _hashes[path] = (signature, digest)
+    return digest
+
+
+def cache_path(name, source_hash):
+    stem = os.path.splitext(os.path.basename(csv_path(name)))[0]
+    return os.path.join(config.DATASET_CACHE_DIR, f"{stem}-{source_hash[:16]}.feather")
+
+
+def build_cache(name, source_hash=None):
+    """Convert one CSV into its Feather cache (atomically) and drop caches of older versions."""
+    source_hash = source_hash or dataset_hash(name)
+    path = cache_path(name, source_hash)
+    df = pd.read_csv(csv_path(name))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    feather.write_feather(df, tmp_path, compression="uncompressed")  # Uncompressed = mappable in place
+    os.replace(tmp_path, path)
+
+    stem = os.path.basename(path).rsplit("-", 1)[0]
+    for stale in glob.glob(os.path.join(os.path.dirname(path), f"{stem}-*.feather")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return path
+
+
+def load_dataset(name, columns=None):
+    """
+    Return a reference dataset as a DataFrame, optionally with only `columns`.
+    Every call returns a fresh frame, so callers may modify it freely.
+    """
+    if feather is None or not config.DATASET_CACHE:
+        return pd.read_csv(csv_path(name), usecols=columns)
+
+    source_hash = dataset_hash(name)
+    path = cache_path(name, source_hash)
+    if not os.path.exists(path):
+        print(f"[Datasets] Converting {csv_path(name)} to {path}")
+        build_cache(name, source_hash)
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the columnar cache of the reference datasets.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="Convert every data/*.csv reference file")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        if feather is None:
+            parser.error("pyarrow is not installed")
+        for name in DATA_FILES:
+            print(f"✅ {name}: {build_cache(name)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,11 @@ import pandas as pd
 import pickle
 from sklearn.linear_model import LogisticRegression
 from sklearn.model_selection import train_test_split
+from datasets import load_dataset
 
 @st.cache_resource
 def load_diabetes_model():
-    df = pd.read_csv('data/diabetes.csv')
+    df = load_dataset('diabetes')
     X = df.drop('Outcome', axis=1)
     y = df['Outcome']
     model = LogisticRegression(max_iter=1000)
@@ -0,0 +1,565 @@
+# drift.py - Streaming input-drift monitor against the training distribution
+#
+# train_models.py saves models/<disease>_reference.json next to each artifact:
+# per input column the training mean/variance, missing rate, histogram bin
+# edges (training deciles) with the share of rows in each bin, and the share of
+# every category level. Every prediction then updates running statistics for
+# the same columns - Welford mean/variance, counts in those fixed bins, counts
+# per known level plus one "other" bucket - so memory stays constant however
+# many predictions arrive. Drift per column is the population stability index
+# (PSI) between the live and training bin/level shares, plus the shift of the
+# live mean in training standard deviations.
+#
+# Running statistics are snapshotted to MEDISCAN_DRIFT_DIR/<role>-<host>-<pid>.json
+# every MEDISCAN_DRIFT_SNAPSHOT_SECONDS and at exit - one file per process, so
+# concurrent app/API workers never overwrite each other - and merged across every
+# process and role for reports. A new process adopts the snapshots its host's
+# exited processes of the same role left behind, so restarts do not pile up files.
+# A running process re-reads a reference that retraining replaced (checked every
+# MEDISCAN_MODEL_CHECK_INTERVAL) and starts that disease's statistics over.
+#
+# Usage:
+#   observe_inputs("heart", [input_row])           # from the prediction paths; never raises
+#   python drift.py report heart                   # live snapshots of every role, merged
+#   python drift.py report --json drift.json
+import argparse
+import atexit
+import glob
+import json
+import math
+import os
+import re
+import socket
+import threading
+import time
+from bisect import bisect_right
+
+import config
+from inference import CATEGORICAL_COLUMNS, DISEASES, DROP_COLUMNS, TARGET_COLUMNS
+from metrics import increment, timer
+from pipeline import canonical_level
+
+REFERENCE_VERSION = 1
+SNAPSHOT_VERSION = 1
+OTHER_LEVEL = "__other__"
+PSI_FLOOR = 1e-4  # Share assumed for an empty bin, so PSI stays finite
+
+
+def reference_path(model_key, models_path=None):
+    return os.path.join(models_path or config.MODELS_PATH, f"{model_key}_reference.json")
+
+
+# ---------------- Reference Statistics (training time) ----------------
+def compute_reference(model_key, df, source_hash=None, bins=None):
+    """Training-time statistics of every raw input column of a disease's dataset."""
+    import numpy as np
+    import pandas as pd
+
+    bins = bins or config.DRIFT_BINS
+    drop = [TARGET_COLUMNS[model_key]] + DROP_COLUMNS[model_key]
+    features = {}
+    for col in df.drop(columns=drop, errors="ignore").columns:
+        series = df[col]
+        missing = float(series.isna().mean()) if len(series) else 0.0
+        if col in CATEGORICAL_COLUMNS[model_key]:
+            shares = series.dropna().map(canonical_level).value_counts(normalize=True)
+            features[col] = {"kind": "categorical", "missing_rate": missing,
+                             "levels": {str(level): float(share) for level, share in shares.items()}}
+            continue
+        values = pd.to_numeric(series, errors="coerce").dropna().to_numpy(dtype=float)
+        if not len(values):
+            continue
+        # Interior decile edges (deduplicated): bin i holds edges[i-1] <= x < edges[i]
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1])).tolist()
+        counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+        features[col] = {
+            "kind": "numeric",
+            "missing_rate": missing,
+            "mean": float(values.mean()),
+            "std": float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+            "edges": edges,
+            "shares": (counts / counts.sum()).tolist(),
+        }
+    return {"version": REFERENCE_VERSION, "disease": model_key, "source_hash": source_hash,
+            "rows": int(len(df)), "features": features}
+
+
+def reference_from_counts(model_key, rows, numeric, categorical, source_hash=None):
+    """
+    The same reference from statistics gathered out of core (see streaming_train.py).
+    numeric: column -> (observed count, mean, M2, decile edges, counts per bin);
+    categorical: column -> {level as read: count}, with missing values under "nan".
+    """
+    features = {}
+    for col, (count, mean, m2, edges, bins) in numeric.items():
+        if not count:
+            continue
+        features[col] = {
+            "kind": "numeric",
+            "missing_rate": float(1 - count / rows) if rows else 0.0,
+            "mean": float(mean),
+            "std": math.sqrt(m2 / (count - 1)) if count > 1 else 0.0,
+            "edges": [float(edge) for edge in edges],
+            "shares": [float(n) / sum(bins) for n in bins],
+        }
+    for col, counts in categorical.items():
+        merged = {}
+        for level, n in counts.items():
+            level = canonical_level(level)
+            merged[level] = merged.get(level, 0) + n
+        missing = merged.pop("nan", 0)
+        observed = sum(merged.values())
+        features[col] = {"kind": "categorical", "missing_rate": missing / rows if rows else 0.0,
+                         "levels": {level: n / observed for level, n in merged.items()} if observed else {}}
+    return {"version": REFERENCE_VERSION, "disease": model_key, "source_hash": source_hash,
+            "rows": int(rows), "features": features}
+
+
+def save_reference(model_key, df, source_hash=None, models_path=None, reference=None):
+    """Compute (unless given) and write models/<disease>_reference.json atomically; returns the reference."""
+    reference = reference or compute_reference(model_key, df, source_hash)
+    path = reference_path(model_key, models_path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(reference, f, indent=2)
+    os.replace(tmp_path, path)
+    return reference
+
+
+def load_reference(model_key, models_path=None):
+    try:
+        with open(reference_path(model_key, models_path)) as f:
+            reference = json.load(f)
+        return reference if reference.get("version") == REFERENCE_VERSION else None
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def reference_key(reference):
+    """Identity of a reference; running statistics collected against another one are discarded."""
+    return f"{reference.get('source_hash')}-{len(reference['features'])}"
+
+
+# ---------------- Running Statistics (constant memory) ----------------
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(number) else number
+
+
+class NumericStats:
+    """Welford count/mean/M2 plus counts in the reference's fixed bins."""
+    __slots__ = ("edges", "n", "mean", "m2", "missing", "bins")
+
+    def __init__(self, edges):
+        self.edges = edges
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.missing = 0
+        self.bins = [0] * (len(edges) + 1)
+
+    def blank(self):
+        return NumericStats(self.edges)
+
+    def update(self, value):
+        x = _number(value)
+        if x is None:
+            self.missing += 1
+            return
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        self.bins[bisect_right(self.edges, x)] += 1
+
+    def merge(self, other):
+        """Chan et al. pairwise combination, so per-role snapshots add up exactly."""
+        total = self.n + other.n
+        if other.n:
+            delta = other.mean - self.mean
+            self.mean += delta * other.n / total
+            self.m2 += other.m2 + delta * delta * self.n * other.n / total
+        self.n = total
+        self.missing += other.missing
+        self.bins = [a + b for a, b in zip(self.bins, other.bins)]
+
+    def shares(self):
+        return [count / self.n for count in self.bins] if self.n else None
+
+    def to_dict(self):
+        return {"n": self.n, "mean": self.mean, "m2": self.m2, "missing": self.missing, "bins": self.bins}
+
+    def load(self, state):
+        if len(state["bins"]) == len(self.bins):
+            self.n, self.mean, self.m2 = state["n"], state["mean"], state["m2"]
+            self.missing, self.bins = state["missing"], list(state["bins"])
+
+
+class CategoricalStats:
+    """Counts per reference level plus one bucket for every level training never saw."""
+    __slots__ = ("counts", "n", "missing")
+
+    def __init__(self, levels):
+        self.counts = dict.fromkeys(list(levels) + [OTHER_LEVEL], 0)
+        self.n = 0
+        self.missing = 0
+
+    def blank(self):
+        return CategoricalStats(self.counts)
+
+    def update(self, value):
+        level = canonical_level(value)
+        if level == "nan":
+            self.missing += 1
+            return
+        self.n += 1
+        self.counts[level if level in self.counts else OTHER_LEVEL] += 1
+
+    def merge(self, other):
+        self.n += other.n
+        self.missing += other.missing
+        for level, count in other.counts.items():
+            self.counts[level if level in self.counts else OTHER_LEVEL] += count
+
+    def shares(self):
+        return {level: count / self.n for level, count in self.counts.items()} if self.n else None
+
+    def to_dict(self):
+        return {"n": self.n, "missing": self.missing, "counts": self.counts}
+
+    def load(self, state):
+        self.n, self.missing = state["n"], state["missing"]
+        for level, count in state["counts"].items():
+            self.counts[level if level in self.counts else OTHER_LEVEL] += count
+
+
+def psi(live, ref):
+    """Population stability index between two lists of shares over the same bins."""
+    return sum((a - b) * math.log(a / b) for a, b in ((max(a, PSI_FLOOR), max(b, PSI_FLOOR))
+                                                       for a, b in zip(live, ref)))
+
+
+def drift_status(score):
+    if score is None:
+        return "insufficient data"
+    if score >= config.DRIFT_PSI_ALERT:
+        return "drift"
+    return "watch" if score >= config.DRIFT_PSI_WARN else "stable"
+
+
+class DiseaseMonitor:
+    """Running statistics of one disease's inputs against its reference."""
+
+    def __init__(self, model_key, reference):
+        self.model_key = model_key
+        self.reference = reference
+        self.key = reference_key(reference)
+        self.features = {
+            col: (CategoricalStats(spec["levels"]) if spec["kind"] == "categorical" else NumericStats(spec["edges"]))
+            for col, spec in reference["features"].items()
+        }
+        self.rows = 0
+        self.lock = threading.Lock()
+
+    def update(self, rows):
+        with self.lock:
+            for row in rows:
+                self.rows += 1
+                for col, stats in self.features.items():
+                    stats.update(row.get(col))
+
+    def merge(self, state):
+        """Add a snapshot's statistics (same reference only)."""
+        if state.get("reference") != self.key:
+            return False
+        with self.lock:
+            self.rows += state["rows"]
+            for col, feature_state in state["features"].items():
+                if col in self.features:
+                    other = self.features[col].blank()
+                    other.load(feature_state)
+                    self.features[col].merge(other)
+        return True
+
+    def state(self):
+        with self.lock:
+            return {"reference": self.key, "rows": self.rows,
+                    "features": {col: stats.to_dict() for col, stats in self.features.items()}}
+
+    def report(self):
+        """Drift per feature, worst first."""
+        features = []
+        with self.lock:
+            for col, stats in self.features.items():
+                spec = self.reference["features"][col]
+                seen = stats.n + stats.missing
+                row = {
+                    "feature": col,
+                    "kind": spec["kind"],
+                    "n": stats.n,
+                    "missing_rate": round(stats.missing / seen, 4) if seen else None,
+                    "ref_missing_rate": round(spec["missing_rate"], 4),
+                    "psi": None,
+                }
+                live = stats.shares()
+                if live is not None and stats.n >= config.DRIFT_MIN_SAMPLES:
+                    if spec["kind"] == "categorical":
+                        ref = [spec["levels"].get(level, 0.0) for level in live]
+                        row["psi"] = round(psi(list(live.values()), ref), 4)
+                        row["unseen_share"] = round(live[OTHER_LEVEL], 4)
+                    else:
+                        row["psi"] = round(psi(live, spec["shares"]), 4)
+                if spec["kind"] == "numeric" and stats.n:
+                    variance = stats.m2 / (stats.n - 1) if stats.n > 1 else 0.0
+                    row.update(mean=round(stats.mean, 6), std=round(math.sqrt(variance), 6),
+                               ref_mean=round(spec["mean"], 6), ref_std=round(spec["std"], 6),
+                               mean_shift=round((stats.mean - spec["mean"]) / spec["std"], 4) if spec["std"] else None)
+                row["status"] = drift_status(row["psi"])
+                features.append(row)
+            rows = self.rows
+        features.sort(key=lambda r: -1 if r["psi"] is None else r["psi"], reverse=True)
+        worst = max((r["psi"] for r in features if r["psi"] is not None), default=None)
+        return {"disease": self.model_key, "rows": rows, "max_psi": worst, "status": drift_status(worst),
+                "reference_rows": self.reference["rows"], "features": features}
+
+
+# ---------------- Process-wide Monitor ----------------
+def _pid_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Exists but belongs to another user
+    return True
+
+
+class DriftMonitor:
+    """Per-disease monitors, loaded lazily, with periodic snapshots to MEDISCAN_DRIFT_DIR/<role>-<host>-<pid>.json."""
+
+    def __init__(self, role="app", snapshot_dir=None, snapshot_seconds=None, models_path=None):
+        self.role = role
+        self.snapshot_dir = snapshot_dir or config.DRIFT_DIR
+        self.snapshot_seconds = config.DRIFT_SNAPSHOT_SECONDS if snapshot_seconds is None else snapshot_seconds
+        self.models_path = models_path
+        self.host = re.sub(r"[^A-Za-z0-9_.]", "_", socket.gethostname())
+        self._monitors = {}      # model_key -> DiseaseMonitor, or None without a reference
+        self._checked = {}       # model_key -> (monotonic time, reference file mtime) of the last check
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._writer = None
+        self._restored = []      # Snapshot states (model_key -> state) to fold into the monitors
+        self._adopted = []       # Files taken over from exited processes, removed after our next snapshot
+        own = self._read_snapshot(self.snapshot_path)  # A previous process with our pid (pid reuse)
+        if own:
+            self._restored.append(own)
+        self._adopt_orphans()
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.snapshot_dir, f"{self.role}-{self.host}-{os.getpid()}.json")
+
+    def _adopt_orphans(self):
+        """Claim the snapshots of exited processes of this role on this host (rename wins only once)."""
+        # Also files a process claimed but exited before folding into its own snapshot
+        pattern = re.compile(rf"{re.escape(self.role)}-{re.escape(self.host)}-(\d+)\.json(\.adopt-\d+)?$")
+        for path in sorted(glob.glob(os.path.join(self.snapshot_dir, f"{self.role}-{self.host}-*.json*"))):
+            match = pattern.match(os.path.basename(path))
+            if not match or int(match.group(1)) == os.getpid() or _pid_running(int(match.group(1))):
+                continue
+            claimed = f"{self.snapshot_path}.adopt-{len(self._adopted)}"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue  # Another process adopted it first
+            state = self._read_snapshot(claimed)
+            if state:
+                self._restored.append(state)
+            self._adopted.append(claimed)
+        if self._adopted:
+            self._dirty.set()
+            self._ensure_writer()
+
+    def monitor(self, model_key):
+        checked = self._checked.get(model_key)
+        if checked is None or time.monotonic() - checked[0] >= config.MODEL_CHECK_INTERVAL:
+            with self._lock:
+                checked = self._checked.get(model_key)
+                if checked is None or time.monotonic() - checked[0] >= config.MODEL_CHECK_INTERVAL:
+                    self._refresh(model_key, checked[1] if checked else None)
+        return self._monitors[model_key]
+
+    def _refresh(self, model_key, seen_mtime):
+        """Load a disease's reference, or reload it when retraining has replaced the file."""
+        mtime = _mtime(reference_path(model_key, self.models_path))
+        if model_key not in self._monitors or mtime != seen_mtime:
+            reference = load_reference(model_key, self.models_path)
+            current = self._monitors.get(model_key)
+            if current is None or reference is None or reference_key(reference) != current.key:
+                monitor = DiseaseMonitor(model_key, reference) if reference else None
+                if monitor:
+                    # Statistics gathered against an older reference (retrained model) start over
+                    for restored in self._restored:
+                        if model_key in restored:
+                            monitor.merge(restored[model_key])
+                if current is not None:
+                    print(f"[Drift] {model_key} reference changed; running statistics start over")
+                    self._dirty.set()
+                self._monitors[model_key] = monitor
+        self._checked[model_key] = (time.monotonic(), mtime)
+
+    def observe(self, model_key, rows):
+        """Add raw input rows (dicts) to the running statistics of a disease."""
+        monitor = self.monitor(model_key)
+        if monitor is None:
+            return False
+        with timer("drift_update", model_key):
+            monitor.update(rows)
+        self._dirty.set()
+        self._ensure_writer()
+        return True
+
+    def report(self, model_key):
+        monitor = self.monitor(model_key)
+        return monitor.report() if monitor else {"disease": model_key, "status": "no reference",
+                                                 "rows": 0, "features": []}
+
+    # ---------------- Snapshots ----------------
+    @staticmethod
+    def _read_snapshot(path):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+            return snapshot["diseases"] if snapshot.get("version") == SNAPSHOT_VERSION else {}
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return {}
+
+    def snapshot(self):
+        """Write every disease's statistics (restored ones included) atomically to this process's file."""
+        diseases = {}
+        for model_key in {key for restored in self._restored for key in restored} | set(self._monitors):
+            monitor = self.monitor(model_key)
+            if monitor is not None:
+                diseases[model_key] = monitor.state()
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": SNAPSHOT_VERSION, "role": self.role, "pid": os.getpid(), "saved_at": time.time(),
+                       "diseases": diseases}, f)
+        os.replace(tmp_path, self.snapshot_path)
+        # Adopted files are now part of ours; until this point merged_report still counted them
+        while self._adopted:
+            try:
+                os.remove(self._adopted.pop())
+            except OSError:
+                pass
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run, name="drift-snapshot", daemon=True)
+                    self._writer.start()
+                    atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(self.snapshot_seconds)
+            self.flush()
+
+    def flush(self):
+        if not self._dirty.is_set():
+            return
+        self._dirty.clear()
+        try:
+            self.snapshot()
+        except OSError as e:
+            print(f"[Drift] Could not write snapshot {self.snapshot_path}: {e}")
+            increment("drift_snapshot_errors")
+
+
+_monitors = {}  # role -> DriftMonitor
+_monitors_lock = threading.Lock()
+
+
+def get_monitor(role="app"):
+    """Return this process's drift monitor for a role (created on first use)."""
+    if role not in _monitors:
+        with _monitors_lock:
+            if role not in _monitors:
+                _monitors[role] = DriftMonitor(role)
+    return _monitors[role]
+
+
+def observe_inputs(model_key, rows, role="app"):
+    """Track raw input rows unless MEDISCAN_DRIFT_MONITOR=0; never raises into the caller."""
+    if not config.DRIFT_MONITOR:
+        return False
+    try:
+        return get_monitor(role).observe(model_key, rows)
+    except Exception as e:
+        print(f"[Drift] Skipped {model_key} inputs: {e}")
+        increment("drift_errors", model_key)
+        return False
+
+
+def merged_report(model_key, snapshot_dir=None, models_path=None):
+    """Drift of a disease over the snapshots of every process and role (app, api, ...) in MEDISCAN_DRIFT_DIR."""
+    reference = load_reference(model_key, models_path)
+    if reference is None:
+        return {"disease": model_key, "status": "no reference", "rows": 0, "features": []}
+    combined = DiseaseMonitor(model_key, reference)
+    snapshot_dir = snapshot_dir or config.DRIFT_DIR
+    # Files being adopted by a new process still count until its first snapshot replaces them
+    paths = glob.glob(os.path.join(snapshot_dir, "*.json")) + glob.glob(os.path.join(snapshot_dir, "*.json.adopt-*"))
+    for path in sorted(paths):
+        state = DriftMonitor._read_snapshot(path).get(model_key)
+        if state:
+            combined.merge(state)
+    return combined.report()
+
+
+def format_report(report):
+    lines = [f"{report['disease']}: {report['status']} over {report['rows']:,} predictions"
+             + (f" (max PSI {report['max_psi']:.3f})" if report.get("max_psi") is not None else "")]
+    for row in report["features"]:
+        score = "   n/a" if row["psi"] is None else f"{row['psi']:6.3f}"
+        shift = f"  mean shift {row['mean_shift']:+.2f} sd" if row.get("mean_shift") is not None else ""
+        unseen = f"  unseen {row['unseen_share'] * 100:.1f}%" if row.get("unseen_share") else ""
+        lines.append(f"  {row['feature']:<20} PSI {score}  {row['status']:<17}{shift}{unseen}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report input drift against the training distribution.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("report", help="Merge every role's snapshot and print drift per feature")
+    report.add_argument("diseases", nargs="*", help=f"Default: {' '.join(DISEASES)}")
+    report.add_argument("--json", default=None, help="Also write the reports to this JSON file")
+    args = parser.parse_args(argv)
+
+    unknown = sorted(set(args.diseases) - set(DISEASES))
+    if unknown:
+        parser.error(f"unknown disease(s): {', '.join(unknown)}")
+    reports = [merged_report(model_key) for model_key in args.diseases or DISEASES]
+    print("\n\n".join(format_report(r) for r in reports))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"📝 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+# event_log.py - Append-only JSON-lines event log (feedback, logins, registrations, predictions)
+#
+# Every event becomes one line in logs/events.jsonl. Sessions only queue their
+# line; a writer thread per process gathers everything queued during
+# MEDISCAN_EVENT_LOG_COMMIT_MS into one group commit: a single write() and a
+# single fsync, done under an flock on events.jsonl.lock so any number of app,
+# API and batch processes can share the file without interleaving. Callers that
+# must know an event is on disk (feedback) wait for the commit holding it;
+# everyone else returns at once.
+#
+# When the live file passes MEDISCAN_EVENT_LOG_MAX_BYTES it is renamed to
+# events-<utc time>-<pid>.jsonl and gzipped in the background; other processes
+# notice the new inode and reopen.
+#
+# Usage:
+#   append_event("feedback", sync=True, username="alice@example.com", message="...")
+#   python event_log.py show --event login --limit 20
+#   python event_log.py compress        # gzip rotated segments left uncompressed
+import argparse
+import atexit
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+
+import config
+from metrics import increment, observe
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: single-process installs only
+    fcntl = None
+
+
+class EventLog:
+    def __init__(self, path=None, max_bytes=None, commit_ms=None, fsync=None, max_pending=None):
+        self.path = path or config.EVENT_LOG_PATH
+        self.max_bytes = config.EVENT_LOG_MAX_BYTES if max_bytes is None else max_bytes
+        self.commit_interval = (config.EVENT_LOG_COMMIT_MS if commit_ms is None else commit_ms) / 1000.0
+        self.fsync = config.EVENT_LOG_FSYNC if fsync is None else fsync
+        self.max_pending = max_pending or config.EVENT_LOG_MAX_PENDING
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._fd = None
+        self._lock_fd = None
+        self._pending = []       # Encoded lines waiting for the next group commit
+        self._queued = 0         # Sequence number of the newest queued line
+        self._committed = 0      # Every line up to this sequence number is on disk
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._writer = None
+        self.commits = 0
+        self.dropped = 0
+
+    # ---------------- Appending ----------------
+    def append(self, event, sync=False, timeout=10, **fields):
+        """
+        Queue one event. With sync=True, wait until it has been written and fsynced
+        (returns False if that takes longer than `timeout`).
+        """
+        line = json.dumps({"ts": round(time.time(), 6), "event": event, "pid": os.getpid(), **fields},
+                          default=_json_default, separators=(",", ":")) + "\n"
+        with self._lock:
+            if len(self._pending) >= self.max_pending and not sync:
+                # The disk cannot keep up: shed best-effort events rather than stall sessions
+                self.dropped += 1
+                increment("event_log_dropped")
+                return False
+            self._pending.append(line.encode("utf-8"))
+            self._queued += 1
+            seq = self._queued
+            self._changed.notify_all()
+        self._ensure_writer()
+        return self.wait(seq, timeout) if sync else True
+
+    def wait(self, seq=None, timeout=10):
+        """Block until line `seq` (default: everything queued so far) is committed."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            seq = self._queued if seq is None else seq
+            while self._committed < seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+                    self._writer.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._changed.wait()
+            # Let concurrent sessions pile onto this commit before paying for the fsync
+            if self.commit_interval:
+                time.sleep(self.commit_interval)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                seq = self._queued
+            try:
+                self._commit(b"".join(batch))
+            except Exception as e:
+                print(f"[EventLog] Could not write {len(batch)} event(s) to {self.path}: {e}")
+                increment("event_log_errors")
+                with self._lock:
+                    self._pending[:0] = batch
+                time.sleep(1)
+                continue
+            with self._lock:
+                self._committed = seq
+                self.commits += 1
+                self._changed.notify_all()
+
+    # ---------------- Group Commit (writer thread only) ----------------
+    def _commit(self, data):
+        started = time.perf_counter()
+        self._acquire()
+        try:
+            fd = self._file()
+            if self.max_bytes and os.fstat(fd).st_size and os.fstat(fd).st_size + len(data) > self.max_bytes:
+                self._rotate()
+                fd = self._file()
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            if self.fsync:
+                os.fsync(fd)
+        finally:
+            self._release()
+        observe("event_log_commit", time.perf_counter() - started)
+
+    def _acquire(self):
+        if fcntl is None:
+            return
+        if self._lock_fd is None:
+            self._lock_fd = os.open(f"{self.path}.lock", os.O_WRONLY | os.O_CREAT, 0o600)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+
+    def _release(self):
+        if fcntl is not None and self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _file(self):
+        """Descriptor of the live file, reopened if another process rotated it away."""
+        if self._fd is not None:
+            try:
+                current = os.stat(self.path)
+                opened = os.fstat(self._fd)
+                if (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino):
+                    return self._fd
+            except FileNotFoundError:
+                pass
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        return self._fd
+
+    def _rotate(self):
+        # Caller holds the flock, so no other process is writing the live file
+        stem, ext = os.path.splitext(self.path)
+        now = time.time_ns()
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(now // 10 ** 9)) + f"{now % 10 ** 9:09d}"
+        segment = f"{stem}-{stamp}-{os.getpid()}{ext}"
+        os.rename(self.path, segment)
+        os.close(self._fd)
+        self._fd = None
+        threading.Thread(target=compress_segment, args=(segment,), name="event-log-gzip", daemon=True).start()
+
+    def close(self):
+        self.wait()
+        with self._lock:
+            for fd in (self._fd, self._lock_fd):
+                if fd is not None:
+                    os.close(fd)
+            self._fd = self._lock_fd = None
+
+
+def compress_segment(segment):
+    """gzip one rotated segment next to itself and remove the original."""
+    target = f"{segment}.gz"
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    try:
+        with open(segment, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, target)
+        os.remove(segment)
+        return target
+    except FileNotFoundError:  # Another process already compressed it
+        return None
+    except OSError as e:
+        print(f"[EventLog] Could not compress {segment}: {e}")
+        return None
+
+
+def segments(path=None):
+    """Rotated segments (compressed or not) oldest first, then the live file."""
+    path = path or config.EVENT_LOG_PATH
+    stem, ext = os.path.splitext(path)
+    rotated = glob.glob(f"{stem}-*{ext}") + glob.glob(f"{stem}-*{ext}.gz")
+    rotated.sort(key=lambda p: os.path.basename(p).removesuffix(".gz"))
+    return rotated + ([path] if os.path.exists(path) else [])
+
+
+def read_events(path=None, event=None, since=None):
+    """Iterate over logged events (dicts) oldest first, optionally of one type / after a timestamp."""
+    for segment in segments(path):
+        opener = gzip.open if segment.endswith(".gz") else open
+        with opener(segment, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:  # Torn tail after a crash
+                    continue
+                if (event is None or record.get("event") == event) and (since is None or record["ts"] >= since):
+                    yield record
+
+
+def _json_default(value):
+    # NumPy scalars from form inputs and model outputs
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+# ---------------- Process-wide Log ----------------
+_event_log = None
+_event_log_lock = threading.Lock()
+
+
+def get_event_log():
+    """Return the process-wide event log (created on first use)."""
+    global _event_log
+    if _event_log is None:
+        with _event_log_lock:
+            if _event_log is None:
+                _event_log = EventLog()
+                atexit.register(_event_log.wait)
+    return _event_log
+
+
+def append_event(event, sync=False, **fields):
+    """Log one event unless MEDISCAN_EVENT_LOG=0; never raises into the caller."""
+    if not config.EVENT_LOG:
+        return False
+    try:
+        return get_event_log().append(event, sync=sync, **fields)
+    except Exception as e:
+        print(f"[EventLog] Dropped {event} event: {e}")
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and maintain the MediScan AI event log.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show", help="Print logged events, newest last")
+    show.add_argument("--event", default=None, help="feedback, login, register or prediction")
+    show.add_argument("--limit", type=int, default=50)
+    sub.add_parser("compress", help="gzip rotated segments that are still uncompressed")
+    args = parser.parse_args(argv)
+
+    if args.command == "show":
+        from collections import deque
+        for record in deque(read_events(event=args.event), maxlen=args.limit):
+            print(json.dumps(record))
+    else:
+        stem, ext = os.path.splitext(config.EVENT_LOG_PATH)
+        for segment in sorted(glob.glob(f"{stem}-*{ext}")):
+            target = compress_segment(segment)
+            if target:
+                print(f"✅ {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# feature_schema.py - Precomputed per-column statistics for the prediction forms
+#
+# The dashboard needs min/max/mean for numeric inputs and the option list and
+# mode for categorical ones. These are computed once per dataset version,
+# persisted as models/<disease>_schema.json and served from a process-wide
+# cache keyed by the dataset's content hash, so reruns never parse the CSV.
+import json
+import os
+import threading
+import pandas as pd
+
+import config
+from datasets import load_dataset
+from inference import DATA_FILES, TARGET_COLUMNS, CATEGORICAL_COLUMNS, DROP_COLUMNS
+from metrics import timer
+from utils import file_sha256, file_signature
+
+SCHEMA_VERSION = 1
+
+_cache = {}              # (model_key, source_hash) -> schema
+_signatures = {}         # model_key -> (file signature, source_hash)
+_lock = threading.Lock()
+
+
+def schema_path(model_key, models_path=None):
+    return os.path.join(models_path or config.MODELS_PATH, f"{model_key}_schema.json")
+
+
+def data_path(model_key):
+    return os.path.join(config.DATA_PATH, DATA_FILES[model_key])
+
+
+def _native(value):
+    """NumPy scalars -> plain Python values so the schema is JSON-serialisable."""
+    return value.item() if hasattr(value, "item") else value
+
+
+# ---------------- Building ----------------
+def compute_schema(model_key, df_ref, source_hash=None):
+    """Compute the widget configuration for every input feature of a disease."""
+    drop_cols = [TARGET_COLUMNS[model_key]] + [c for c in DROP_COLUMNS[model_key] if c in df_ref.columns]
+    categorical_features = CATEGORICAL_COLUMNS[model_key]
+
+    columns = []
+    for col_name in df_ref.drop(columns=drop_cols).columns:
+        series = df_ref[col_name]
+        if col_name in categorical_features:
+            options = sorted(_native(v) for v in series.dropna().unique())
+            mode = series.mode()
+            # Ensure default_val is compatible type for index lookup
+            default_val = type(options[0])(_native(mode[0])) if not mode.empty and options else None
+            default_index = options.index(default_val) if default_val in options else 0
+            columns.append({"name": col_name, "kind": "categorical",
+                            "options": options, "default_index": default_index})
+        else:
+            # Define min/max/mean, handling potential NaNs
+            min_val = float(series.min()) if pd.notna(series.min()) else 0.0
+            max_val = float(series.max()) if pd.notna(series.max()) else 1000.0
+            mean_val = float(series.mean()) if pd.notna(series.mean()) else 0.0
+            columns.append({
+                "name": col_name, "kind": "numeric",
+                "min": min_val, "max": max_val,
+                "value": max(min_val, min(max_val, mean_val)),  # Ensure default value is within bounds
+                # Apply specific formatting only for non-integer float columns
+                "format": "%.5f" if series.dtype == 'float64' and col_name not in ['Age', 'Pregnancies'] else None,
+            })
+
+    return {"version": SCHEMA_VERSION, "disease": model_key, "source_hash": source_hash, "columns": columns}
+
+
+def save_schema(schema, models_path=None):
+    path = schema_path(schema["disease"], models_path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(schema, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def refresh_schema(model_key, df_ref=None, source_hash=None, models_path=None):
+    """Recompute and persist the schema next to the model (called by train_models.py after training)."""
+    source_hash = source_hash or file_sha256(data_path(model_key))
+    if df_ref is None:
+        df_ref = load_dataset(model_key)
+    schema = compute_schema(model_key, df_ref, source_hash)
+    save_schema(schema, models_path)
+    with _lock:
+        _cache[(model_key, source_hash)] = schema
+    return schema
+
+
+def _load_saved(model_key, models_path=None):
+    try:
+        with open(schema_path(model_key, models_path), "r") as f:
+            schema = json.load(f)
+        return schema if schema.get("version") == SCHEMA_VERSION else None
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+# ---------------- Serving ----------------
+def get_schema(model_key):
+    """
+    Return the form schema for a disease. The dataset is only re-hashed when its
+    size/mtime changes, and only re-parsed when no saved schema matches its hash.
+    """
+    with timer("schema_load", model_key):
+        return _get_schema(model_key)
+
+
+def _get_schema(model_key):
+    path = data_path(model_key)
+    try:
+        signature = file_signature(path)
+    except FileNotFoundError:
+        # Deployed without the reference CSV: serve whatever was saved at training time
+        with _lock:
+            if (model_key, None) in _cache:
+                return _cache[(model_key, None)]
+        schema = _load_saved(model_key)
+        if schema is None:
+            raise
+        with _lock:
+            _cache[(model_key, None)] = schema
+        return schema
+
+    with _lock:
+        known = _signatures.get(model_key)
+        if known and known[0] == signature and (model_key, known[1]) in _cache:
+            return _cache[(model_key, known[1])]
+
+    source_hash = file_sha256(path)
+    with _lock:
+        _signatures[model_key] = (signature, source_hash)
+        if (model_key, source_hash) in _cache:
+            return _cache[(model_key, source_hash)]
+
+    schema = _load_saved(model_key)
+    if schema is None or schema.get("source_hash") != source_hash:
+        print(f"[Schema] Rebuilding {model_key} form schema from {path}")
+        schema = refresh_schema(model_key, source_hash=source_hash)
+    with _lock:
+        _cache[(model_key, source_hash)] = schema
+    return schema
@@ -0,0 +1,232 @@
+# forest.py - Random forests compiled to flat node arrays for fast scoring
+#
+# heart_model.py and parkinson_model.py used to fit a RandomForestClassifier
+# from the CSV on every process start and call sklearn's predict on one-row
+# DataFrames. Here the forest is fitted once, offline, and every tree is
+# flattened into shared contiguous arrays (feature index, threshold, child
+# offsets, leaf class probabilities), saved as models/<disease>_forest.npz. The
+# evaluator walks all trees for all rows at once with NumPy, one tree level per
+# step, so a single patient costs a few array operations instead of sklearn's
+# per-call validation and thread dispatch. Those pages only load the arrays.
+# train_models.py compiles the heart and Parkinson's forests with the pipelines.
+#
+# Usage:
+#   python forest.py compile heart parkinson      # fit, compile, verify against sklearn, save
+#   forest = load_forest("heart"); forest.predict(input_df)
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import config
+from inference import TARGET_COLUMNS, DROP_COLUMNS
+
+FOREST_FORMAT = 1
+FOREST_DISEASES = ["heart", "parkinson"]
+BLOCK_ROWS = 256
+
+
+class CompiledForest:
+    """Vectorized evaluator over the node arrays of a whole forest."""
+
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]            # int32, split feature per node (0 at leaves)
+        self.threshold = arrays["threshold"]        # float64, +inf at leaves so rows always go "left"
+        self.left = arrays["left"]                  # int32, absolute index of the left child (self at leaves)
+        self.right = arrays["right"]                # int32, absolute index of the right child (self at leaves)
+        self.missing_left = arrays["missing_left"]  # bool, where NaN goes at each split
+        self.value = arrays["value"]                # float64 [n_nodes, n_classes], class fractions at leaves
+        self.roots = arrays["roots"]                # int32, first node of each tree
+        self.depth = int(arrays["depth"])           # deepest tree: number of descent steps
+        self.classes_ = arrays["classes"]
+        self.feature_names = [str(name) for name in arrays["feature_names"]]
+        self.meta = json.loads(str(arrays["meta"]))
+        # Interleaved (right, left) children: the next node is _children[2 * node + went_left]
+        self._children = np.stack([self.right, self.left], axis=1).ravel()
+        self._value_by_class = np.ascontiguousarray(self.value.T)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _as_matrix(self, X):
+        if hasattr(X, "columns"):
+            X = X.reindex(columns=self.feature_names)
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        # sklearn compares float32 inputs against its thresholds; do the same so splits agree exactly
+        return np.ascontiguousarray(X.astype(np.float32), dtype=np.float64)
+
+    def _descend(self, X):
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        nodes = np.tile(self.roots, (n_rows, 1))
+        has_nan = np.isnan(flat).any()
+        for _ in range(self.depth):
+            values = flat.take(offsets + self.feature.take(nodes))
+            go_left = values <= self.threshold.take(nodes)
+            if has_nan:
+                go_left = np.where(np.isnan(values), self.missing_left.take(nodes), go_left)
+            nodes = self._children.take(2 * nodes + go_left)
+        return nodes
+
+    def apply(self, X):
+        """Leaf index reached in every tree, shape (n_rows, n_trees)."""
+        X = self._as_matrix(X)
+        # Small row blocks keep the (rows x trees) index arrays in cache
+        return np.concatenate([self._descend(X[start:start + BLOCK_ROWS])
+                               for start in range(0, max(len(X), 1), BLOCK_ROWS)])
+
+    def predict_proba(self, X):
+        # Mean of the per-tree leaf distributions, as RandomForestClassifier.predict_proba
+        leaves = self.apply(X)
+        return np.stack([column.take(leaves).mean(axis=1) for column in self._value_by_class], axis=1)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def compile_forest(model, feature_names, meta=None):
+    """Flatten a fitted sklearn forest (or single decision tree) into CompiledForest arrays."""
+    estimators = getattr(model, "estimators_", [model])
+    features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+    offset, depth = 0, 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        leaf = tree.children_left == -1
+        own = np.arange(tree.node_count) + offset
+        roots.append(offset)
+        features.append(np.where(leaf, 0, tree.feature))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold))
+        lefts.append(np.where(leaf, own, tree.children_left + offset))
+        rights.append(np.where(leaf, own, tree.children_right + offset))
+        missing.append(getattr(tree, "missing_go_to_left", np.ones(tree.node_count, dtype=np.uint8)).astype(bool))
+        value = tree.value[:, 0, :].astype(np.float64)
+        values.append(value / np.maximum(value.sum(axis=1, keepdims=True), np.finfo(float).tiny))
+        depth = max(depth, tree.max_depth)
+        offset += tree.node_count
+    return CompiledForest({
+        "feature": np.concatenate(features).astype(np.int32),
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "left": np.concatenate(lefts).astype(np.int32),
+        "right": np.concatenate(rights).astype(np.int32),
+        "missing_left": np.concatenate(missing),
+        "value": np.concatenate(values),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "depth": np.asarray(depth),
+        "classes": np.asarray(model.classes_),
+        "feature_names": np.asarray(feature_names, dtype=str),
+        "meta": np.asarray(json.dumps({"format": FOREST_FORMAT, **(meta or {})})),
+    })
+
+
+# ---------------- Persistence ----------------
+def forest_path(model_key, models_path=None):
+    return os.path.join(models_path or config.MODELS_PATH, f"{model_key}_forest.npz")
+
+
+def save_forest(forest, path):
+    """Write the arrays atomically (a running app may be loading the previous file)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, feature=forest.feature, threshold=forest.threshold, left=forest.left, right=forest.right,
+             missing_left=forest.missing_left, value=forest.value, roots=forest.roots,
+             depth=np.asarray(forest.depth), classes=forest.classes_,
+             feature_names=np.asarray(forest.feature_names, dtype=str), meta=np.asarray(json.dumps(forest.meta)))
+    os.replace(tmp_path, path)
+
+
+def load_forest(model_key, models_path=None):
+    path = forest_path(model_key, models_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Compiled forest not found: {path}. Run: python train_models.py {model_key}")
+    with np.load(path, allow_pickle=False) as arrays:
+        forest = CompiledForest({name: arrays[name] for name in arrays.files})
+    if forest.meta.get("format") != FOREST_FORMAT:
+        raise ValueError(f"{path} has format {forest.meta.get('format')}, expected {FOREST_FORMAT}; recompile it")
+    return forest
+
+
+def is_stale(forest):
+    """True when the source CSV changed since the forest was compiled."""
+    from datasets import dataset_hash
+    try:
+        return forest.meta.get("dataset_hash") != dataset_hash(forest.meta["disease"])
+    except (KeyError, FileNotFoundError):
+        return False
+
+
+# ---------------- Offline Compile Step ----------------
+def fit_forest(model_key, n_estimators=100, random_state=42):
+    """Fit the page's RandomForestClassifier on the reference dataset. Returns (model, X, y)."""
+    from sklearn.ensemble import RandomForestClassifier
+    from datasets import load_dataset
+
+    df = load_dataset(model_key).drop(columns=DROP_COLUMNS[model_key], errors="ignore")
+    X = df.drop(columns=[TARGET_COLUMNS[model_key]])
+    y = df[TARGET_COLUMNS[model_key]]
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state)
+    model.fit(X, y)
+    return model, X, y
+
+
+def compile_disease(model_key, models_path=None, n_estimators=100, random_state=42):
+    """Fit, compile, check the compiled forest against sklearn and save it. Returns a stats dict."""
+    from datasets import dataset_hash
+
+    started = time.perf_counter()
+    model, X, _ = fit_forest(model_key, n_estimators, random_state)
+    fitted = time.perf_counter()
+    forest = compile_forest(model, X.columns.tolist(), meta={
+        "disease": model_key,
+        "dataset_hash": dataset_hash(model_key),
+        "n_estimators": n_estimators,
+        "random_state": random_state,
+        "compiled_at": time.time(),
+    })
+    # Agreement check on the training rows plus jittered copies (exercises both sides of many splits)
+    rng = np.random.default_rng(random_state)
+    X_train = X.to_numpy(dtype=float)
+    X_check = np.vstack([X_train] + [X_train * rng.normal(1.0, 0.05, size=X_train.shape) for _ in range(20)])
+    expected = model.predict_proba(X.__class__(X_check, columns=X.columns))
+    if not np.allclose(forest.predict_proba(X_check), expected, atol=1e-12):
+        raise RuntimeError(f"Compiled {model_key} forest disagrees with sklearn; not saved")
+    path = forest_path(model_key, models_path)
+    save_forest(forest, path)
+    return {
+        "disease": model_key,
+        "trees": forest.n_trees,
+        "nodes": len(forest.feature),
+        "depth": forest.depth,
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "fit_seconds": round(fitted - started, 3),
+        "total_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile random-forest disease models to flat node arrays.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("compile", help="Fit, compile and save models/<disease>_forest.npz")
+    build.add_argument("diseases", nargs="*", help=f"Default: {' '.join(FOREST_DISEASES)}")
+    build.add_argument("--trees", type=int, default=100)
+    build.add_argument("--random-state", type=int, default=42)
+    build.add_argument("--models-path", default=None)
+    args = parser.parse_args(argv)
+
+    unknown = sorted(set(args.diseases) - set(TARGET_COLUMNS))
+    if unknown:
+        parser.error(f"unknown disease(s): {', '.join(unknown)}")
+    for model_key in args.diseases or FOREST_DISEASES:
+        stats = compile_disease(model_key, args.models_path, args.trees, args.random_state)
+        print(f"✅ {model_key}: {stats['trees']} trees, {stats['nodes']:,} nodes (depth {stats['depth']}), "
+              f"{stats['bytes'] / 1024:.0f} KB -> {stats['path']} in {stats['total_seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,12 @@
 import streamlit as st
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
+from forest import load_forest, is_stale
 
 @st.cache_resource
 def load_heart_model():
-    df = pd.read_csv('./data/heart.csv')
-    X = df.drop('target', axis=1)
-    y = df['target']
-    model = RandomForestClassifier()
-    model.fit(X, y)
-    return model, X.columns.tolist()
+    # Compiled by train_models.py (or `python forest.py compile heart`); nothing is fitted at start-up
+    forest = load_forest('heart')
+    return forest, forest.feature_names
 
 def heart_prediction():
     st.subheader("❤️ Heart Disease Prediction")
@@ -17,8 +14,10 @@ def heart_prediction():
     try:
         model, features = load_heart_model()
     except FileNotFoundError as e:
-        st.error(f"❌ Dataset not found! {e}")
+        st.error(f"❌ Model not found! {e}")
         return
+    if is_stale(model):
+        st.warning("⚠️ The heart dataset changed since this model was compiled. Run: python train_models.py heart")
 
     st.markdown("### 🧾 Enter Patient Details Below:")
     user_data = {}
@@ -0,0 +1,41 @@
+# inference.py - Disease definitions and scoring shared by the app and batch jobs
+#
+# Feature encoding lives with each artifact (pipeline.FeatureEncoder), so the
+# category vocabulary used at request time is exactly the one frozen at training.
+from metrics import timer
+
+# ---------------- Disease Definitions ----------------
+DISEASES = ["diabetes", "heart", "parkinson"]
+DATA_FILES = {"diabetes": "diabetes.csv", "heart": "heart.csv", "parkinson": "parkinson.csv"}
+TARGET_COLUMNS = {"diabetes": "Outcome", "heart": "target", "parkinson": "status"}
+CATEGORICAL_COLUMNS = {
+    "diabetes": [],
+    "heart": ['sex', 'cp', 'fbs', 'restecg', 'exang', 'slope', 'ca', 'thal'],
+    "parkinson": [],
+}
+DROP_COLUMNS = {"diabetes": [], "heart": [], "parkinson": ['name']}
+DISEASE_NAMES = {"diabetes": "Diabetes", "heart": "Heart Disease", "parkinson": "Parkinson's"}
+# (positive, negative) wording of a result, as shown on the dashboard and in reports
+RESULT_LABELS = {
+    "diabetes": ("High Risk", "Low Risk"),
+    "heart": ("Risk Detected", "Appears Healthy"),
+    "parkinson": ("Indicators Found", "No Indicators Found"),
+}
+
+
+# ---------------- Scoring ----------------
+def predict_frame(pipeline, model_key, input_df):
+    """
+    Score a DataFrame of raw rows in one vectorized impute -> scale -> model pass.
+    Returns (predictions, positive-class probabilities) as NumPy arrays.
+    """
+    with timer("predict", model_key):
+        return predict_matrix(pipeline, pipeline.encode(input_df))
+
+
+def predict_matrix(pipeline, X):
+    """Score an already aligned feature matrix; same return value as predict_frame."""
+    # One predict_proba call; the label is the argmax, so predict() is not needed
+    proba = pipeline.predict_proba(X)
+    predictions = pipeline.classes_[proba.argmax(axis=1)]
+    return predictions, proba[:, 1]
@@ -0,0 +1,244 @@
+# metrics.py - Stage timers, latency histograms and a Prometheus text endpoint
+#
+# Hot-path code wraps each stage in `with timer("encode", disease):`. Every
+# observation lands in a per-(stage, disease) histogram with fixed Prometheus
+# buckets plus a bounded window of recent samples for p50/p95/p99, and (when
+# MEDISCAN_METRICS_LOG is set) one JSON line in a structured log written by a
+# background thread. The API serves the text format on /metrics; the Streamlit
+# process can expose the same on MEDISCAN_METRICS_PORT.
+#
+# Stages: schema_load, predict (end to end), render, pdf, password_hash,
+# password_verify, api_request, and for the Streamlit app script_run /
+# fragment_run (wall and _cpu, labelled by view or fragment in place of the
+# disease). encode, impute and predict_proba split every scoring call further
+# and are only recorded with MEDISCAN_METRICS_STAGES=1.
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+import config
+
+# Upper bounds in seconds (the implicit +Inf bucket is added when rendering)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    def __init__(self, window=None):
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window or config.METRICS_WINDOW)  # For quantiles
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.bucket_counts[bisect_left(BUCKETS, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+            self.recent.append(seconds)
+
+    def quantiles(self):
+        import numpy as np  # Only needed when reporting; keeps this module cheap to import
+
+        with self._lock:
+            samples = np.fromiter(self.recent, dtype=float)
+        if not len(samples):
+            return {q: None for q in QUANTILES}
+        return dict(zip(QUANTILES, np.quantile(samples, QUANTILES).tolist()))
+
+
+_histograms = {}         # (stage, disease) -> Histogram
+_counters = {}           # (name, disease) -> int
+_lock = threading.Lock()
+_log = None
+_http_server = None
+
+
+def _structured_log():
+    """JSON-lines logger fed through a queue, so the hot path never waits on disk."""
+    global _log
+    if _log is None and config.METRICS_LOG:
+        with _lock:
+            if _log is None:
+                records = queue.Queue(maxsize=100000)
+                handler = logging.FileHandler(config.METRICS_LOG)
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logging.handlers.QueueListener(records, handler).start()
+                logger = logging.getLogger("mediscan.metrics")
+                logger.propagate = False
+                logger.setLevel(logging.INFO)
+                logger.addHandler(logging.handlers.QueueHandler(records))
+                _log = logger
+    return _log
+
+
+def log_event(event, **fields):
+    """Write one structured record (no-op unless MEDISCAN_METRICS_LOG is set)."""
+    logger = _structured_log()
+    if logger is not None:
+        try:
+            logger.info(json.dumps({"ts": round(time.time(), 6), "event": event, **fields}, default=str))
+        except queue.Full:
+            pass
+
+
+# ---------------- Recording ----------------
+def observe(stage, seconds, disease=""):
+    key = (stage, disease or "")
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _lock:
+            histogram = _histograms.setdefault(key, Histogram())
+    histogram.observe(seconds)
+    if config.METRICS_LOG:
+        log_event("timing", stage=stage, disease=disease or None, ms=round(seconds * 1000, 4))
+
+
+@contextmanager
+def timer(stage, disease="", cpu=False):
+    """
+    Time the enclosed block as one observation of `stage` (recorded even if it raises).
+    With cpu=True the CPU time of the calling thread is also recorded, as `<stage>_cpu`.
+    """
+    started = time.perf_counter()
+    cpu_started = time.thread_time() if cpu else None
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started, disease)
+        if cpu:
+            observe(f"{stage}_cpu", time.thread_time() - cpu_started, disease)
+
+
+def increment(name, disease="", amount=1):
+    key = (name, disease or "")
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+# ---------------- Reporting ----------------
+def snapshot():
+    """{stage: {disease: {count, mean_ms, p50_ms, p95_ms, p99_ms}}} for logs and dashboards."""
+    report = {}
+    with _lock:
+        histograms = sorted(_histograms.items())
+    for (stage, disease), h in histograms:
+        q = h.quantiles()
+        report.setdefault(stage, {})[disease or "all"] = {
+            "count": h.count,
+            "mean_ms": round(h.sum / h.count * 1000, 4) if h.count else None,
+            **{f"p{int(k * 100)}_ms": (round(v * 1000, 4) if v is not None else None) for k, v in q.items()},
+        }
+    return report
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items() if v != "")
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = [
+        "# HELP mediscan_stage_seconds Time spent per prediction-path stage.",
+        "# TYPE mediscan_stage_seconds histogram",
+    ]
+    with _lock:
+        histograms = sorted(_histograms.items())
+    for (stage, disease), h in histograms:
+        with h._lock:
+            counts, total, count = list(h.bucket_counts), h.sum, h.count
+        cumulative = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"mediscan_stage_seconds_bucket{{{_labels(stage=stage, disease=disease, le=le)}}} {cumulative}")
+        lines.append(f"mediscan_stage_seconds_sum{{{_labels(stage=stage, disease=disease)}}} {total}")
+        lines.append(f"mediscan_stage_seconds_count{{{_labels(stage=stage, disease=disease)}}} {count}")
+
+    lines += [
+        "# HELP mediscan_stage_latency_seconds Recent-window latency quantiles per stage.",
+        "# TYPE mediscan_stage_latency_seconds gauge",
+    ]
+    for (stage, disease), h in histograms:
+        for q, value in h.quantiles().items():
+            if value is not None:
+                lines.append(f"mediscan_stage_latency_seconds{{{_labels(stage=stage, disease=disease, quantile=q)}}} {value}")
+
+    with _lock:
+        counters = sorted(_counters.items())
+    for name in sorted({name for (name, _), _ in counters}):
+        lines.append(f"# TYPE mediscan_{name}_total counter")
+        for (counter, disease), value in counters:
+            if counter == name:
+                lines.append(f"mediscan_{name}_total{{{_labels(disease=disease)}}} {value}")
+
+    try:
+        from prediction_cache import cache_stats
+        stats = cache_stats()
+        lines.append("# TYPE mediscan_prediction_cache_hits_total counter")
+        lines.append(f"mediscan_prediction_cache_hits_total {stats['hits']}")
+        lines.append("# TYPE mediscan_prediction_cache_misses_total counter")
+        lines.append(f"mediscan_prediction_cache_misses_total {stats['misses']}")
+        lines.append("# TYPE mediscan_prediction_cache_entries gauge")
+        lines.append(f"mediscan_prediction_cache_entries {stats['entries']}")
+    except ImportError:
+        pass
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def start_http_server(port=None):
+    """Serve /metrics from a daemon thread (once per process). Returns the server or None."""
+    global _http_server
+    port = config.METRICS_PORT if port is None else port
+    if not port:
+        return None
+    with _lock:
+        if _http_server is not None:
+            return _http_server or None  # False: an earlier attempt could not bind
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+        except OSError as e:  # Another Streamlit process already owns the port
+            print(f"[Metrics] Could not listen on :{port}: {e}")
+            _http_server = False
+            return None
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"[Metrics] Serving /metrics on :{port}")
+        _http_server = server
+        return server
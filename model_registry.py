@@ -0,0 +1,107 @@
+# model_registry.py - Process-wide, lazily loaded disease models with hot reload
+#
+# Streamlit re-executes app.py on every interaction, but imported modules are
+# loaded once per process. Keeping the models here means every session shares
+# one copy, each disease is only read from disk when first needed, and a newly
+# trained artifact in models/ is picked up on the next request without restart.
+import threading
+import time
+
+import config
+from pipeline import load_pipeline, pipeline_path
+from utils import file_signature
+
+
+class ModelRegistry:
+    def __init__(self, models_path=None, check_interval=None):
+        self.models_path = models_path or config.MODELS_PATH
+        self.check_interval = config.MODEL_CHECK_INTERVAL if check_interval is None else check_interval
+        self._entries = {}        # model_key -> {"pipeline", "signature", "version", "checked_at"}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def _load_lock(self, model_key):
+        with self._lock:
+            return self._load_locks.setdefault(model_key, threading.Lock())
+
+    def _signature(self, model_key):
+        path = pipeline_path(model_key, self.models_path)
+        try:
+            return file_signature(path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Model artifact not found: {path}. Run train_models.py first.")
+
+    def get(self, model_key):
+        """Return the current pipeline for a disease, loading or reloading it if needed."""
+        return self._current(model_key)["pipeline"]
+
+    def version(self, model_key):
+        """Identifier of the currently loaded artifact (changes whenever it is reloaded)."""
+        return self._current(model_key)["version"]
+
+    def get_with_version(self, model_key):
+        entry = self._current(model_key)
+        return entry["pipeline"], entry["version"]
+
+    def _current(self, model_key):
+        entry = self._entries.get(model_key)
+        if entry and time.monotonic() - entry["checked_at"] < self.check_interval:
+            return entry
+
+        # Only one thread (re)loads a given disease; the others wait and reuse its result
+        with self._load_lock(model_key):
+            entry = self._entries.get(model_key)
+            if entry and time.monotonic() - entry["checked_at"] < self.check_interval:
+                return entry
+
+            try:
+                signature = self._signature(model_key)
+            except FileNotFoundError:
+                if entry:  # Artifact briefly missing (e.g. being replaced): keep serving the old one
+                    entry["checked_at"] = time.monotonic()
+                    return entry
+                raise
+
+            if entry and entry["signature"] == signature:
+                entry["checked_at"] = time.monotonic()
+                return entry
+
+            try:
+                pipeline = load_pipeline(model_key, self.models_path)
+            except Exception as e:
+                if entry:
+                    print(f"[Registry] Reload of {model_key} failed, keeping previous model: {e}")
+                    entry["checked_at"] = time.monotonic()
+                    return entry
+                raise
+
+            if entry:
+                print(f"[Registry] Reloaded {model_key} model from {pipeline_path(model_key, self.models_path)}")
+            # Swap in a fresh entry dict so readers see either the old or the new model, never a mix
+            entry = {
+                "pipeline": pipeline,
+                "signature": signature,
+                "version": f"v{pipeline.artifact['version']}-{signature[1]}",
+                "checked_at": time.monotonic(),
+            }
+            self._entries[model_key] = entry
+            return entry
+
+    def loaded(self):
+        return sorted(self._entries)
+
+    def reload(self, model_key=None):
+        """Force the next get() to re-check the artifact on disk."""
+        with self._lock:
+            keys = [model_key] if model_key else list(self._entries)
+            for key in keys:
+                if key in self._entries:
+                    self._entries[key] = dict(self._entries[key], checked_at=float("-inf"), signature=None)
+
+
+# ---------------- Process-wide Registry ----------------
+registry = ModelRegistry()
+
+
+def get_model(model_key):
+    return registry.get(model_key)
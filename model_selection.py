@@ -0,0 +1,187 @@
+# model_selection.py - Pick each disease's model on quality *and* serving cost
+#
+# Every candidate estimator / hyperparameter combination is cross-validated
+# (stratified k-fold) in its own worker process, then refitted once on the
+# full data and timed the way it would be served: one patient at a time
+# through the compiled pipeline artifact. The winner is the best AUC (then
+# accuracy) among candidates whose median per-row latency fits the budget.
+#
+# Usage:
+#   python model_selection.py heart --budget-ms 1.0 --folds 5
+#   python train_models.py --select          # select + save every disease
+import argparse
+import multiprocessing
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import ParameterGrid, StratifiedKFold, cross_validate
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+import config
+from pipeline import CompiledPipeline, build_estimator_pipeline, build_pipeline
+
+warnings.filterwarnings('ignore')
+
+# Candidate name -> (estimator class, hyperparameter grid)
+CANDIDATES = {
+    "logistic_regression": (LogisticRegression, {"C": [0.1, 1.0, 10.0], "max_iter": [1000]}),
+    "random_forest": (RandomForestClassifier, {"n_estimators": [100, 300], "max_depth": [None, 6],
+                                               "random_state": [42]}),
+    "gradient_boosting": (GradientBoostingClassifier, {"n_estimators": [100], "learning_rate": [0.05, 0.1],
+                                                       "max_depth": [2, 3], "random_state": [42]}),
+}
+
+LATENCY_SAMPLE_ROWS = 200
+
+
+def make_estimator(name, params):
+    """scaler + classifier; imputation is fitted separately so it can live in the artifact."""
+    estimator_class, _ = CANDIDATES[name]
+    return Pipeline([("scaler", StandardScaler()), ("model", estimator_class(**params))])
+
+
+def fit_artifact(model_key, name, params, X, y, raw_columns, categorical_layout, categorical_levels=None):
+    """Fit one candidate on the full data and compile it into a pipeline artifact."""
+    imputer = SimpleImputer(strategy='mean')
+    X_imputed = imputer.fit_transform(X)
+    estimator = make_estimator(name, params).fit(X_imputed, y)
+    if name == "logistic_regression":
+        # Linear winners are folded into the NumPy-only artifact
+        return build_pipeline(model_key, raw_columns, categorical_layout, imputer,
+                              estimator.named_steps["scaler"], estimator.named_steps["model"], categorical_levels)
+    return build_estimator_pipeline(model_key, raw_columns, categorical_layout, imputer, estimator, categorical_levels)
+
+
+def row_latency_ms(pipeline, X, sample_rows=LATENCY_SAMPLE_ROWS):
+    """Median and p99 time to score a single patient, in milliseconds."""
+    rows = np.asarray(X, dtype=float)[:sample_rows]
+    pipeline.predict_proba(rows[:1])  # Warm-up
+    timings = []
+    for i in range(max(sample_rows, 1)):
+        row = rows[i % len(rows)].reshape(1, -1)
+        started = time.perf_counter()
+        pipeline.predict_proba(row)
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+def cv_folds(y, folds=None):
+    """Number of stratified folds the data supports (0 when cross-validation is impossible)."""
+    folds = folds or config.CV_FOLDS
+    _, counts = np.unique(y, return_counts=True)
+    return min(folds, int(counts.min())) if len(counts) == 2 and counts.min() >= 2 else 0
+
+
+# ---------------- Worker Function (runs in the pool) ----------------
+def evaluate_candidate(model_key, name, params, X, y, folds):
+    """Cross-validate one candidate, then refit it and measure its serving latency."""
+    result = {"candidate": name, "params": params, "cv_accuracy": None, "cv_auc": None}
+    started = time.perf_counter()
+    if folds >= 2:
+        imputed = Pipeline([("imputer", SimpleImputer(strategy='mean')), ("estimator", make_estimator(name, params))])
+        scores = cross_validate(imputed, X, y, cv=StratifiedKFold(folds, shuffle=True, random_state=42),
+                                scoring=("accuracy", "roc_auc"), error_score=np.nan)
+        accuracy, auc = np.nanmean(scores["test_accuracy"]), np.nanmean(scores["test_roc_auc"])
+        result["cv_accuracy"] = None if np.isnan(accuracy) else round(float(accuracy), 4)
+        result["cv_auc"] = None if np.isnan(auc) else round(float(auc), 4)
+    result["cv_seconds"] = round(time.perf_counter() - started, 4)
+
+    artifact = fit_artifact(model_key, name, params, X, y, [], {})
+    p50, p99 = row_latency_ms(CompiledPipeline(artifact), X)
+    result["latency_ms_p50"] = round(p50, 4)
+    result["latency_ms_p99"] = round(p99, 4)
+    return result
+
+
+# ---------------- Selection ----------------
+def _rank(result):
+    missing = -1.0
+    return (result["cv_auc"] if result["cv_auc"] is not None else missing,
+            result["cv_accuracy"] if result["cv_accuracy"] is not None else missing,
+            -result["latency_ms_p50"])
+
+
+def select_model(model_key, X, y, raw_columns, categorical_layout, workers=None, folds=None,
+                 latency_budget_ms=None, candidates=None, categorical_levels=None):
+    """
+    Evaluate every candidate in parallel and return (winner artifact, report).
+    The report lists all results, the budget and the winner.
+    """
+    budget = config.LATENCY_BUDGET_MS if latency_budget_ms is None else latency_budget_ms
+    folds = cv_folds(y, folds)
+    jobs = [(name, params) for name in (candidates or CANDIDATES)
+            for params in ParameterGrid(CANDIDATES[name][1])]
+    workers = workers or config.SELECTION_WORKERS or os.cpu_count() or 1
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(evaluate_candidate, model_key, name, params, X, y, folds) for name, params in jobs]
+        results = [f.result() for f in futures]
+
+    eligible = [r for r in results if r["latency_ms_p50"] <= budget]
+    if eligible:
+        winner = max(eligible, key=_rank)
+    else:
+        winner = min(results, key=lambda r: r["latency_ms_p50"])
+        print(f"[Selection] {model_key}: no candidate within {budget} ms/row, using the fastest")
+
+    artifact = fit_artifact(model_key, winner["candidate"], winner["params"], X, y, raw_columns, categorical_layout,
+                            categorical_levels)
+    report = {
+        "folds": folds,
+        "latency_budget_ms": budget,
+        "seconds": round(time.perf_counter() - started, 4),
+        "winner": winner,
+        "results": sorted(results, key=_rank, reverse=True),
+    }
+    return artifact, report
+
+
+def print_report(model_key, report):
+    print(f"\n--- {model_key}: {len(report['results'])} candidates, {report['folds']}-fold CV, "
+          f"budget {report['latency_budget_ms']} ms/row ({report['seconds']:.1f}s) ---")
+    print(f"{'candidate':<22}{'params':<52}{'AUC':>7}{'acc':>7}{'p50 ms':>9}")
+    for r in report["results"]:
+        params = ", ".join(f"{k}={v}" for k, v in r["params"].items() if k != "random_state")
+        auc = "-" if r["cv_auc"] is None else f"{r['cv_auc']:.3f}"
+        acc = "-" if r["cv_accuracy"] is None else f"{r['cv_accuracy']:.3f}"
+        marker = " ⭐" if r == report["winner"] else ""
+        print(f"{r['candidate']:<22}{params:<52}{auc:>7}{acc:>7}{r['latency_ms_p50']:>9.3f}{marker}")
+
+
+def main(argv=None):
+    from datasets import load_dataset
+    from inference import DISEASES, TARGET_COLUMNS, CATEGORICAL_COLUMNS, DROP_COLUMNS
+    from pipeline import pipeline_path, save_pipeline
+    from train_models import prepare_features
+
+    parser = argparse.ArgumentParser(description="Compare candidate models per disease (CV quality + latency).")
+    parser.add_argument("diseases", nargs="*", metavar="disease", help=f"Subset of {DISEASES} (default: all)")
+    parser.add_argument("--folds", type=int, default=None)
+    parser.add_argument("--budget-ms", type=float, default=None, help="Max median per-row latency")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--save", action="store_true", help="Save each winner as the disease's pipeline artifact")
+    args = parser.parse_args(argv)
+
+    for model_key in args.diseases or DISEASES:
+        df = load_dataset(model_key)
+        X, y, raw_columns, layout, levels = prepare_features(
+            df, TARGET_COLUMNS[model_key], DROP_COLUMNS[model_key], CATEGORICAL_COLUMNS[model_key])
+        artifact, report = select_model(model_key, X, y, raw_columns, layout, args.workers, args.folds, args.budget_ms,
+                                        categorical_levels=levels)
+        print_report(model_key, report)
+        if args.save:
+            save_pipeline(artifact, pipeline_path(model_key))
+            print(f"✅ Saved {report['winner']['candidate']} to {pipeline_path(model_key)}")
+
+
+if __name__ == "__main__":
+    main()
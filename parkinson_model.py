@@ -1,16 +1,12 @@
 import streamlit as st
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
+from forest import load_forest, is_stale
 
 @st.cache_resource
 def load_parkinson_model():
-    df = pd.read_csv('./data/parkinson.csv')
-    df = df.drop(['name'], axis=1)  # Drop 'name' if exists
-    X = df.drop('status', axis=1)
-    y = df['status']
-    model = RandomForestClassifier()
-    model.fit(X, y)
-    return model, X.columns.tolist()
+    # Compiled by train_models.py (or `python forest.py compile parkinson`); nothing is fitted at start-up
+    forest = load_forest('parkinson')
+    return forest, forest.feature_names
 
 def parkinson_prediction():
     st.subheader("🧠 Parkinson’s Disease Prediction")
@@ -18,8 +14,10 @@ def parkinson_prediction():
     try:
         model, features = load_parkinson_model()
     except FileNotFoundError as e:
-        st.error(f"❌ Dataset not found! {e}")
+        st.error(f"❌ Model not found! {e}")
         return
+    if is_stale(model):
+        st.warning("⚠️ The Parkinson’s dataset changed since this model was compiled. Run: python train_models.py parkinson")
 
     st.markdown("### 🧾 Enter Patient Details Below:")
     user_data = {}
@@ -1,19 +1,70 @@
+import os
+import re
+import uuid
+import fpdf
 from fpdf import FPDF
 from datetime import datetime
 
-def generate_health_report(name, email, prediction_result, disease_name):
+REPORTS_DIR = os.path.join("reports", "user_reports")
+
+# fpdf2 returns the document from output(); the legacy PyFPDF 1.x needs dest="S"
+_FPDF2 = int(str(getattr(fpdf, "__version__", "1")).split(".")[0]) >= 2
+
+# Rows printed under the title, in order: (label, field name)
+REPORT_TEMPLATE = [
+    ("Name", "name"),
+    ("Email", "email"),
+    ("Disease Checked", "disease_name"),
+    ("Prediction Result", "prediction_result"),
+    ("Date", "date"),
+]
+
+
+def build_health_report(name, email, prediction_result, disease_name, template=None, extra_rows=None):
+    """Lay out the report and return the FPDF document (nothing is written to disk)."""
+    fields = {
+        "name": name,
+        "email": email,
+        "prediction_result": prediction_result,
+        "disease_name": disease_name,
+        "date": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
     pdf = FPDF()
     pdf.add_page()
     pdf.set_font("Arial", size=12)
 
     pdf.cell(200, 10, txt="MediScan AI - Health Report", ln=True, align='C')
     pdf.ln(10)
-    pdf.cell(200, 10, txt=f"Name: {name}", ln=True)
-    pdf.cell(200, 10, txt=f"Email: {email}", ln=True)
-    pdf.cell(200, 10, txt=f"Disease Checked: {disease_name}", ln=True)
-    pdf.cell(200, 10, txt=f"Prediction Result: {prediction_result}", ln=True)
-    pdf.cell(200, 10, txt=f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True)
-
-    filename = f"{disease_name}_report.pdf"
-    pdf.output(filename)
+    for label, field in template or REPORT_TEMPLATE:
+        pdf.cell(200, 10, txt=f"{label}: {fields[field]}", ln=True)
+    for label, value in extra_rows or []:
+        pdf.cell(200, 10, txt=f"{label}: {value}", ln=True)
+    return pdf
+
+
+def pdf_to_bytes(pdf):
+    data = pdf.output() if _FPDF2 else pdf.output(dest="S")
+    return data.encode("latin-1") if isinstance(data, str) else bytes(data)
+
+
+def generate_health_report_bytes(name, email, prediction_result, disease_name, **kwargs):
+    """Render the report in memory, e.g. for st.download_button."""
+    return pdf_to_bytes(build_health_report(name, email, prediction_result, disease_name, **kwargs))
+
+
+def report_path(name, disease_name, output_dir=None):
+    """Unique per-user file path, so concurrent users never overwrite each other's reports."""
+    safe_user = re.sub(r"[^A-Za-z0-9_.-]+", "_", str(name or "anonymous")).strip("._") or "anonymous"
+    safe_disease = re.sub(r"[^A-Za-z0-9_-]+", "_", str(disease_name)).strip("_") or "report"
+    folder = os.path.join(output_dir or REPORTS_DIR, safe_user)
+    os.makedirs(folder, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    return os.path.join(folder, f"{safe_disease}_{stamp}_{uuid.uuid4().hex[:8]}.pdf")
+
+
+def generate_health_report(name, email, prediction_result, disease_name, output_dir=None, **kwargs):
+    pdf = build_health_report(name, email, prediction_result, disease_name, **kwargs)
+    filename = report_path(name, disease_name, output_dir)
+    with open(filename, "wb") as f:
+        f.write(pdf_to_bytes(pdf))
     return filename
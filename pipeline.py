@@ -0,0 +1,293 @@
+# pipeline.py - Single fused inference artifact per disease
+#
+# train_models.py bundles everything needed to score a patient (feature schema,
+# dummy layout, imputation means, scaling constants and logistic-regression
+# weights) into one `<disease>_pipeline.pkl`. Loading it needs only NumPy, and
+# scoring is a handful of array operations instead of three sklearn calls.
+# When model selection picks a non-linear winner (kind "estimator"), the artifact
+# keeps the fitted sklearn scaler + model and only the imputation stays in NumPy.
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+import config
+from metrics import increment, timer
+
+PIPELINE_VERSION = 1
+
+
+def pipeline_path(model_key, models_path=None):
+    return os.path.join(models_path or config.MODELS_PATH, f"{model_key}_pipeline.pkl")
+
+
+# ---------------- Building (training time) ----------------
+def categorical_baselines(categorical_layout, categorical_levels):
+    """
+    The one level per categorical column that drop_first dropped (it encodes as all zeros).
+    Stored explicitly so the dummy layout never depends on which levels a batch contains;
+    raises ValueError when the layout is not the level list minus a single baseline.
+    """
+    baselines = {}
+    for col, kept in categorical_layout.items():
+        levels = (categorical_levels or {}).get(col)
+        if not levels:
+            continue
+        dropped = [level for level in levels if level not in set(kept)]
+        if len(dropped) != 1 or len(kept) != len(levels) - 1:
+            raise ValueError(f"Dummy layout of {col} is not its level list minus one baseline level")
+        baselines[col] = dropped[0]
+    return baselines
+
+
+def build_pipeline(model_key, raw_columns, categorical_layout, imputer, scaler, model, categorical_levels=None):
+    """Collect the fitted imputer/scaler/model constants into a plain dict artifact."""
+    if model.coef_.shape[0] != 1:
+        raise ValueError("Only binary logistic models can be compiled into a pipeline artifact.")
+
+    feature_names = [str(c) for c in imputer.feature_names_in_]
+    fill_values = np.asarray(imputer.statistics_, dtype=float)
+    scale_mean = np.asarray(scaler.mean_, dtype=float)
+    scale = np.asarray(scaler.scale_, dtype=float)
+    coef = np.asarray(model.coef_[0], dtype=float)
+    intercept = float(model.intercept_[0])
+
+    # Fold the scaler into the linear model: ((x - mu) / s) . w + b == x . (w / s) + (b - mu/s . w)
+    fused_weights = coef / scale
+    fused_bias = intercept - float(np.dot(scale_mean / scale, coef))
+
+    return {
+        "version": PIPELINE_VERSION,
+        "disease": model_key,
+        "raw_columns": [str(c) for c in raw_columns],
+        "categorical_layout": categorical_layout,
+        "categorical_levels": categorical_levels,
+        "categorical_baselines": categorical_baselines(categorical_layout, categorical_levels),
+        "feature_names": feature_names,
+        "fill_values": fill_values,
+        "scale_mean": scale_mean,
+        "scale": scale,
+        "coef": coef,
+        "intercept": intercept,
+        "classes": np.asarray(model.classes_),
+        "fused_weights": fused_weights,
+        "fused_bias": fused_bias,
+    }
+
+
+def build_estimator_pipeline(model_key, raw_columns, categorical_layout, imputer, estimator, categorical_levels=None):
+    """Artifact for any fitted sklearn classifier (e.g. scaler + random forest) applied after imputation."""
+    if len(estimator.classes_) != 2:
+        raise ValueError("Only binary classifiers can be compiled into a pipeline artifact.")
+    return {
+        "version": PIPELINE_VERSION,
+        "kind": "estimator",
+        "disease": model_key,
+        "raw_columns": [str(c) for c in raw_columns],
+        "categorical_layout": categorical_layout,
+        "categorical_levels": categorical_levels,
+        "categorical_baselines": categorical_baselines(categorical_layout, categorical_levels),
+        "feature_names": [str(c) for c in imputer.feature_names_in_],
+        "fill_values": np.asarray(imputer.statistics_, dtype=float),
+        "classes": np.asarray(estimator.classes_),
+        "estimator": estimator,
+    }
+
+
+def save_pipeline(artifact, path):
+    """Write the artifact atomically so readers never see a half-written file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+# ---------------- Encoding (request time) ----------------
+def canonical_level(value):
+    """One spelling per category level: 1, 1.0, "1" and " 1 " all become "1"."""
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            value = float(text)
+        except ValueError:
+            return text
+    if value is None:
+        return "nan"
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if np.isnan(number):
+        return "nan"
+    return str(int(number)) if number.is_integer() else repr(number)
+
+
+class FeatureEncoder:
+    """
+    Raw input rows -> model matrix, using the category vocabulary frozen at training time.
+    Columns come out in the exact training order; a level the model never saw (or the
+    dropped baseline level) encodes as all-zero dummies, and a missing numeric value as
+    NaN so the pipeline imputes it with the training mean. Every row is encoded on its
+    own against the frozen layout, so any split of a cohort into chunks gives the same matrix.
+    """
+
+    def __init__(self, feature_names, raw_columns, categorical_layout, categorical_levels=None, disease="",
+                 categorical_baselines=None):
+        self.disease = disease
+        index = {name: j for j, name in enumerate(feature_names)}
+        self.width = len(feature_names)
+        self.numeric = [(col, index[col]) for col in raw_columns if col in index and col not in categorical_layout]
+        # column -> {canonical level: matrix column}; the baseline level maps to -1 (all zeros)
+        self.categorical = {}
+        for col, kept in categorical_layout.items():
+            positions = {canonical_level(level): index[f"{col}_{level}"] for level in kept}
+            for level in (categorical_levels or {}).get(col, []):
+                positions.setdefault(canonical_level(level), -1)
+            if col in (categorical_baselines or {}):
+                positions.setdefault(canonical_level(categorical_baselines[col]), -1)
+            self.categorical[col] = positions
+        self.has_vocabulary = bool(categorical_levels)
+
+    def encode(self, input_df):
+        n = len(input_df)
+        X = np.zeros((n, self.width))
+        for col, j in self.numeric:
+            if col in input_df:
+                values = input_df[col]
+                X[:, j] = values if values.dtype.kind in "fiub" else pd.to_numeric(values, errors="coerce")
+            else:
+                X[:, j] = np.nan
+
+        unknown = 0
+        for col, positions in self.categorical.items():
+            if col not in input_df:
+                continue
+            # Map each distinct value once, then scatter the ones into the matrix (-2 = unseen level)
+            codes, uniques = pd.factorize(input_df[col], use_na_sentinel=False)
+            targets = np.array([positions.get(canonical_level(u), -2) for u in uniques], dtype=np.intp)
+            columns = targets[codes]
+            rows = np.flatnonzero(columns >= 0)
+            X[rows, columns[rows]] = 1.0
+            unknown += int((columns == -2).sum())
+        if unknown and self.has_vocabulary:
+            increment("unknown_category_levels", self.disease, unknown)
+        return X
+
+
+# ---------------- Evaluating (request time) ----------------
+class CompiledPipeline:
+    """Evaluator for a pipeline artifact: impute -> scale -> logistic regression (or the stored estimator)."""
+
+    def __init__(self, artifact):
+        if artifact.get("version") != PIPELINE_VERSION:
+            raise ValueError(f"Unsupported pipeline version {artifact.get('version')}; retrain with train_models.py")
+        self.artifact = artifact
+        self.disease = artifact["disease"]
+        self.feature_names_in_ = artifact["feature_names"]
+        self.categorical_layout = artifact["categorical_layout"]
+        self.classes_ = artifact["classes"]
+        self.encoder = FeatureEncoder(self.feature_names_in_, artifact["raw_columns"], self.categorical_layout,
+                                      artifact.get("categorical_levels"), self.disease,
+                                      artifact.get("categorical_baselines"))
+        self.kind = artifact.get("kind", "linear")
+        self._fill = artifact["fill_values"]
+        self._estimator = artifact.get("estimator")
+        self._weights = artifact.get("fused_weights")
+        self._bias = artifact.get("fused_bias")
+
+    def validate(self, rows):
+        """
+        Check raw input rows (dicts, as the API receives them) before encoding, where bad
+        values would otherwise be coerced to NaN or all-zero dummies and silently imputed.
+        Raises ValueError for an empty or all-null row, a column the model does not know,
+        a category level outside the training vocabulary or a non-numeric value in a
+        numeric column; returns the columns each row leaves out (null counts as left out).
+        """
+        columns = self.artifact["raw_columns"]
+        known = set(columns)
+        vocabulary = self.artifact.get("categorical_levels") or {}
+        missing = []
+        for i, row in enumerate(rows):
+            where = f"row {i}: " if len(rows) > 1 else ""
+            if not row:
+                raise ValueError(f"{where}no input fields")
+            unknown = sorted(key for key in row if key not in known)
+            if unknown:
+                raise ValueError(f"{where}unknown field(s) {', '.join(unknown)}")
+            if all(value is None for value in row.values()):
+                raise ValueError(f"{where}every input field is null")
+            for col, value in row.items():
+                if value is None:
+                    continue
+                if col in self.categorical_layout:
+                    if isinstance(value, (dict, list)):
+                        raise ValueError(f"{where}{col} must be a single value")
+                    levels = self.encoder.categorical[col]
+                    if col in vocabulary and canonical_level(value) not in levels:
+                        raise ValueError(f"{where}{col} must be one of {', '.join(sorted(levels))}, got {value!r}")
+                    continue
+                try:
+                    number = float(value)
+                except (TypeError, ValueError):
+                    number = np.nan
+                if isinstance(value, bool) or not np.isfinite(number):
+                    raise ValueError(f"{where}{col} must be a number, got {value!r}")
+            missing.append([col for col in columns if row.get(col) is None])
+        return missing
+
+    def encode(self, input_df):
+        """Raw DataFrame rows -> feature matrix in training column order (see FeatureEncoder)."""
+        if not config.METRICS_STAGES:
+            return self.encoder.encode(input_df)
+        with timer("encode", self.disease):
+            return self.encoder.encode(input_df)
+
+    def _as_matrix(self, X):
+        X = np.array(X, dtype=float, copy=True)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        missing = np.isnan(X)
+        if missing.any():
+            X[missing] = np.broadcast_to(self._fill, X.shape)[missing]
+        return X
+
+    def transform(self, X):
+        """Imputed and scaled features, matching the sklearn imputer + scaler output."""
+        X = self._as_matrix(X)
+        if self._estimator is not None:
+            return self._estimator[:-1].transform(X) if hasattr(self._estimator, "steps") else X
+        return (X - self.artifact["scale_mean"]) / self.artifact["scale"]
+
+    def _proba(self, X):
+        # X is already imputed; the scaler is folded into the weights (or inside the estimator)
+        if self._estimator is not None:
+            return self._estimator.predict_proba(X)
+        positive = 1.0 / (1.0 + np.exp(-(X @ self._weights + self._bias)))
+        return np.column_stack([1.0 - positive, positive])
+
+    def decision_function(self, X):
+        """Raw model scores, as sklearn's decision_function; estimators without one (forests) raise AttributeError."""
+        if self._estimator is not None:
+            if not hasattr(self._estimator, "decision_function"):
+                raise AttributeError(f"{type(self._estimator).__name__} has no decision_function; use predict_proba")
+            return self._estimator.decision_function(self._as_matrix(X))
+        return self._as_matrix(X) @ self._weights + self._bias
+
+    def predict_proba(self, X):
+        # Per-stage timers only with MEDISCAN_METRICS_STAGES=1; predict_frame times the whole call
+        if not config.METRICS_STAGES:
+            return self._proba(self._as_matrix(X))
+        with timer("impute", self.disease):
+            X = self._as_matrix(X)
+        with timer("predict_proba", self.disease):
+            return self._proba(X)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def load_pipeline(model_key, models_path=None):
+    """Load a disease's pipeline artifact (one file read; sklearn is only imported for estimator artifacts)."""
+    with open(pipeline_path(model_key, models_path), "rb") as f:
+        return CompiledPipeline(pickle.load(f))
@@ -0,0 +1,133 @@
+# prediction_cache.py - Process-wide LRU/TTL cache of recent prediction results
+#
+# Clinicians often re-submit the same form (pre-filled defaults, one field
+# tweaked back and forth). Results are cached per (disease, model version,
+# hash of the aligned feature vector), so identical inputs skip the model call
+# for every session in the process. The model version comes from the registry
+# and changes whenever an artifact is reloaded; entries of the old version are
+# dropped as soon as the new one is seen.
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import config
+from inference import predict_matrix
+from metrics import timer
+from model_registry import registry
+
+
+def vector_key(row):
+    """Canonical hash of one aligned feature vector (-0.0 == 0.0, every NaN alike)."""
+    row = np.asarray(row, dtype=np.float64) + 0.0
+    row[np.isnan(row)] = np.nan
+    return hashlib.blake2b(row.tobytes(), digest_size=16).digest()
+
+
+class PredictionCache:
+    def __init__(self, max_entries=None, ttl_seconds=None):
+        self.max_entries = config.PREDICTION_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl_seconds = config.PREDICTION_CACHE_TTL if ttl_seconds is None else ttl_seconds
+        self._entries = OrderedDict()  # (disease, version, vector hash) -> (prediction, probability, stored_at)
+        self._versions = {}            # disease -> model version the cached entries belong to
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _check_version(self, model_key, version):
+        # Caller holds the lock
+        if self._versions.get(model_key) != version:
+            stale = [k for k in self._entries if k[0] == model_key]
+            for k in stale:
+                del self._entries[k]
+            self.evictions += len(stale)
+            self._versions[model_key] = version
+
+    def get_many(self, model_key, version, keys):
+        """Cached (prediction, probability) per key, or None for misses."""
+        now = time.monotonic()
+        results = []
+        with self._lock:
+            self._check_version(model_key, version)
+            for key in keys:
+                entry = self._entries.get((model_key, version, key))
+                if entry and now - entry[2] < self.ttl_seconds:
+                    self._entries.move_to_end((model_key, version, key))
+                    results.append(entry[:2])
+                    self.hits += 1
+                else:
+                    results.append(None)
+                    self.misses += 1
+        return results
+
+    def put_many(self, model_key, version, items):
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(model_key, version)
+            for key, prediction, probability in items:
+                self._entries[(model_key, version, key)] = (prediction, probability, now)
+                self._entries.move_to_end((model_key, version, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+# ---------------- Process-wide Cache ----------------
+cache = PredictionCache()
+
+
+def predict_cached(model_key, input_df):
+    """
+    Same contract as inference.predict_frame (predictions, positive probabilities),
+    served from the cache where possible; only uncached rows reach the model.
+    """
+    with timer("predict", model_key):
+        return _predict_cached(model_key, input_df)
+
+
+def _predict_cached(model_key, input_df):
+    pipeline, version = registry.get_with_version(model_key)
+    X = pipeline.encode(input_df)
+    if cache.max_entries <= 0:
+        return predict_matrix(pipeline, X)
+
+    keys = [vector_key(row) for row in X]
+    cached = cache.get_many(model_key, version, keys)
+    predictions = np.empty(len(X), dtype=pipeline.classes_.dtype)
+    probabilities = np.empty(len(X))
+    missing = [i for i, hit in enumerate(cached) if hit is None]
+    for i, hit in enumerate(cached):
+        if hit is not None:
+            predictions[i], probabilities[i] = hit
+
+    if missing:
+        new_predictions, new_probabilities = predict_matrix(pipeline, X[missing])
+        predictions[missing] = new_predictions
+        probabilities[missing] = new_probabilities
+        cache.put_many(model_key, version, [(keys[i], new_predictions[j], float(new_probabilities[j]))
+                                            for j, i in enumerate(missing)])
+    return predictions, probabilities
+
+
+def cache_stats():
+    return cache.stats()
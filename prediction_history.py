@@ -0,0 +1,274 @@
+# prediction_history.py - Per-user prediction history with a background batching writer
+#
+# Every prediction (user, disease, inputs, probability, model version, time) is
+# appended to an SQLite table in WAL mode. The request path only appends the
+# record to an in-memory buffer; a daemon thread commits buffered records in one
+# transaction every MEDISCAN_HISTORY_FLUSH_MS (or as soon as
+# MEDISCAN_HISTORY_BATCH_SIZE are waiting). Reads go through
+# (username, disease, created_at) indexes, so "last N results" and trend queries
+# touch only the rows they return, and they also see records still waiting in
+# the buffer.
+#
+# Usage:
+#   history.record("alice@example.com", "heart", {"age": 63, ...}, 1, 0.87, "v2-...")
+#   history.recent("alice@example.com", limit=10)
+#   python prediction_history.py recent alice@example.com --disease heart
+import argparse
+import atexit
+import json
+import sqlite3
+import threading
+import time
+
+import config
+from metrics import increment, observe
+
+
+class PredictionHistory:
+    def __init__(self, path=None, batch_size=None, flush_ms=None, max_pending=None):
+        self.path = path or config.HISTORY_DB_PATH
+        self.batch_size = batch_size or config.HISTORY_BATCH_SIZE
+        self.flush_interval = (config.HISTORY_FLUSH_MS if flush_ms is None else flush_ms) / 1000.0
+        self.max_pending = max_pending or config.HISTORY_MAX_PENDING
+        self._local = threading.local()
+        self._pending = []     # Recorded, not yet handed to the writer
+        self._inflight = []    # Being committed by the writer right now
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._idle = threading.Condition(self._lock)
+        self._writer = None
+        self.dropped = 0
+        self._create_schema()
+
+    def _create_schema(self):
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                id            INTEGER PRIMARY KEY,
+                username      TEXT NOT NULL,
+                disease       TEXT NOT NULL,
+                created_at    REAL NOT NULL,
+                prediction    INTEGER NOT NULL,
+                probability   REAL NOT NULL,
+                model_version TEXT,
+                inputs        TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS predictions_user_time ON predictions (username, created_at);
+            CREATE INDEX IF NOT EXISTS predictions_user_disease_time ON predictions (username, disease, created_at);
+            CREATE INDEX IF NOT EXISTS predictions_disease_time ON predictions (disease, created_at);
+        """)
+
+    def _conn(self):
+        # One connection per thread, as in user_store.SqliteUserStore
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    # ---------------- Writing ----------------
+    def record(self, username, disease, inputs, prediction, probability, model_version=None, created_at=None):
+        """Queue one prediction for the writer; never touches the disk."""
+        self.record_many([(username, disease, inputs, prediction, probability, model_version, created_at)])
+
+    def record_many(self, records):
+        """Queue (username, disease, inputs, prediction, probability, model_version[, created_at]) tuples."""
+        now = time.time()
+        rows = []
+        for username, disease, inputs, prediction, probability, model_version, *rest in records:
+            created_at = rest[0] if rest and rest[0] is not None else now
+            rows.append((username, disease, created_at, int(prediction), float(probability), model_version,
+                         json.dumps(inputs, default=_json_default, sort_keys=True)))
+        with self._lock:
+            room = self.max_pending - len(self._pending)
+            if room < len(rows):
+                # The disk cannot keep up: shed history rather than stall predictions
+                self.dropped += len(rows) - max(room, 0)
+                increment("history_dropped", amount=len(rows) - max(room, 0))
+                rows = rows[:max(room, 0)]
+            self._pending.extend(rows)
+            full = len(self._pending) >= self.batch_size
+        self._ensure_writer()
+        if full:
+            self._wakeup.set()
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                    self._writer.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._write_pending()
+
+    def _write_pending(self):
+        with self._lock:
+            if not self._pending:
+                return
+            self._inflight, self._pending = self._pending, []
+            batch = self._inflight
+        started = time.perf_counter()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO predictions (username, disease, created_at, prediction, probability, "
+                    "model_version, inputs) VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            observe("history_write", time.perf_counter() - started)
+        except Exception as e:
+            print(f"[History] Could not write {len(batch)} record(s): {e}")
+            increment("history_write_errors")
+            with self._lock:
+                self._pending[:0] = batch  # Retry on the next flush
+        finally:
+            with self._lock:
+                self._inflight = []
+                self._idle.notify_all()
+
+    def flush(self, timeout=10):
+        """Write everything recorded so far (used at exit and by scripts); returns True when done."""
+        if self._writer is None:
+            self._write_pending()
+            return not self._pending
+        deadline = time.monotonic() + timeout
+        self._wakeup.set()
+        with self._lock:
+            while self._pending or self._inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(min(remaining, self.flush_interval or 0.05))
+                self._wakeup.set()
+        return True
+
+    # ---------------- Queries ----------------
+    def _buffered(self, username=None, disease=None, since=None, until=None):
+        with self._lock:
+            rows = self._inflight + self._pending
+        return [r for r in rows
+                if (username is None or r[0] == username) and (disease is None or r[1] == disease)
+                and (since is None or r[2] >= since) and (until is None or r[2] < until)]
+
+    def query(self, username=None, disease=None, since=None, until=None, limit=None):
+        """Newest-first records for a user and/or disease within [since, until), as dicts."""
+        clauses, params = [], []
+        for column, value in (("username", username), ("disease", disease)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        sql = ("SELECT username, disease, created_at, prediction, probability, model_version, inputs "
+               "FROM predictions")
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created_at DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        buffered = self._buffered(username, disease, since, until)
+        stored = self._conn().execute(sql, params).fetchall()
+        # A record can be both committed and still listed as in flight for a moment
+        seen = set(stored)
+        rows = sorted([r for r in buffered if r not in seen] + stored, key=lambda r: r[2], reverse=True)
+        return [_as_dict(r) for r in (rows[:limit] if limit else rows)]
+
+    def recent(self, username, limit=None, disease=None):
+        """A user's last `limit` predictions (all diseases unless one is given)."""
+        return self.query(username, disease, limit=limit or config.HISTORY_DASHBOARD_ROWS)
+
+    def trend(self, username, disease, days=None):
+        """Daily [{day, count, mean_probability, positives}] for one user and disease, oldest first."""
+        since = time.time() - (days or config.HISTORY_TREND_DAYS) * 86400
+        days_out = {}
+        for r in reversed(self.query(username, disease, since=since)):
+            day = time.strftime("%Y-%m-%d", time.localtime(r["created_at"]))
+            d = days_out.setdefault(day, {"day": day, "count": 0, "probability_sum": 0.0, "positives": 0})
+            d["count"] += 1
+            d["probability_sum"] += r["probability"]
+            d["positives"] += r["prediction"] == 1
+        return [{"day": d["day"], "count": d["count"], "positives": d["positives"],
+                 "mean_probability": d["probability_sum"] / d["count"]} for d in days_out.values()]
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM predictions").fetchone()[0] + len(self._buffered())
+
+
+def _json_default(value):
+    # NumPy scalars from st.number_input / DataFrame rows
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def _as_dict(row):
+    username, disease, created_at, prediction, probability, model_version, inputs = row
+    return {
+        "username": username,
+        "disease": disease,
+        "created_at": created_at,
+        "prediction": prediction,
+        "probability": probability,
+        "model_version": model_version,
+        "inputs": json.loads(inputs),
+    }
+
+
+# ---------------- Process-wide History ----------------
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history():
+    """Return the process-wide history store (created on first use)."""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = PredictionHistory()
+                atexit.register(_history.flush)
+    return _history
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the prediction history store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    recent = sub.add_parser("recent", help="Last predictions of one user")
+    recent.add_argument("username")
+    recent.add_argument("--disease", default=None)
+    recent.add_argument("--limit", type=int, default=None)
+    trend = sub.add_parser("trend", help="Daily risk trend of one user for one disease")
+    trend.add_argument("username")
+    trend.add_argument("disease")
+    trend.add_argument("--days", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    history = get_history()
+    if args.command == "recent":
+        for r in history.recent(args.username.strip().lower(), args.limit, args.disease):
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["created_at"]))
+            print(f"{when}  {r['disease']:<10} prediction={r['prediction']}  "
+                  f"p={r['probability']:.3f}  model={r['model_version']}")
+    else:
+        for d in history.trend(args.username.strip().lower(), args.disease, args.days):
+            print(f"{d['day']}  n={d['count']:<4} positives={d['positives']:<4} "
+                  f"mean p={d['mean_probability']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
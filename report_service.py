@@ -0,0 +1,127 @@
+# report_service.py - Background PDF rendering for single reports and whole cohorts
+#
+# Rendering happens on a process pool (FPDF layout is pure-Python CPU work), so
+# the Streamlit script thread only queues the job and keeps drawing the page.
+#
+# Usage:
+#   future = submit_report(username, email, "High Risk (87.10%)", "Diabetes")
+#   pdf_bytes = future.result().getvalue()                # in-memory, for downloads
+#   paths = submit_cohort(records).result()               # one job, many files
+#   python report_service.py scored_cohort.csv --disease Diabetes
+import argparse
+import io
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import config
+from metrics import observe
+
+_pool = None
+_coordinator = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool, _coordinator
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _coordinator = ThreadPoolExecutor(max_workers=2, thread_name_prefix="report-jobs")
+                if config.REPORT_WORKERS > 0:
+                    _pool = ProcessPoolExecutor(max_workers=config.REPORT_WORKERS,
+                                                mp_context=multiprocessing.get_context("spawn"))
+                else:
+                    _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-render")
+    return _pool
+
+
+# ---------------- Worker Functions (run in the pool) ----------------
+# fpdf is imported on first render, not when the app imports this module
+def _render_bytes(name, email, prediction_result, disease_name, extra_rows=None):
+    from pdf_generator import generate_health_report_bytes
+    return generate_health_report_bytes(name, email, prediction_result, disease_name, extra_rows=extra_rows)
+
+
+def _render_files(records, output_dir):
+    from pdf_generator import generate_health_report
+    return [generate_health_report(r["name"], r.get("email"), r["prediction_result"], r["disease_name"],
+                                   output_dir=output_dir, extra_rows=r.get("extra_rows"))
+            for r in records]
+
+
+# ---------------- Public API ----------------
+def _chain(inner, transform):
+    """Future resolving to transform(inner result), without blocking a thread on it."""
+    outer = Future()
+
+    def _done(f):
+        if f.exception() is not None:
+            outer.set_exception(f.exception())
+        else:
+            outer.set_result(transform(f.result()))
+    inner.add_done_callback(_done)
+    return outer
+
+
+def submit_report(name, email, prediction_result, disease_name, extra_rows=None):
+    """Queue one report; the returned Future resolves to an io.BytesIO holding the PDF."""
+    started = time.perf_counter()
+    inner = _get_pool().submit(_render_bytes, name, email, prediction_result, disease_name, extra_rows)
+    # Queue wait + render, as the user experiences it
+    inner.add_done_callback(lambda f: observe("pdf", time.perf_counter() - started))
+    return _chain(inner, io.BytesIO)
+
+
+def submit_report_file(name, email, prediction_result, disease_name, output_dir=None, extra_rows=None):
+    """Queue one report written to reports/user_reports/<user>/...; resolves to the file path."""
+    record = {"name": name, "email": email, "prediction_result": prediction_result,
+              "disease_name": disease_name, "extra_rows": extra_rows}
+    return _chain(_get_pool().submit(_render_files, [record], output_dir), lambda paths: paths[0])
+
+
+def render_cohort(records, output_dir=None, chunk_size=None):
+    """
+    Render one report per record (dicts with name, email, prediction_result, disease_name),
+    spreading chunks of records over the worker pool. Returns the file paths in input order.
+    """
+    records = list(records)
+    chunk_size = chunk_size or config.REPORT_CHUNK_SIZE
+    pool = _get_pool()
+    futures = [pool.submit(_render_files, records[i:i + chunk_size], output_dir)
+               for i in range(0, len(records), chunk_size)]
+    return [path for f in futures for path in f.result()]
+
+
+def submit_cohort(records, output_dir=None, chunk_size=None):
+    """Same as render_cohort, as a single background job returning a Future of the paths."""
+    _get_pool()
+    return _coordinator.submit(render_cohort, records, output_dir, chunk_size)
+
+
+def main(argv=None):
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Render PDF reports for a scored cohort (batch_predict.py output).")
+    parser.add_argument("input", help="Scored CSV with prediction/confidence columns")
+    parser.add_argument("--disease", required=True, help="Disease name printed on each report")
+    parser.add_argument("--name-column", default=None, help="Column holding the patient name/ID (default: row number)")
+    parser.add_argument("--email-column", default=None)
+    parser.add_argument("--output-dir", default=None)
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv(args.input)
+    records = [{
+        "name": row[args.name_column] if args.name_column else f"patient_{i + 1}",
+        "email": row[args.email_column] if args.email_column else "",
+        "prediction_result": f"{'Positive' if row['prediction'] == 1 else 'Negative'} "
+                             f"({row['confidence'] * 100:.2f}% confidence)",
+        "disease_name": args.disease,
+    } for i, row in df.iterrows()]
+    paths = submit_cohort(records, args.output_dir).result()
+    print(f"✅ Rendered {len(paths)} reports under {args.output_dir or 'reports/user_reports'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# screening.py - Combined screening: one patient record scored by every disease model at once
+#
+# A full screen used to mean three dashboard forms and three predictions, one
+# after the other. Here a single flat patient record is split into one input
+# row per disease (fields the datasets share, such as age, are entered once and
+# copied to every model that uses them). Fused linear pipelines score a row in
+# microseconds, so they run inline on the caller's thread; only when a model is a
+# stored sklearn estimator do the rows go to a small thread pool, where the
+# estimators run side by side. The results can be rendered as one consolidated PDF.
+#
+# Usage:
+#   result = screen({"age": 54, "Glucose": 148, "BMI": 33.6, "cp": 3, "MDVP:Fo(Hz)": 119.9, ...})
+#   result["results"]["heart"]       # {"prediction", "probability", "confidence", "missing", ...}
+#   future = submit_screening_report(username, username, result)   # Future of io.BytesIO
+#   python screening.py patient.json
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from inference import DISEASES, DISEASE_NAMES, RESULT_LABELS
+from metrics import increment, timer
+
+# Patient fields collected once for all models: shared name -> {disease: dataset column}
+SHARED_FIELDS = {
+    "age": {"diabetes": "Age", "heart": "age"},
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=config.SCREENING_WORKERS or len(DISEASES),
+                                               thread_name_prefix="screening")
+    return _executor
+
+
+# ---------------- Field Mapping ----------------
+def input_columns(model_key):
+    """Raw input columns of a disease's model, in training order."""
+    from model_registry import registry
+    return registry.get(model_key).artifact["raw_columns"]
+
+
+def split_record(record, diseases=None):
+    """
+    One patient record -> {disease: input row}. A dataset column can be given under
+    its own name or under its shared name ("age"); the dataset's own name wins.
+    Columns absent from the record are left out and imputed by the pipeline.
+    """
+    aliases = {(model_key, column): shared
+               for shared, columns in SHARED_FIELDS.items() for model_key, column in columns.items()}
+    rows = {}
+    for model_key in diseases or DISEASES:
+        row = {}
+        for column in input_columns(model_key):
+            if column in record:
+                row[column] = record[column]
+            elif aliases.get((model_key, column)) in record:
+                row[column] = record[aliases[(model_key, column)]]
+        rows[model_key] = row
+    return rows
+
+
+def screenable(rows):
+    """Diseases whose row holds at least one non-null field of their own (shared fields alone are not enough)."""
+    keys = []
+    for model_key, row in rows.items():
+        shared = {columns[model_key] for columns in SHARED_FIELDS.values() if model_key in columns}
+        if any(column not in shared and value is not None for column, value in row.items()):
+            keys.append(model_key)
+    return keys
+
+
+def skipped(model_key):
+    return {"skipped": f"no {DISEASE_NAMES[model_key]} fields in the record"}
+
+
+def shared_field_spec(shared, schemas):
+    """Form spec (see feature_schema) for a shared field, covering the range of every dataset using it."""
+    specs = [spec for model_key, column in SHARED_FIELDS[shared].items() if model_key in schemas
+             for spec in schemas[model_key]["columns"] if spec["name"] == column]
+    spec = dict(specs[0], name=shared)
+    if spec["kind"] == "numeric":
+        spec["min"] = min(s["min"] for s in specs)
+        spec["max"] = max(s["max"] for s in specs)
+    return spec
+
+
+def missing_fields(model_key, row):
+    return [column for column in input_columns(model_key) if row.get(column) is None]
+
+
+# ---------------- Scoring ----------------
+def _score(model_key, row):
+    import pandas as pd
+    from model_registry import registry
+    from prediction_cache import predict_cached
+
+    predictions, probabilities = predict_cached(model_key, pd.DataFrame([row]))
+    prediction, probability = int(predictions[0]), float(probabilities[0])
+    return {
+        "prediction": prediction,
+        "probability": probability,
+        "confidence": probability if prediction == 1 else 1 - probability,
+        "model_version": registry.version(model_key),
+    }
+
+
+def _outcome(model_key, row):
+    """_score, with a failure reported as {"error": ...} so it cannot fail the other models."""
+    try:
+        result = _score(model_key, row)
+    except Exception as e:
+        increment("prediction_errors", model_key)
+        return {"error": str(e)}
+    result["missing"] = missing_fields(model_key, row)
+    return result
+
+
+def _scores_inline(keys):
+    """True when every model is a fused pipeline, which scores faster than a pool hand-off."""
+    from model_registry import registry
+    for model_key in keys:
+        try:
+            if registry.get(model_key).kind != "linear":
+                return False
+        except Exception:
+            continue  # Not loadable: _outcome reports the error without touching the pool
+    return True
+
+
+def screen(record, diseases=None):
+    """
+    Score one patient record with every requested disease model: inline when all
+    of them are fused pipelines, otherwise concurrently on the screening pool.
+    Diseases with none of their own fields in the record are skipped; a model
+    that fails reports its error without failing the others.
+    """
+    diseases = diseases or DISEASES
+    unknown = [key for key in diseases if key not in DISEASES]
+    if unknown:
+        raise ValueError(f"Unknown disease(s): {', '.join(unknown)}")
+    started = time.perf_counter()
+    with timer("screening"):
+        rows = split_record(record, diseases)
+        keys = screenable(rows)
+        if _scores_inline(keys):
+            outcomes = {key: _outcome(key, rows[key]) for key in keys}
+        else:
+            executor = _get_executor()
+            futures = {key: executor.submit(_outcome, key, rows[key]) for key in keys}
+            outcomes = {key: future.result() for key, future in futures.items()}
+        results = {key: outcomes[key] if key in outcomes else skipped(key) for key in diseases}
+    return {"results": results, "rows": rows, "seconds": time.perf_counter() - started}
+
+
+def result_text(model_key, result):
+    """Human-readable line for one disease, as printed on the dashboard and the PDF."""
+    if "skipped" in result:
+        return "Not screened"
+    if "error" in result:
+        return f"Not available ({result['error']})"
+    positive, negative = RESULT_LABELS[model_key]
+    return f"{positive if result['prediction'] == 1 else negative} (confidence {result['confidence'] * 100:.2f}%)"
+
+
+def summary(screening):
+    scored = [r for r in screening["results"].values() if "prediction" in r]
+    flagged = sum(r["prediction"] == 1 for r in scored)
+    return f"{flagged} of {len(scored)} screened conditions flagged"
+
+
+# ---------------- Recording and Reports ----------------
+def record_screening(username, screening, source):
+    """Queue every scored disease into the user's history and log one screening event."""
+    from event_log import append_event
+    from prediction_history import get_history
+
+    scored = [(key, r) for key, r in screening["results"].items() if "prediction" in r]
+    get_history().record_many([(username, key, screening["rows"][key], r["prediction"], r["probability"],
+                                r["model_version"]) for key, r in scored])
+    append_event("screening", username=username, source=source,
+                 results={key: {"prediction": r["prediction"], "probability": r["probability"],
+                                "model_version": r["model_version"]} for key, r in scored})
+
+
+def submit_screening_report(name, email, screening):
+    """Queue one consolidated PDF (a row per disease) on the report pool; Future of io.BytesIO."""
+    from report_service import submit_report
+    return submit_report(name, email, summary(screening), "Combined Screening",
+                         extra_rows=[(DISEASE_NAMES[key], result_text(key, r))
+                                     for key, r in screening["results"].items()])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screen one patient record for every disease.")
+    parser.add_argument("record", help="JSON file holding one flat patient record")
+    parser.add_argument("--diseases", nargs="+", choices=DISEASES, default=None)
+    parser.add_argument("--report", default=None, help="Also write the consolidated PDF here")
+    args = parser.parse_args(argv)
+
+    with open(args.record) as f:
+        record = json.load(f)
+    screening = screen(record, args.diseases)
+    for model_key, result in screening["results"].items():
+        missing = result.get("missing")
+        note = f"  ({len(missing)} field(s) imputed)" if missing else ""
+        print(f"{DISEASE_NAMES[model_key]:<14} {result_text(model_key, result)}{note}")
+    print(f"{summary(screening)} in {screening['seconds'] * 1000:.1f} ms")
+    if args.report:
+        with open(args.report, "wb") as f:
+            f.write(submit_screening_report(record.get("name", "patient"), record.get("email", ""),
+                                            screening).result().getvalue())
+        print(f"📝 Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
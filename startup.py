@@ -0,0 +1,205 @@
+# startup.py - Background warm-up of the ML stack and a start-up profile report
+#
+# The register/login pages only need Streamlit and the user store to draw their
+# form, and PyJWT is only imported once a session token exists. Everything else
+# (pandas, the model artifacts, form schemas, fpdf, the password-hashing workers)
+# is loaded here on a background thread once the first page has been sent, so a
+# fresh replica draws its first page without waiting for the ML stack, and the
+# first prediction usually finds it warm. The doctor animation is a Streamlit
+# component, and rendering one imports pandas and pyarrow, so the auth pages only
+# draw it once warmed_up() (on a rerun after the warm-up has finished).
+#
+# Usage:
+#   startup.warm_up()                                   # from app.py, once per process
+#   python startup.py --profile-startup                 # per-module import/load times, fresh interpreter
+#   python startup.py --profile-startup --json startup.json
+#   streamlit run app.py -- --profile-startup           # print the live app's warm-up timings
+import argparse
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+import config
+from metrics import observe
+
+# What app.py imports before drawing the first page's form, in import order
+FIRST_PAGE_MODULES = ["streamlit", "asset_cache", "auth_utils", "inference", "prediction_history", "event_log",
+                      "metrics"]
+# Deferred past the first page (streamlit_lottie plus the pandas/pyarrow its component
+# arguments need, jwt until a token exists) or to the dashboard; all preloaded by warm_up()
+WARM_MODULES = ["streamlit_lottie", "jwt", "numpy", "pandas", "pyarrow", "pipeline", "model_registry",
+                "prediction_cache", "datasets", "feature_schema", "drift", "screening", "report_service",
+                "pdf_generator"]
+
+_steps = []              # (kind, name, seconds, error) in completion order
+_thread = None
+_lock = threading.Lock()
+
+
+def _timed(kind, name, func, *args):
+    started = time.perf_counter()
+    error = None
+    try:
+        func(*args)
+    except Exception as e:  # A missing artifact must not break the login page
+        error = repr(e)
+    seconds = time.perf_counter() - started
+    _steps.append((kind, name, seconds, error))
+    observe(f"startup_{kind}", seconds, name)
+    return seconds
+
+
+def _load_model(model_key):
+    from model_registry import registry
+    registry.get(model_key)
+
+
+def _load_schema(model_key):
+    from feature_schema import get_schema
+    get_schema(model_key)
+
+
+def _warm_auth_workers():
+    from auth_executor import warm_up as warm_auth
+    warm_auth()
+
+
+def _warm(report):
+    started = time.perf_counter()
+    for module in WARM_MODULES:
+        _timed("import", module, importlib.import_module, module)
+    from inference import DISEASES
+    for model_key in DISEASES:
+        _timed("load", f"model {model_key}", _load_model, model_key)
+        _timed("load", f"schema {model_key}", _load_schema, model_key)
+    _timed("load", "auth workers", _warm_auth_workers)
+    total = time.perf_counter() - started
+    print(f"[Startup] Warm-up finished in {total:.2f}s")
+    if report:
+        print(format_report({"warm_up": steps(), "warm_up_seconds": total}))
+
+
+def warm_up(report=False):
+    """Start the background warm-up (once per process; no-op with MEDISCAN_WARM_UP=0)."""
+    global _thread
+    if not config.WARM_UP or _thread is not None:
+        return _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_warm, args=(report,), name="warm-up", daemon=True)
+            _thread.start()
+    return _thread
+
+
+def warmed_up():
+    """
+    True once the background warm-up has finished; with MEDISCAN_WARM_UP=0, once
+    something else (the dashboard) has imported pandas and pyarrow.
+    """
+    if not config.WARM_UP:
+        return "pandas" in sys.modules and "pyarrow" in sys.modules
+    return _thread is not None and not _thread.is_alive()
+
+
+def steps():
+    return [{"kind": kind, "name": name, "ms": round(seconds * 1000, 2), "error": error}
+            for kind, name, seconds, error in _steps]
+
+
+# ---------------- Profile Report ----------------
+def _probe():
+    """Child side of --profile-startup: time each import and load in this fresh interpreter."""
+    timings = {"first_page": [], "deferred": [], "loads": []}
+    for group, modules in (("first_page", FIRST_PAGE_MODULES), ("deferred", WARM_MODULES)):
+        for module in modules:
+            started = time.perf_counter()
+            importlib.import_module(module)
+            timings[group].append({"name": module, "ms": round((time.perf_counter() - started) * 1000, 2)})
+    from inference import DISEASES
+    for label, func in [(f"model {k}", lambda k=k: _load_model(k)) for k in DISEASES] + \
+                       [(f"schema {k}", lambda k=k: _load_schema(k)) for k in DISEASES]:
+        started = time.perf_counter()
+        try:
+            func()
+            error = None
+        except Exception as e:
+            error = repr(e)
+        timings["loads"].append({"name": label, "ms": round((time.perf_counter() - started) * 1000, 2),
+                                 "error": error})
+    print(json.dumps(timings))
+
+
+def _top_packages(importtime_log, top):
+    """Self import time per top-level package from `python -X importtime` output."""
+    totals = {}
+    for line in importtime_log.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)", line)
+        if m:
+            package = m.group(2).split(".")[0]
+            totals[package] = totals.get(package, 0) + int(m.group(1))
+    return [{"name": name, "ms": round(us / 1000, 2)}
+            for name, us in sorted(totals.items(), key=lambda item: -item[1])[:top]]
+
+
+def profile_startup(top=15):
+    """Import/load times per module, measured in a fresh interpreter (nothing preloaded)."""
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-X", "importtime", os.path.abspath(__file__), "--probe"],
+                         cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+    profile = json.loads(out.stdout.strip().splitlines()[-1])
+    profile["packages"] = _top_packages(out.stderr, top)
+    profile["process_seconds"] = round(time.perf_counter() - started, 3)
+    for group in ("first_page", "deferred", "loads"):
+        profile[f"{group}_ms"] = round(sum(row["ms"] for row in profile[group]), 2)
+    return profile
+
+
+def format_report(profile):
+    lines = []
+    sections = [("first_page", "Imported before the first page's form"),
+                ("deferred", "Deferred past the first page (animation, tokens, warm-up / dashboard)"),
+                ("loads", "Artifact and schema loads"), ("warm_up", "Background warm-up (live process)"),
+                ("packages", "Slowest packages (self import time)")]
+    for key, title in sections:
+        if key not in profile:
+            continue
+        total = profile.get(f"{key}_ms")
+        lines.append(f"{title}" + (f"  [{total:.1f} ms]" if total is not None else ""))
+        for row in profile[key]:
+            label = f"{row['kind']} {row['name']}" if "kind" in row else row["name"]
+            error = f"  ({row['error']})" if row.get("error") else ""
+            lines.append(f"  {label:<34} {row['ms']:>9.1f} ms{error}")
+    if "warm_up_seconds" in profile:
+        lines.append(f"Warm-up total: {profile['warm_up_seconds']:.2f}s")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MediScan AI start-up profiling.")
+    parser.add_argument("--profile-startup", action="store_true", help="Report import and load time per module")
+    parser.add_argument("--json", default=None, help="Also write the report to this JSON file")
+    parser.add_argument("--top", type=int, default=15, help="Packages listed by self import time")
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        _probe()
+        return
+    if not args.profile_startup:
+        parser.error("nothing to do (use --profile-startup)")
+    profile = profile_startup(args.top)
+    print(format_report(profile))
+    print(f"Fresh interpreter total: {profile['process_seconds']:.2f}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(profile, f, indent=2)
+        print(f"📝 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# streaming_train.py - Out-of-core training for reference datasets larger than memory
+#
+# The CSV is never loaded whole. One pass over fixed-size chunks gathers the
+# category vocabulary, label set and per-column moments (merged chunk by chunk,
+# so imputation means and scaler statistics come out exactly as if computed in
+# memory); further passes fit an SGD logistic regression with partial_fit.
+# The result is the same <disease>_pipeline.pkl artifact the app loads, plus the
+# drift reference (see drift.py): decile edges come from a fixed-size random
+# sample kept during the first pass, and one extra pass counts every row into
+# those bins.
+#
+# Usage:
+#   python streaming_train.py heart --data pooled_heart.csv --chunk-size 50000 --epochs 5
+import argparse
+import os
+import resource
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier
+
+import config
+from inference import DATA_FILES, TARGET_COLUMNS, CATEGORICAL_COLUMNS, DROP_COLUMNS
+from pipeline import build_pipeline, pipeline_path, save_pipeline
+from drift import reference_from_counts, reference_path, save_reference
+from utils import file_sha256
+
+REFERENCE_SAMPLE_ROWS = 20000  # Rows kept to place the drift reference's decile edges
+
+
+def _read_chunks(data_file, model_key, chunk_size):
+    # Categorical columns are read as text so every chunk spells a level the same way
+    categorical = CATEGORICAL_COLUMNS[model_key]
+    return pd.read_csv(data_file, chunksize=chunk_size, dtype={c: str for c in categorical})
+
+
+class RunningMoments:
+    """Per-column count / mean / M2 of the observed (non-NaN) values, merged chunk by chunk."""
+
+    def __init__(self, width):
+        self.count = np.zeros(width)
+        self.mean = np.zeros(width)
+        self.m2 = np.zeros(width)
+
+    def update(self, X):
+        observed = ~np.isnan(X)
+        n_b = observed.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_b = np.where(n_b > 0, np.nansum(X, axis=0) / n_b, 0.0)
+        m2_b = np.nansum(np.where(observed, X - mean_b, 0.0) ** 2, axis=0)
+        total = self.count + n_b
+        delta = mean_b - self.mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.mean = np.where(total > 0, self.mean + delta * n_b / total, 0.0)
+            self.m2 = self.m2 + m2_b + np.where(total > 0, delta ** 2 * self.count * n_b / total, 0.0)
+        self.count = total
+
+
+def scan_dataset(data_file, model_key, chunk_size, sample_rows=REFERENCE_SAMPLE_ROWS, random_state=42):
+    """
+    First pass: feature layout, classes, numeric moments and a uniform sample of the
+    numeric columns (the rows with the smallest random keys). Memory is O(chunk + vocabulary + sample).
+    """
+    target = TARGET_COLUMNS[model_key]
+    categorical = CATEGORICAL_COLUMNS[model_key]
+    drop = set(DROP_COLUMNS[model_key]) | {target}
+    rng = np.random.default_rng(random_state)
+
+    numeric_columns, moments, levels, classes, rows = None, None, {}, set(), 0
+    sample, sample_keys = None, None
+    for chunk in _read_chunks(data_file, model_key, chunk_size):
+        if numeric_columns is None:
+            raw_columns = [c for c in chunk.columns if c not in drop]
+            numeric_columns = [c for c in raw_columns if c not in categorical]
+            moments = RunningMoments(len(numeric_columns))
+            levels = {c: {} for c in categorical if c in raw_columns}
+            sample, sample_keys = np.empty((0, len(numeric_columns))), np.empty(0)
+        rows += len(chunk)
+        classes.update(chunk[target].dropna().unique().tolist())
+        X = chunk[numeric_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        moments.update(X)
+        sample, sample_keys = np.vstack([sample, X]), np.concatenate([sample_keys, rng.random(len(X))])
+        if len(sample_keys) > sample_rows:
+            keep = np.argpartition(sample_keys, sample_rows)[:sample_rows]
+            sample, sample_keys = sample[keep], sample_keys[keep]
+        for col, counts in levels.items():
+            for level, n in chunk[col].astype(str).value_counts().items():
+                counts[level] = counts.get(level, 0) + int(n)
+
+    if not rows:
+        raise ValueError(f"{data_file} has no rows")
+    # Same dummy layout as pd.get_dummies(drop_first=True): sorted levels, first one dropped
+    layout = {col: sorted(counts)[1:] for col, counts in levels.items()}
+    return {
+        "raw_columns": raw_columns,
+        "numeric_columns": numeric_columns,
+        "layout": layout,
+        "level_counts": levels,
+        "moments": moments,
+        "sample": sample,
+        "classes": np.array(sorted(classes)),
+        "rows": rows,
+    }
+
+
+def encode_chunk(chunk, scan):
+    """Raw chunk -> preallocated float matrix in training column order (numeric, then dummies)."""
+    X = np.empty((len(chunk), len(scan["feature_names"])))
+    n_numeric = len(scan["numeric_columns"])
+    X[:, :n_numeric] = chunk[scan["numeric_columns"]].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    j = n_numeric
+    for col, levels in scan["layout"].items():
+        values = chunk[col].astype(str).to_numpy()
+        for level in levels:
+            X[:, j] = values == level
+            j += 1
+    return X
+
+
+def reference_pass(data_file, model_key, scan, chunk_size, source_hash=None, bins=None):
+    """Extra pass: count every row into decile bins placed on the scan's sample; returns the drift reference."""
+    bins = bins or config.DRIFT_BINS
+    quantiles = np.linspace(0, 1, bins + 1)[1:-1]
+    edges, counts = [], []
+    for j in range(len(scan["numeric_columns"])):
+        values = scan["sample"][:, j]
+        values = values[~np.isnan(values)]
+        edges.append(np.unique(np.quantile(values, quantiles)) if len(values) else np.empty(0))
+        counts.append(np.zeros(len(edges[-1]) + 1, dtype=np.int64))
+    for chunk in _read_chunks(data_file, model_key, chunk_size):
+        X = chunk[scan["numeric_columns"]].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        for j in range(X.shape[1]):
+            values = X[:, j][~np.isnan(X[:, j])]
+            counts[j] += np.bincount(np.searchsorted(edges[j], values, side="right"), minlength=len(counts[j]))
+
+    moments = scan["moments"]
+    numeric = {col: (moments.count[j], moments.mean[j], moments.m2[j], edges[j], counts[j])
+               for j, col in enumerate(scan["numeric_columns"])}
+    return reference_from_counts(model_key, scan["rows"], numeric, scan["level_counts"], source_hash)
+
+
+def train_streaming(model_key, data_file=None, chunk_size=None, epochs=None, models_path=None, random_state=42):
+    """Train a disease model chunk by chunk and save its pipeline artifact. Returns a stats dict."""
+    data_file = data_file or os.path.join(config.DATA_PATH, DATA_FILES[model_key])
+    chunk_size = chunk_size or config.STREAM_CHUNK_SIZE
+    epochs = epochs or config.STREAM_EPOCHS
+    target = TARGET_COLUMNS[model_key]
+    started = time.perf_counter()
+    tracemalloc.start()
+
+    # --- Pass 1: layout + imputation/scaling statistics ---
+    scan = scan_dataset(data_file, model_key, chunk_size)
+    rows = scan["rows"]
+    scan["feature_names"] = scan["numeric_columns"] + [f"{col}_{level}" for col, levels in scan["layout"].items()
+                                                       for level in levels]
+    moments = scan["moments"]
+    # Missing values are imputed with the mean, which adds nothing to the sum of squared deviations
+    fill_values = np.concatenate([
+        moments.mean,
+        [scan["level_counts"][col][level] / rows for col, levels in scan["layout"].items() for level in levels],
+    ])
+    dummy_p = fill_values[len(moments.mean):]
+    variance = np.concatenate([moments.m2 / rows, dummy_p * (1 - dummy_p)])
+    scale = np.where(variance > 0, np.sqrt(variance), 1.0)  # StandardScaler leaves constant columns unscaled
+    scanned_at = time.perf_counter()
+
+    # --- Passes 2..n: incremental logistic regression ---
+    model = SGDClassifier(loss="log_loss", alpha=1e-4, random_state=random_state)
+    rng = np.random.default_rng(random_state)
+    for _ in range(epochs):
+        for chunk in _read_chunks(data_file, model_key, chunk_size):
+            chunk = chunk[chunk[target].notna()]
+            if chunk.empty:
+                continue
+            X = encode_chunk(chunk, scan)
+            missing = np.isnan(X)
+            if missing.any():
+                X[missing] = np.broadcast_to(fill_values, X.shape)[missing]
+            X -= fill_values
+            X /= scale
+            order = rng.permutation(len(X))
+            model.partial_fit(X[order], chunk[target].to_numpy()[order], classes=scan["classes"])
+    fitted_at = time.perf_counter()
+
+    imputer = SimpleNamespace(feature_names_in_=scan["feature_names"], statistics_=fill_values)
+    scaler = SimpleNamespace(mean_=fill_values, scale_=scale)
+    levels = {col: sorted(counts) for col, counts in scan["level_counts"].items()}
+    artifact = build_pipeline(model_key, scan["raw_columns"], scan["layout"], imputer, scaler, model, levels)
+    save_path = pipeline_path(model_key, models_path)
+    save_pipeline(artifact, save_path)
+
+    # --- Extra pass: training distribution for the drift monitor ---
+    reference = reference_pass(data_file, model_key, scan, chunk_size, file_sha256(data_file))
+    save_reference(model_key, None, models_path=models_path, reference=reference)
+    referenced_at = time.perf_counter()
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "disease": model_key,
+        "rows": rows,
+        "features": len(scan["feature_names"]),
+        "chunk_size": chunk_size,
+        "epochs": epochs,
+        "artifact": save_path,
+        "reference": reference_path(model_key, models_path),
+        "peak_traced_mb": round(peak / 2 ** 20, 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2),
+        "seconds": {
+            "scan": round(scanned_at - started, 4),
+            "fit": round(fitted_at - scanned_at, 4),
+            "reference": round(referenced_at - fitted_at, 4),
+            "total": round(time.perf_counter() - started, 4),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train a disease model from a CSV larger than memory.")
+    parser.add_argument("disease", choices=sorted(DATA_FILES))
+    parser.add_argument("--data", default=None, help="CSV to stream (default: the bundled data/ file)")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--epochs", type=int, default=None)
+    parser.add_argument("--models-path", default=None)
+    args = parser.parse_args(argv)
+
+    stats = train_streaming(args.disease, args.data, args.chunk_size, args.epochs, args.models_path)
+    print(f"✅ {args.disease}: {stats['rows']:,} rows x {stats['features']} features in "
+          f"{stats['seconds']['total']:.2f}s ({stats['epochs']} epochs, chunks of {stats['chunk_size']:,})")
+    print(f"Peak traced memory: {stats['peak_traced_mb']} MB (process max RSS {stats['max_rss_mb']} MB)")
+    print(f"Saved {stats['artifact']} and {stats['reference']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,92 +1,135 @@
 import pandas as pd
-import pickle
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
 # from sklearn.ensemble import RandomForestClassifier # Keep if needed for other models
-from sklearn.preprocessing import StandardScaler, LabelEncoder # LabelEncoder might not be needed now
+from sklearn.preprocessing import StandardScaler
 from sklearn.impute import SimpleImputer
 import warnings
 
+import config
+from inference import DISEASES, DATA_FILES, TARGET_COLUMNS, CATEGORICAL_COLUMNS, DROP_COLUMNS
+from pipeline import build_pipeline, pipeline_path, save_pipeline
+from feature_schema import refresh_schema
+from drift import reference_path, save_reference
+from forest import FOREST_DISEASES, compile_disease, is_stale, load_forest
+from datasets import load_dataset
+from utils import file_sha256
+
 # Suppress warnings for cleaner output
 warnings.filterwarnings('ignore')
 
-def train_and_save_model(df, target_column, model_filename, drop_cols=None, categorical_cols=None, target_map=None):
+# Bump when prepare_features changes so cached feature matrices are rebuilt
+FEATURES_VERSION = 2
+
+
+def prepare_features(df, target_column, drop_cols=None, categorical_cols=None, target_map=None):
     """
-    A comprehensive function to preprocess, train, and save a model, scaler, and imputer.
+    Turn a raw dataset into the numeric training matrix.
+    Returns (X, y, raw_columns, categorical_layout, categorical_levels); the last two
+    freeze the category vocabulary (kept dummy levels / every level seen) for the artifact.
+    """
+    # Drop unnecessary columns
+    if drop_cols:
+        df = df.drop(columns=drop_cols, errors='ignore')
+
+    # Handle target column mapping
+    if target_map:
+        df = df.copy()
+        df[target_column] = df[target_column].map(target_map)
+
+    # Separate features (X) and target (y)
+    X = df.drop(columns=[target_column])
+    y = df[target_column].values
+    raw_columns = list(X.columns)
+
+    # 1. Handle categorical columns with pd.get_dummies
+    categorical_levels = {}
+    if categorical_cols:
+        for col in categorical_cols:
+            if col in X.columns:
+                X[col] = X[col].astype(str)
+                categorical_levels[col] = sorted(X[col].unique())
+        X = pd.get_dummies(X, columns=[c for c in categorical_cols if c in X.columns], drop_first=True)
+
+    # Record which dummy columns each categorical feature expands into
+    categorical_layout = {
+        col: [c[len(col) + 1:] for c in X.columns if c.startswith(f"{col}_")]
+        for col in (categorical_cols or []) if col in raw_columns
+    }
+
+    # 2. Force remaining non-numeric columns to numeric
+    non_numeric_cols = X.select_dtypes(exclude='number').columns
+    for col in non_numeric_cols:
+         X[col] = pd.to_numeric(X[col], errors='coerce')
+    # Ensure all columns intended to be numeric are included
+    X = X.astype(float)
+    return X, y, raw_columns, categorical_layout, categorical_levels
+
+
+def fit_and_save(model_key, X, y, raw_columns, categorical_layout, models_path=None, categorical_levels=None):
+    """Fit imputer -> scaler -> model on prepared features and save the pipeline artifact."""
+    models_path = models_path or config.MODELS_PATH
+    os.makedirs(models_path, exist_ok=True)
+
+    # 3. Impute missing values (NaN)
+    imputer = SimpleImputer(strategy='mean')
+    X_imputed = imputer.fit_transform(X)
+    imputer.feature_names_in_ = X.columns # Store column names
+
+    # 4. Scale the data
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X_imputed)
+
+    # --- Model Training ---
+    model = LogisticRegression(max_iter=1000)
+    model.fit(X_scaled, y)
+
+    # --- Saving Artifact ---
+    artifact = build_pipeline(model_key, raw_columns, categorical_layout, imputer, scaler, model, categorical_levels)
+    save_path = pipeline_path(model_key, models_path)
+    save_pipeline(artifact, save_path)
+    return artifact, save_path, {"train_accuracy": float(model.score(X_scaled, y))}
+
+
+def holdout_accuracy(X, y, test_size=0.2, random_state=42):
+    """Accuracy of the same recipe on a held-out split (None if the dataset is too small)."""
+    try:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=test_size, random_state=random_state, stratify=y)
+        imputer = SimpleImputer(strategy='mean').fit(X_train)
+        scaler = StandardScaler().fit(imputer.transform(X_train))
+        model = LogisticRegression(max_iter=1000).fit(scaler.transform(imputer.transform(X_train)), y_train)
+        return float(model.score(scaler.transform(imputer.transform(X_test)), y_test))
+    except ValueError:
+        return None
+
+
+def train_and_save_model(df, target_column, model_filename, drop_cols=None, categorical_cols=None, target_map=None,
+                         dataset_hash=None, models_path=None):
+    """
+    A comprehensive function to preprocess, train, and save a single pipeline artifact
+    (feature schema, dummy layout, imputer means, scaler constants and model weights).
+    dataset_hash identifies the training data in the drift reference (default: a hash of df).
     """
     print(f"--- Training {model_filename} ---")
     try:
-        models_path = "models" # Ensure saving to the models folder
-        if not os.path.exists(models_path):
-             os.makedirs(models_path)
-
-        # Drop unnecessary columns
-        if drop_cols:
-            df = df.drop(columns=drop_cols, errors='ignore')
-
-        # Handle target column mapping
-        if target_map:
-            df[target_column] = df[target_column].map(target_map)
-
-        # Separate features (X) and target (y)
-        X = df.drop(columns=[target_column])
-        y = df[target_column].values
-
-        # --- Preprocessing X ---
-
-        # 1. Handle categorical columns with pd.get_dummies
-        if categorical_cols:
-            for col in categorical_cols:
-                if col in X.columns:
-                    X[col] = X[col].astype(str)
-            X = pd.get_dummies(X, columns=categorical_cols, drop_first=True)
-
-        # 2. Force remaining non-numeric columns to numeric
-        numeric_cols = X.select_dtypes(include='number').columns
-        non_numeric_cols = X.select_dtypes(exclude='number').columns
-        for col in non_numeric_cols:
-             X[col] = pd.to_numeric(X[col], errors='coerce')
-        # Ensure all columns intended to be numeric are included
-        X = X.astype(float)
-
-
-        # 3. Impute missing values (NaN)
-        imputer = SimpleImputer(strategy='mean')
-        X_imputed = imputer.fit_transform(X)
-        imputer.feature_names_in_ = X.columns # Store column names
-
-        # 4. Scale the data
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X_imputed)
-        scaler.feature_names_in_ = X.columns # Store column names
-
-
-        # --- Model Training ---
-        model = LogisticRegression(max_iter=1000)
-        model.fit(X_scaled, y)
-        try:
-             model.feature_names_in_ = X.columns
-        except AttributeError:
-             pass
-
-
-        # --- Saving Artifacts ---
-        model_save_path = os.path.join(models_path, model_filename)
-        with open(model_save_path, 'wb') as f:
-            pickle.dump(model, f)
-
-        scaler_filename = model_filename.replace('.pkl', '_scaler.pkl')
-        scaler_save_path = os.path.join(models_path, scaler_filename)
-        with open(scaler_save_path, 'wb') as f:
-            pickle.dump(scaler, f)
-
-        imputer_filename = model_filename.replace('.pkl', '_imputer.pkl')
-        imputer_save_path = os.path.join(models_path, imputer_filename)
-        with open(imputer_save_path, 'wb') as f:
-            pickle.dump(imputer, f)
-
-        print(f"✅ {model_filename}, scaler, and imputer saved successfully.")
+        model_key = model_filename.replace('_model.pkl', '').replace('.pkl', '')
+        X, y, raw_columns, categorical_layout, categorical_levels = prepare_features(
+            df, target_column, drop_cols, categorical_cols, target_map)
+        artifact, save_path, _ = fit_and_save(model_key, X, y, raw_columns, categorical_layout, models_path,
+                                              categorical_levels)
+        dataset_hash = dataset_hash or hashlib.sha256(pd.util.hash_pandas_object(df).values.tobytes()).hexdigest()
+        save_reference(model_key, df, dataset_hash, models_path)  # Training distribution for the drift monitor
+        print(f"✅ {os.path.basename(save_path)} (v{artifact['version']}) saved successfully.")
         return True
 
     except Exception as e:
@@ -96,65 +139,196 @@ def train_and_save_model(df, target_column, model_filename, drop_cols=None, cate
         return False
 
 
+# ---------------- Cached, Parallel Training Driver ----------------
+def manifest_path(models_path=None):
+    return os.path.join(models_path or config.MODELS_PATH, "manifest.json")
+
+
+def load_manifest(models_path=None):
+    try:
+        with open(manifest_path(models_path), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"models": {}}
+
+
+def save_manifest(manifest, models_path=None):
+    path = manifest_path(models_path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def feature_cache_path(model_key, dataset_hash, models_path=None):
+    return os.path.join(models_path or config.MODELS_PATH, "cache",
+                        f"{model_key}-{dataset_hash[:16]}-f{FEATURES_VERSION}.pkl")
+
+
+def load_prepared(model_key, dataset_hash, models_path=None):
+    """Prepared (X, y, raw_columns, layout, levels, df) for a dataset version, from cache when possible."""
+    cache_path = feature_cache_path(model_key, dataset_hash, models_path)
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            return pickle.load(f), True
+
+    df = load_dataset(model_key)
+    X, y, raw_columns, layout, levels = prepare_features(
+        df, TARGET_COLUMNS[model_key], DROP_COLUMNS[model_key], CATEGORICAL_COLUMNS[model_key])
+    prepared = {"X": X, "y": y, "raw_columns": raw_columns, "layout": layout, "levels": levels, "df": df}
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(f"{cache_path}.tmp", "wb") as f:
+        pickle.dump(prepared, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{cache_path}.tmp", cache_path)
+    return prepared, False
+
+
+def train_disease(model_key, models_path=None, select=False):
+    """
+    Train one disease end to end (runs inside a worker process). Returns its manifest entry.
+    With select=True the model comes from model_selection instead of the fixed logistic regression.
+    """
+    started = time.perf_counter()
+    data_file = os.path.join(config.DATA_PATH, DATA_FILES[model_key])
+    dataset_hash = file_sha256(data_file)
+
+    prepared, cache_hit = load_prepared(model_key, dataset_hash, models_path)
+    prepared_at = time.perf_counter()
+    selection = None
+    if select:
+        from model_selection import select_model
+        artifact, selection = select_model(
+            model_key, prepared["X"], prepared["y"], prepared["raw_columns"], prepared["layout"],
+            categorical_levels=prepared["levels"])
+        save_path = pipeline_path(model_key, models_path)
+        save_pipeline(artifact, save_path)
+        winner = selection["winner"]
+        metrics = {k: winner[k] for k in ("cv_accuracy", "cv_auc", "latency_ms_p50", "latency_ms_p99")}
+        metrics["model"] = winner["candidate"]
+    else:
+        artifact, save_path, metrics = fit_and_save(
+            model_key, prepared["X"], prepared["y"], prepared["raw_columns"], prepared["layout"], models_path,
+            prepared["levels"])
+        metrics["holdout_accuracy"] = holdout_accuracy(prepared["X"], prepared["y"])
+    fitted_at = time.perf_counter()
+    refresh_schema(model_key, prepared["df"], dataset_hash, models_path)  # Form widget stats for the dashboard
+    save_reference(model_key, prepared["df"], dataset_hash, models_path)  # Training distribution for drift.py
+    # Only the standalone heart_model.py / parkinson_model.py pages load the compiled forest (see forest.py);
+    # the dashboard, API, screening and batch scoring all use the fused pipeline above
+    forest = compile_disease(model_key, models_path) if model_key in FOREST_DISEASES else None
+
+    return {
+        "status": "trained",
+        "dataset": data_file,
+        "dataset_hash": dataset_hash,
+        "features_version": FEATURES_VERSION,
+        "feature_cache_hit": cache_hit,
+        "rows": int(len(prepared["y"])),
+        "features": len(prepared["X"].columns),
+        "artifact": save_path,
+        "artifact_version": artifact["version"],
+        "metrics": metrics,
+        "selection": selection,
+        "forest": forest,
+        "seconds": {
+            "prepare": round(prepared_at - started, 4),
+            "fit": round(fitted_at - prepared_at, 4),
+            "total": round(time.perf_counter() - started, 4),
+        },
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def forest_outdated(model_key, models_path=None):
+    """True when a page's compiled forest is missing, in an old format or built from another dataset."""
+    try:
+        return is_stale(load_forest(model_key, models_path))
+    except (FileNotFoundError, ValueError):
+        return True
+
+
+def is_up_to_date(model_key, entry, models_path=None, select=False):
+    """A model can be skipped when its dataset and feature code are unchanged and the artifact exists."""
+    if not entry or entry.get("status") == "failed" or bool(entry.get("selection")) != select:
+        return False
+    data_file = os.path.join(config.DATA_PATH, DATA_FILES[model_key])
+    return (entry.get("features_version") == FEATURES_VERSION
+            and os.path.exists(pipeline_path(model_key, models_path))
+            and os.path.exists(data_file)
+            and entry.get("dataset_hash") == file_sha256(data_file))
+
+
+def train_all(diseases=None, workers=None, force=False, models_path=None, select=False):
+    """Train the requested diseases concurrently, skipping unchanged ones, and write the manifest."""
+    diseases = diseases or DISEASES
+    manifest = load_manifest(models_path)
+    entries = manifest.get("models", {})
+    started = time.perf_counter()
+
+    todo = [key for key in diseases if force or not is_up_to_date(key, entries.get(key), models_path, select)]
+    for key in set(diseases) - set(todo):
+        print(f"⏭  {key}: dataset unchanged, keeping existing model")
+        entries[key]["status"] = "unchanged"
+        if not os.path.exists(reference_path(key, models_path)):
+            # Models trained before the drift monitor existed still need their training distribution
+            save_reference(key, load_dataset(key), entries[key]["dataset_hash"], models_path)
+            print(f"📝 {key}: drift reference written to {reference_path(key, models_path)}")
+        if key in FOREST_DISEASES and forest_outdated(key, models_path):
+            entries[key]["forest"] = compile_disease(key, models_path)
+            print(f"📝 {key}: compiled forest written to {entries[key]['forest']['path']}")
+
+    if todo:
+        workers = min(workers or len(todo), len(todo))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {pool.submit(train_disease, key, models_path, select): key for key in todo}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    entries[key] = future.result()
+                    m = entries[key]
+                    summary = (f"{m['metrics']['model']}, CV AUC {m['metrics']['cv_auc']}" if select
+                               else f"train acc {m['metrics']['train_accuracy']:.3f}")
+                    forest = f", forest {m['forest']['trees']} trees" if m.get("forest") else ""
+                    print(f"✅ {key}: {m['rows']} rows, {summary}{forest}, "
+                          f"{m['seconds']['total']:.2f}s{' (cached features)' if m['feature_cache_hit'] else ''}")
+                except Exception as e:
+                    print(f"❌ Error training {key}: {e}")
+                    entries[key] = {"status": "failed", "error": str(e),
+                                    "trained_at": datetime.now().isoformat(timespec="seconds")}
+
+    manifest = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "total_seconds": round(time.perf_counter() - started, 4),
+        "models": entries,
+    }
+    save_manifest(manifest, models_path)
+    return manifest
+
+
 # --- Main Training Execution ---
-if __file__ == "_main_":
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the MediScan AI disease models.")
+    parser.add_argument("diseases", nargs="*", metavar="disease", help=f"Subset of {DISEASES} to train (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel training processes")
+    parser.add_argument("--force", action="store_true", help="Retrain even if the dataset is unchanged")
+    parser.add_argument("--select", action="store_true",
+                        help="Pick each model by cross-validation under the latency budget (see model_selection.py)")
+    args = parser.parse_args()
+    unknown = sorted(set(args.diseases) - set(DISEASES))
+    if unknown:
+        parser.error(f"unknown disease(s): {', '.join(unknown)}")
+
     # Ensure data folder exists
-    if not os.path.exists('data'):
-        print("❌ Error: 'data' folder not found. Please create it and add CSV files.")
+    if not os.path.exists(config.DATA_PATH):
+        print(f"❌ Error: '{config.DATA_PATH}' folder not found. Please create it and add CSV files.")
     else:
-        all_successful = True # Flag to track if all trainings worked
-
-        # --- 1. Diabetes ---
-        try:
-            df_diabetes = pd.read_csv('data/diabetes.csv')
-            if not train_and_save_model(df_diabetes, 'Outcome', 'diabetes_model.pkl'):
-                all_successful = False
-        except FileNotFoundError:
-            print("❌ Error: data/diabetes.csv not found.")
-            all_successful = False
-        except Exception as e:
-            print(f"❌ Error processing diabetes: {e}")
-            all_successful = False
-
-
-        # --- 2. Heart Disease ---
-        try:
-            df_heart = pd.read_csv('data/heart.csv')
-            # Assuming 'target' is the correct column name based on previous steps
-            if not train_and_save_model(df_heart, 'target', 'heart_model.pkl'):
-                 all_successful = False
-        except FileNotFoundError:
-             print("❌ Error: data/heart.csv not found.")
-             all_successful = False
-        except Exception as e:
-            print(f"❌ Error processing heart: {e}")
-            all_successful = False
-
-        # --- 3. Parkinson's Disease ---
-        # ** THIS CALL WAS MISSING BEFORE **
-        try:
-            df_parkinsons = pd.read_csv('data/parkinson.csv') # Make sure filename matches
-            # Assuming 'status' is target, drop 'name' if exists
-            drop_cols = ['name'] if 'name' in df_parkinsons.columns else None
-            if not train_and_save_model(df_parkinsons, 'status', 'parkinson_model.pkl', drop_cols=drop_cols):
-                 all_successful = False
-        except FileNotFoundError:
-             print("❌ Error: data/parkinson.csv not found.") # Check filename
-             all_successful = False
-        except Exception as e:
-            print(f"❌ Error processing parkinson's: {e}")
-            all_successful = False
+        manifest = train_all(args.diseases or None, args.workers, args.force, select=args.select)
 
         # --- Final Summary ---
-        print("\n--- Training complete ---")
-        if all_successful:
-            print("✅ All requested models, scalers, and imputers appear to have been saved.")
+        print(f"\n--- Training complete in {manifest['total_seconds']:.2f}s ---")
+        if all(m.get("status") != "failed" for m in manifest["models"].values()):
+            print("✅ All requested pipeline artifacts are up to date.")
         else:
              print("⚠ Some models failed to train or save. Please check errors above.")
-
-        # Verify files were created
-        print("Checking created files in 'models' folder:")
-        if os.path.exists('models'):
-            print(os.listdir('models'))
-        else:
-            print("'models' folder not found.")
+        print(f"Manifest written to {manifest_path()}")
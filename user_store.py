@@ -0,0 +1,271 @@
+# user_store.py - Pluggable storage backends for user accounts
+#
+# The default backend is an embedded SQLite database in WAL mode: lookups go
+# through the primary-key index and registrations are single atomic INSERTs,
+# so login cost stays flat as the user base grows and concurrent sign-ups
+# cannot overwrite each other. The legacy users.json file is still supported
+# (MEDISCAN_USER_STORE=json) and is migrated into SQLite on first use.
+#
+# Usage:
+#   python user_store.py migrate [--json users.json] [--db users.db]
+import abc
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import config
+
+
+class UserStore(abc.ABC):
+    """Interface every backend implements. Records are dicts with 'password' and 'email'."""
+
+    @abc.abstractmethod
+    def get(self, username):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def add(self, username, record):
+        """Insert a new user; returns False (and changes nothing) if the name is taken."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def update(self, username, **fields):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count(self):
+        raise NotImplementedError
+
+    # Refresh tokens (JWT rotation): each token id may be exchanged exactly once
+    @abc.abstractmethod
+    def add_refresh_token(self, jti, username, family, expires_at):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def consume_refresh_token(self, jti):
+        """Atomically remove a refresh token id; returns its username or None if unknown/used."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def revoke_refresh_tokens(self, username=None, family=None):
+        raise NotImplementedError
+
+
+# ---------------- JSON Backend (legacy) ----------------
+class JsonUserStore(UserStore):
+    def __init__(self, path=None):
+        self.path = path or config.USERS_FILE
+        self._lock = threading.Lock()
+        self._refresh_tokens = {}  # In memory: the JSON backend is for single-process installs
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                content = f.read()
+            return json.loads(content) if content else {}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, users):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(users, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def get(self, username):
+        return self._load().get(username)
+
+    def add(self, username, record):
+        with self._lock:
+            users = self._load()
+            if username in users:
+                return False
+            users[username] = record
+            self._save(users)
+            return True
+
+    def update(self, username, **fields):
+        with self._lock:
+            users = self._load()
+            if username in users:
+                users[username].update(fields)
+                self._save(users)
+
+    def count(self):
+        return len(self._load())
+
+    def all(self):
+        return self._load()
+
+    def add_refresh_token(self, jti, username, family, expires_at):
+        with self._lock:
+            self._refresh_tokens[jti] = (username, family, expires_at)
+
+    def consume_refresh_token(self, jti):
+        with self._lock:
+            entry = self._refresh_tokens.pop(jti, None)
+        return entry[0] if entry and entry[2] > time.time() else None
+
+    def revoke_refresh_tokens(self, username=None, family=None):
+        with self._lock:
+            tokens = self._refresh_tokens
+            for jti, (user, fam, _) in list(tokens.items()):
+                if (username and user == username) or (family and fam == family):
+                    del tokens[jti]
+
+
+# ---------------- SQLite Backend ----------------
+class SqliteUserStore(UserStore):
+    def __init__(self, path=None):
+        self.path = path or config.USER_DB_PATH
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                username   TEXT PRIMARY KEY,
+                password   TEXT NOT NULL,
+                email      TEXT,
+                created_at REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS refresh_tokens (
+                jti        TEXT PRIMARY KEY,
+                username   TEXT NOT NULL,
+                family     TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS refresh_tokens_username ON refresh_tokens (username);
+            CREATE INDEX IF NOT EXISTS refresh_tokens_family ON refresh_tokens (family);
+        """)
+        conn.commit()
+
+    def _conn(self):
+        # sqlite3 connections must not be shared across threads; Streamlit runs sessions on many
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, username):
+        row = self._conn().execute(
+            "SELECT password, email FROM users WHERE username = ?", (username,)).fetchone()
+        return {"password": row[0], "email": row[1]} if row else None
+
+    def add(self, username, record):
+        cursor = self._conn().execute(
+            "INSERT OR IGNORE INTO users (username, password, email, created_at) VALUES (?, ?, ?, ?)",
+            (username, record["password"], record.get("email"), time.time()))
+        return cursor.rowcount == 1
+
+    def update(self, username, **fields):
+        allowed = {k: v for k, v in fields.items() if k in ("password", "email")}
+        if allowed:
+            assignments = ", ".join(f"{k} = ?" for k in allowed)
+            self._conn().execute(f"UPDATE users SET {assignments} WHERE username = ?",
+                                 (*allowed.values(), username))
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def add_refresh_token(self, jti, username, family, expires_at):
+        conn = self._conn()
+        conn.execute("INSERT INTO refresh_tokens (jti, username, family, expires_at) VALUES (?, ?, ?, ?)",
+                     (jti, username, family, expires_at))
+        conn.execute("DELETE FROM refresh_tokens WHERE username = ? AND expires_at < ?", (username, time.time()))
+
+    def consume_refresh_token(self, jti):
+        # DELETE ... RETURNING is atomic, so two replicas racing on one token cannot both win
+        rows = self._conn().execute(
+            "DELETE FROM refresh_tokens WHERE jti = ? RETURNING username, expires_at", (jti,)).fetchall()
+        return rows[0][0] if rows and rows[0][1] > time.time() else None
+
+    def revoke_refresh_tokens(self, username=None, family=None):
+        conn = self._conn()
+        if username:
+            conn.execute("DELETE FROM refresh_tokens WHERE username = ?", (username,))
+        if family:
+            conn.execute("DELETE FROM refresh_tokens WHERE family = ?", (family,))
+
+    def add_many(self, users):
+        """Bulk insert {username: record} in one transaction; existing names are kept."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (username, password, email, created_at) VALUES (?, ?, ?, ?)",
+                [(name, rec["password"], rec.get("email"), now)
+                 for name, rec in users.items() if isinstance(rec, dict) and "password" in rec])
+            inserted = conn.total_changes - before
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return inserted
+
+    def get_meta(self, key):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self._conn().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+# ---------------- Migration ----------------
+def migrate_json_users(store, json_path=None, force=False):
+    """One-shot import of users.json into a SQLite store. Returns the number of users added."""
+    json_path = json_path or config.USERS_FILE
+    if not force and store.get_meta("migrated_from_json"):
+        return 0
+    if not os.path.exists(json_path):
+        return 0
+    inserted = store.add_many(JsonUserStore(json_path).all())
+    store.set_meta("migrated_from_json", f"{os.path.abspath(json_path)} @ {time.time():.0f}")
+    print(f"[Users] Migrated {inserted} user(s) from {json_path} into {store.path}")
+    return inserted
+
+
+# ---------------- Process-wide Store ----------------
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_user_store():
+    """Return the configured backend (created once per process)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if config.USER_STORE_BACKEND == "json":
+                    _store = JsonUserStore()
+                else:
+                    store = SqliteUserStore()
+                    migrate_json_users(store)
+                    _store = store
+    return _store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MediScan AI user store maintenance.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="Import users.json into the SQLite user store")
+    migrate.add_argument("--json", default=config.USERS_FILE)
+    migrate.add_argument("--db", default=config.USER_DB_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        store = SqliteUserStore(args.db)
+        added = migrate_json_users(store, args.json, force=True)
+        print(f"✅ {added} user(s) imported; {store.count()} total in {args.db}")
+
+
+if __name__ == "__main__":
+    main()
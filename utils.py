@@ -0,0 +1,18 @@
+# utils.py - Small helpers shared across the app, training and batch scripts
+import hashlib
+import os
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Content hash of a file, read in blocks so large datasets stay cheap on memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_signature(path):
+    """Cheap change detector (size + mtime) used to decide when a file must be re-hashed."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns